@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+
+from enums.parse_errors import ParseError
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, которые говорят о перегрузке маркетплейса, а не о проблеме конкретного товара
+OVERLOAD_ERRORS = {ParseError.TIMEOUT, ParseError.BLOCKED}
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Ограничитель параллельности маркетплейса по схеме AIMD
+    (additive increase / multiplicative decrease).
+    После `limit` успешных страниц подряд лимит растёт на единицу,
+    при таймауте, блокировке или превышении целевой задержки — умножается на `decrease_factor`.
+    Лимит всегда остаётся в пределах [floor, ceiling].
+    """
+
+    def __init__(
+        self,
+        marketplace: str,
+        *,
+        floor: int,
+        ceiling: int,
+        initial: Optional[int] = None,
+        latency_target: float = 45.0,
+        decrease_factor: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.marketplace = marketplace
+        self.floor = max(1, floor)
+        self.ceiling = max(self.floor, ceiling)
+        self.limit = min(max(initial or self.floor, self.floor), self.ceiling)
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.clock = clock
+
+        # Экспоненциальное скользящее среднее задержки страницы, секунды
+        self.avg_latency: Optional[float] = None
+
+        self._in_flight = 0
+        self._successes = 0
+        self._last_decrease = float("-inf")
+        self._condition = asyncio.Condition()
+
+    def decreased_within(self, seconds: float) -> bool:
+        """
+        Было ли мультипликативное снижение лимита за последние `seconds` секунд.
+        """
+        return self.clock() - self._last_decrease < seconds
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+
+    async def release(self) -> None:
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def record(self, started_at: float, error: Optional[ParseError]) -> None:
+        """
+        Учитывает результат страницы, начатой в момент `started_at` (по `clock`).
+        """
+        latency = self.clock() - started_at
+        self.avg_latency = latency if self.avg_latency is None else 0.8 * self.avg_latency + 0.2 * latency
+
+        if error in OVERLOAD_ERRORS or latency > self.latency_target:
+            # Страницы, начатые до последнего снижения, уже учтены в нём
+            if started_at < self._last_decrease:
+                return
+            previous = self.limit
+            self.limit = max(self.floor, int(self.limit * self.decrease_factor))
+            self._successes = 0
+            self._last_decrease = self.clock()
+            if self.limit != previous:
+                logger.info("Concurrency for %s decreased %d -> %d", self.marketplace, previous, self.limit)
+            return
+
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.ceiling:
+            self.limit += 1
+            self._successes = 0
+            logger.info("Concurrency for %s increased to %d", self.marketplace, self.limit)
@@ -1,7 +1,12 @@
-import random
+import asyncio
+import contextlib
+import functools
 import logging
+import time
+from dataclasses import dataclass
+from typing import AsyncContextManager, AsyncIterator, Awaitable, Callable, Optional
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from playwright.async_api import async_playwright
+from playwright.async_api import BrowserContext, async_playwright
 from playwright_stealth import Stealth
 from xvfbwrapper import Xvfb
 
@@ -11,130 +16,479 @@ from bot.parsers.wildberries import process_many_wb_tasks
 from bot.parsers.ozon import process_many_ozon_tasks
 from bot.parsers.joom import process_many_joom_tasks
 from bot.parsers.yandex_market import process_many_yandex_market_tasks
+from bot.parsers.page_pool import PagePool
+from bot.parsers.context_pool import ContextPool
+from bot.parsers.ssr import SsrModeTracker
+from bot.parsers.artifacts import ArtifactStore
 from bot.bot_send.bot_send import send_message
+from bot.background_tasks.circuit_breaker import CircuitBreaker
+from bot.background_tasks.aimd import AdaptiveConcurrencyLimiter
+from bot.background_tasks.planner import SweepPlanner
+from bot.background_tasks.hedging import HedgeBudget, LatencyTracker
+from bot.background_tasks.profiles import BrowserProfileStore, random_fingerprint
+from bot.background_tasks.proxy_pool import ProxyPool, ProxyState
+from config.config import ParserSettings
+from enums.parse_records import ListingWriteBatch, ParseResult, ParseTask, SweepListing
 
 logger = logging.getLogger(__name__)
 scheduler = AsyncIOScheduler()
 stealth = Stealth()
+# Предохранители и ограничители живут между обходами, чтобы пауза маркетплейса
+# и подобранная параллельность переживали запуск планировщика
+breakers: dict[str, CircuitBreaker] = {}
+limiters: dict[str, AdaptiveConcurrencyLimiter] = {}
+latencies: dict[str, LatencyTracker] = {}
+ssr_trackers: dict[str, SsrModeTracker] = {}
+profile_store: BrowserProfileStore | None = None
+proxy_pool: ProxyPool | None = None
+artifact_store: ArtifactStore | None = None
 
-async def handle_parsing_results(pool, bot, parsed_products):
+CHROMIUM_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-infobars",
+]
+
+
+def get_breaker(marketplace: str, settings: ParserSettings) -> CircuitBreaker:
+    if marketplace not in breakers:
+        breakers[marketplace] = CircuitBreaker(
+            marketplace,
+            window=settings.breaker_window,
+            min_samples=settings.breaker_min_samples,
+            failure_rate=settings.breaker_failure_rate,
+            challenge_rate=settings.breaker_challenge_rate,
+            open_seconds=settings.breaker_open_seconds,
+        )
+    return breakers[marketplace]
+
+
+def get_limiter(marketplace: str, settings: ParserSettings) -> AdaptiveConcurrencyLimiter:
+    if marketplace not in limiters:
+        limiters[marketplace] = AdaptiveConcurrencyLimiter(
+            marketplace,
+            floor=settings.concurrency_floor.get(marketplace, 1),
+            ceiling=settings.concurrency_ceiling.get(marketplace, 1),
+            initial=settings.concurrency_initial.get(marketplace),
+            latency_target=settings.latency_target_seconds,
+        )
+    return limiters[marketplace]
+
+
+def get_latency_tracker(marketplace: str, settings: ParserSettings) -> LatencyTracker:
+    if marketplace not in latencies:
+        latencies[marketplace] = LatencyTracker(marketplace, min_samples=settings.hedge_min_samples)
+    return latencies[marketplace]
+
+
+def get_ssr_tracker(marketplace: str, settings: ParserSettings) -> SsrModeTracker:
+    if marketplace not in ssr_trackers:
+        ssr_trackers[marketplace] = SsrModeTracker(
+            marketplace,
+            mode=settings.ssr_mode.get(marketplace, "auto"),
+            min_samples=settings.ssr_min_samples,
+            enable_rate=settings.ssr_enable_rate,
+            probe_every=settings.ssr_probe_every,
+        )
+    return ssr_trackers[marketplace]
+
+
+def get_profile_store(settings: ParserSettings) -> BrowserProfileStore:
+    global profile_store
+    if profile_store is None:
+        profile_store = BrowserProfileStore(
+            settings.profiles_dir,
+            cache_size_mb=settings.profile_cache_mb,
+            max_profile_mb=settings.profile_max_mb,
+            max_age_hours=settings.profile_max_age_hours,
+        )
+    return profile_store
+
+
+def get_proxy_pool(settings: ParserSettings) -> ProxyPool:
+    global proxy_pool
+    if proxy_pool is None:
+        proxy_pool = ProxyPool(
+            settings.proxies,
+            max_concurrent=settings.proxy_max_concurrent,
+            eject_error_rate=settings.proxy_eject_error_rate,
+            eject_seconds=settings.proxy_eject_seconds,
+        )
+    return proxy_pool
+
+
+def get_artifact_store(settings: ParserSettings) -> ArtifactStore:
+    global artifact_store
+    if artifact_store is None:
+        artifact_store = ArtifactStore(
+            settings.artifacts_dir,
+            max_mb=settings.artifacts_max_mb,
+            success_sample_rate=settings.artifacts_success_rate,
+        )
+    return artifact_store
+
+
+async def new_stealth_context(browser, proxy: Optional[ProxyState] = None):
+    """
+    Создаёт чистый контекст браузера со случайным отпечатком и патчит его для обхода обнаружения.
+    Если передан прокси, контекст работает через него.
+    """
+    fingerprint = random_fingerprint()
+    if proxy:
+        fingerprint["proxy"] = proxy.playwright_proxy()
+    context = await browser.new_context(
+        **fingerprint,
+        java_script_enabled=True,
+        bypass_csp=True,
+    )
+    await stealth.apply_stealth_async(context)
+    return context
+
+
+async def launch_marketplace_context(
+    playwright,
+    marketplace: str,
+    index: int,
+    chromium_args: list[str],
+    settings: ParserSettings,
+    *,
+    fresh: bool = False,
+    proxy: Optional[ProxyState] = None,
+):
+    """
+    Открывает постоянный контекст `index` маркетплейса со своим профилем: HTTP-кеш, cookies
+    и настройки региона сохраняются между обходами. `fresh=True` — профиль сбрасывается,
+    и контекст получает новый отпечаток. Если передан прокси, контекст работает через него.
+    """
+    profiles = get_profile_store(settings)
+    key = f"{marketplace}-{index}"
+    if fresh:
+        profiles.reset(key)
+    fingerprint = profiles.prepare(key, proxy.server if proxy else None)
+    if proxy:
+        fingerprint["proxy"] = proxy.playwright_proxy()
+    context = await playwright.chromium.launch_persistent_context(
+        str(profiles.profile_dir(key)),
+        headless=False,
+        args=chromium_args + profiles.launch_args(),
+        **fingerprint,
+        java_script_enabled=True,
+        bypass_csp=True,
+    )
+    await stealth.apply_stealth_async(context)
+    return context
+
+
+@dataclass
+class BrowserBackend:
+    """
+    Источник контекстов браузера на время обхода.
+    `launch_context(marketplace, index, fresh=..., proxy=...)` открывает контекст пула маркетплейса,
+    `new_hedge_context(proxy=...)` — свежий контекст для страховочной попытки (его прокси выбирает ContextPool).
+    """
+    launch_context: Callable[..., Awaitable[BrowserContext]]
+    new_hedge_context: Callable[..., Awaitable[BrowserContext]]
+
+
+@contextlib.asynccontextmanager
+async def playwright_backend(settings: ParserSettings) -> AsyncIterator[BrowserBackend]:
+    """
+    Playwright с Chromium под виртуальным дисплеем Xvfb.
+    """
+    # Запускаем xvfb вне async, чтобы не блокировать event loop
+    xvfb = Xvfb(width=1280, height=720)
+    xvfb.start()
+
+    try:
+        async with stealth.use_async(async_playwright()) as p:
+            # Браузер для страховочных попыток запускается только при первой из них
+            hedge_browser = None
+            hedge_browser_lock = asyncio.Lock()
+
+            async def new_hedge_context(proxy: Optional[ProxyState] = None):
+                nonlocal hedge_browser
+                async with hedge_browser_lock:
+                    if hedge_browser is None:
+                        hedge_browser = await p.chromium.launch(headless=False, args=CHROMIUM_ARGS)
+                return await new_stealth_context(hedge_browser, proxy)
+
+            try:
+                yield BrowserBackend(
+                    launch_context=functools.partial(
+                        launch_marketplace_context, p, chromium_args=CHROMIUM_ARGS, settings=settings,
+                    ),
+                    new_hedge_context=new_hedge_context,
+                )
+            finally:
+                if hedge_browser:
+                    await hedge_browser.close()
+    finally:
+        xvfb.stop()
+
+
+async def handle_parsing_results(pool, bot, parsed_products: list[ParseResult], settings: ParserSettings, loaded=None):
+    """
+    Записывает результаты обхода и отправляет уведомления. `loaded` — карточки,
+    загруженные вместе с задачами: {listing_id: SweepListing}.
+    Карточки, у которых ничего не изменилось, не переписываются: для всей пачки одним запросом
+    сдвигается только время проверки. Изменившиеся карточки собираются по столбцам
+    и тоже записываются одним запросом, как и неудачи карточек с временными ошибками.
+    """
     if not parsed_products:
         return
+    loaded = loaded or {}
 
+    # Цены успешно разобранных карточек: по ним одним запросом выбираются подписчики для уведомления
+    prices = {}
+    details = {}
+    changed = ListingWriteBatch()
+    unchanged = []
+    # Временная ошибка не отключает карточку, а копит счётчик неудач до карантина: {listing_id: ошибка}
+    failed = {}
     async with pool.acquire() as conn:
-        for user_id, product_id, current_price, product_name, min_price, last_error, target_price, url in parsed_products:
+        for result in parsed_products:
+            listing_id, last_error = result.product_id, result.last_error
+            if last_error and last_error.is_transient:
+                failed[listing_id] = last_error
+                continue
+
             if last_error:
-                await db.products.change_product_details_after_parsing(
-                    conn=conn,
-                    product_id=product_id,
-                    current_price=current_price,
-                    product_name=product_name if product_name else None,
-                    min_price=min_price,
-                    last_error=last_error,
-                    is_active=False
-                )
+                changed.append(result)
+                continue
+
+            product_name = result.product_name or None
+            prices[listing_id] = result.price
+            details[listing_id] = (product_name, result.url)
+            listing = loaded.get(listing_id)
+            if listing and listing.is_unchanged_by(result):
+                unchanged.append(listing_id)
             else:
-                if current_price <= target_price:
-                    logger.info("Found minimal price for product_id=%d", product_id)
-                    chat_id = await db.users.get_user_chat_id(conn=conn, user_id=user_id)
-                    if chat_id:
-                        await send_message(bot, chat_id=chat_id, current_price=current_price,
-                                           product_name=product_name, target_price=target_price, url=url)
-                    else:
-                        logger.warning(f"For user_id={user_id} chat_id not found, message will not be sent.")
-
-                await db.products.change_product_details_after_parsing(
-                    conn=conn,
-                    product_id=product_id,
-                    current_price=current_price,
-                    product_name=product_name if product_name else None,
-                    min_price=min_price,
-                    last_error=last_error,
-                    is_active=True
+                changed.append(result)
+
+        failures = await db.products.register_listings_parsing_failures(
+            conn=conn,
+            listing_ids=list(failed),
+            quarantine_after=settings.quarantine_after_failures,
+            quarantine_minutes=settings.quarantine_minutes,
+            quarantine_max_minutes=settings.quarantine_max_minutes,
+        )
+        for listing_id, fail_count, next_check_at in failures:
+            if next_check_at:
+                logger.warning(
+                    "Listing_id=%d quarantined until %s after %d failures (%s)",
+                    listing_id, next_check_at, fail_count, failed[listing_id].name,
                 )
+        price_changed = await db.products.change_listings_details_after_parsing(conn=conn, batch=changed)
+        await db.products.touch_listings_checked(conn=conn, listing_ids=unchanged)
+        # Точки истории цен: только карточки, цена которых изменилась, пишутся одной командой COPY
+        await db.price_history.add_price_points(
+            conn=conn,
+            points=[(listing_id, prices[listing_id]) for listing_id in price_changed if listing_id in prices],
+        )
+        subscribers = await db.products.get_subscribers_to_notify(conn=conn, prices=prices) if prices else []
+
+    for listing_id, user_id, chat_id, target_price in subscribers:
+        logger.info("Found minimal price for listing_id=%d, user_id=%d", listing_id, user_id)
+        product_name, url = details[listing_id]
+        await send_message(bot, chat_id=chat_id, current_price=prices[listing_id],
+                           product_name=product_name, target_price=target_price, url=url)
+
+
+async def process_with_retries(
+    process_func, tasks, context, settings: ParserSettings, *, first_attempt: int = 0, **runner_options
+):
+    """
+    Обрабатывает задачи маркетплейса. Задачи с временными ошибками
+    (таймаут, блокировка, сбой разбора) повторяются в рамках того же обхода
+    с экспоненциальной задержкой. Задачи, отложенные предохранителем,
+    в результат не попадают и остаются до следующего обхода.
+    `first_attempt=1` — задачи уже обработаны один раз: обработка начинается с паузы первого повтора.
+    """
+    results = {}
+    pending = tasks
+
+    for attempt in range(first_attempt, settings.retry_attempts + 1):
+        if attempt:
+            delay = settings.retry_backoff_seconds * 2 ** (attempt - 1)
+            logger.info("Retrying %d tasks in %.0f seconds (attempt %d)", len(pending), delay, attempt)
+            await asyncio.sleep(delay)
+
+        tasks_by_product_id = {task.product_id: task for task in pending}
+        pending = []
+        for result in await process_func(list(tasks_by_product_id.values()), context, **runner_options):
+            results[result.product_id] = result
+            if result.last_error and result.last_error.is_transient:
+                pending.append(tasks_by_product_id[result.product_id])
+
+        if not pending:
+            break
+
+    return list(results.values())
+
+
+async def iter_sweep_batches(pool, marketplace: str, batch_size: int) -> AsyncIterator[list[SweepListing]]:
+    """
+    Задачи обхода маркетплейса страницами по `batch_size` карточек в порядке listing_id.
+    Соединение берётся из пула только на время чтения страницы и не удерживается, пока страница парсится.
+    """
+    after_listing_id = 0
+    while True:
+        async with pool.acquire() as conn:
+            products = await db.products.get_products_items_for_parsing_page(
+                conn=conn, marketplace=marketplace, after_listing_id=after_listing_id, limit=batch_size,
+            )
+        if not products:
+            return
+        yield products
+        if len(products) < batch_size:
+            return
+        after_listing_id = products[-1].listing_id
+
+
+def build_sweep_tasks(products: list[SweepListing]) -> tuple[list[ParseTask], dict[int, SweepListing]]:
+    """
+    Задачи парсинга из карточек `get_products_items_for_parsing_page` и сами карточки по listing_id:
+    с ними сравниваются результаты, чтобы не переписывать неизменившиеся карточки.
+    """
+    return [listing.task() for listing in products], {listing.listing_id: listing for listing in products}
 
 
-async def scheduled_task():
+async def scheduled_task(
+    browser_backend: Optional[Callable[[ParserSettings], AsyncContextManager["BrowserBackend"]]] = None,
+):
+    """
+    Один обход: задачи из БД, парсинг по маркетплейсам, запись результатов и уведомления.
+    `browser_backend` открывает источник контекстов браузера на время обхода
+    (по умолчанию Playwright под Xvfb; нагрузочные тесты подставляют поддельный).
+    """
     logger.info("Scheduled task started")
+    browser_backend = browser_backend or playwright_backend
     pool = global_pool.db_pool_global
     bot = global_pool.bot_instance
+    settings = global_pool.parser_settings or ParserSettings()
+    planner = SweepPlanner(
+        settings.sweep_interval_minutes * 60, deadline_ratio=settings.sweep_deadline_ratio
+    )
 
     if pool is None:
         logger.error("DB pool is not initialized!")
         raise RuntimeError("DB pool is not initialized!")
 
-    # Получаем задачи из БД до запуска браузера
+    # До запуска браузера считаем задачи по маркетплейсам; сами задачи читаются страницами во время обхода.
+    # Секции истории цен создаются один раз за обход, а не при каждой записи пачки
     async with pool.acquire() as conn:
-        products = await db.products.get_products_items_for_parsing(conn=conn)
+        counts = await db.products.count_products_items_for_parsing(conn=conn)
+        await db.price_history.ensure_price_history_partitions(conn=conn)
 
-    # Запускаем xvfb вне async, чтобы не блокировать event loop
-    xvfb = Xvfb(width=1280, height=720)
-    xvfb.start()
+    tasks_map = {
+        "wildberries": process_many_wb_tasks,
+        "ozon": process_many_ozon_tasks,
+        "joom": process_many_joom_tasks,
+        "yandex": process_many_yandex_market_tasks,
+    }
+    total = sum(counts.get(marketplace, 0) for marketplace in tasks_map)
+    if not total:
+        logger.info("No listings to parse")
+        return
 
-    chromium_args = [
-        "--disable-blink-features=AutomationControlled",
-        "--no-sandbox",
-        "--disable-dev-shm-usage",
-        "--disable-gpu",
-        "--disable-extensions",
-        "--disable-infobars",
-    ]
+    async with browser_backend(settings) as backend:
+        # Неответившие прокси исключаются до начала обхода
+        proxies = get_proxy_pool(settings)
+        if proxies:
+            await proxies.check(settings.proxy_check_url)
 
-    try:
-        async with stealth.use_async(async_playwright())  as p:
-            browser = await p.chromium.launch(
-                headless=False, 
-                args=chromium_args
-            )
-            context = await browser.new_context(
-                user_agent=(
-                    f"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                    f"(KHTML, like Gecko) Chrome/{random.randint(100, 115)}.0.0.0 Safari/537.36"
+        # Страховочные попытки идут в свежих контекстах через прокси пула и делят общий бюджет обхода
+        hedge_budget = HedgeBudget(settings.hedge_budget_ratio)
+
+        sweep_started = time.monotonic()
+        planned = {}
+        for marketplace, process_func in tasks_map.items():
+            if not counts.get(marketplace):
+                continue
+            marketplace_started = time.monotonic()
+            limiter = get_limiter(marketplace, settings)
+            # Несколько контекстов со своими отпечатками; вкладки каждого переиспользуются между товарами
+            contexts = ContextPool(
+                marketplace,
+                functools.partial(backend.launch_context, marketplace),
+                size=settings.contexts_per_marketplace.get(marketplace, 1),
+                min_health=settings.context_min_health,
+                max_pages=settings.context_max_pages,
+                page_pool_factory=lambda context: PagePool(
+                    context,
+                    size=settings.concurrency_ceiling.get(marketplace, 1),
+                    max_uses=settings.page_pool_max_uses,
+                    memory_limit_mb=settings.page_pool_memory_limit_mb,
                 ),
-                viewport={"width": random.randint(1000, 1400), "height": random.randint(800, 1200)},
-                java_script_enabled=True,
-                locale="ru-RU",
-                bypass_csp=True,
+                proxies=proxies or None,
+                hedge_factory=backend.new_hedge_context,
             )
+            runner_options = dict(
+                breaker=get_breaker(marketplace, settings),
+                limiter=limiter,
+                page_budget=settings.page_budget_seconds,
+                latency=get_latency_tracker(marketplace, settings),
+                hedge_budget=hedge_budget,
+                context_factory=contexts.new_hedge_context,
+                page_pool=contexts,
+                ssr=get_ssr_tracker(marketplace, settings),
+                artifacts=get_artifact_store(settings),
+            )
+            # Задачи с временными ошибками со всех страниц повторяются один раз после последней страницы,
+            # чтобы пауза перед повтором не набегала на каждой странице
+            retry_tasks = []
+            retry_loaded = {}
+            try:
+                await contexts.start()
+                async for products in iter_sweep_batches(pool, marketplace, settings.sweep_batch_size):
+                    tasks, loaded = build_sweep_tasks(products)
+                    # Параллельность и отбрасывание проверок подбираются для страницы в её доле интервала
+                    plan = planner.plan({marketplace: tasks}, {marketplace: limiter}, share=len(tasks) / total)
+                    planned[marketplace] = planned.get(marketplace, 0.0) + plan.estimated_seconds
+                    planned_tasks = plan.tasks_by_marketplace.get(marketplace, [])
+                    parsed_products = await process_func(planned_tasks, None, **runner_options)
+                    if settings.retry_attempts:
+                        transient = {
+                            result.product_id for result in parsed_products
+                            if result.last_error and result.last_error.is_transient
+                        }
+                        for task in planned_tasks:
+                            if task.product_id in transient:
+                                retry_tasks.append(task)
+                                retry_loaded[task.product_id] = loaded[task.product_id]
+                        parsed_products = [result for result in parsed_products if result.product_id not in transient]
+                    await handle_parsing_results(pool, bot, parsed_products, settings, loaded)
 
-            # Патчим контекст для обхода обнаружения
-            await stealth.apply_stealth_async(context)
-
-            tasks_map = {
-                "wildberries": process_many_wb_tasks,
-                "ozon": process_many_ozon_tasks,
-                "joom": process_many_joom_tasks,
-                "yandex": process_many_yandex_market_tasks,
-            }
-
-            # Группируем задачи по маркетплейсам
-            tasks_by_marketplace = {key: [] for key in tasks_map.keys()}
-            for user_id, product_id, product_url, marketplace, min_price, target_price in products:
-                if marketplace in tasks_by_marketplace:
-                    tasks_by_marketplace[marketplace].append(
-                        (user_id, product_id, product_url, min_price, target_price)
+                if retry_tasks:
+                    parsed_products = await process_with_retries(
+                        process_func, retry_tasks, None, settings, first_attempt=1, **runner_options,
                     )
+                    await handle_parsing_results(pool, bot, parsed_products, settings, retry_loaded)
+            finally:
+                # Закрытие постоянных контекстов сохраняет cookies и кеш в профили
+                await contexts.close()
 
-            for marketplace, process_func in tasks_map.items():
-                tasks = tasks_by_marketplace[marketplace]
-                if not tasks:
-                    continue
-
-                parsed_products = await process_func(tasks, context)
-                await handle_parsing_results(pool, bot, parsed_products)
-                
-            await context.close()
-            await browser.close()
+            logger.info(
+                "Finished %s in %.0f seconds, planned %.0f seconds",
+                marketplace, time.monotonic() - marketplace_started, planned.get(marketplace, 0.0),
+            )
 
-    finally:
-        xvfb.stop()
+        hedge_budget.log_summary()
+        logger.info(
+            "Sweep finished in %.0f seconds, planned %.0f seconds",
+            time.monotonic() - sweep_started, sum(planned.values()),
+        )
 
 
 async def on_startup():
     """
     Запуск планировщика задач.
     """
-    scheduler.add_job(scheduled_task, 'interval', minutes=120)
+    settings = global_pool.parser_settings or ParserSettings()
+    scheduler.add_job(scheduled_task, 'interval', minutes=settings.sweep_interval_minutes)
     scheduler.start()
 
 #для ручного просмотра и остановки процесса
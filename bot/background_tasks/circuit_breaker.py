@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Callable, Optional
+
+from enums.parse_errors import ParseError
+
+logger = logging.getLogger(__name__)
+
+
+class BreakerState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+@dataclass(frozen=True, slots=True)
+class BreakerTicket:
+    """
+    Пропуск страницы через предохранитель. `probe` — номер пробной страницы в half-open,
+    0 — обычная страница: в half-open результат принимается только от пропуска пробы.
+    """
+    probe: int = 0
+
+
+PASS = BreakerTicket()
+
+
+class CircuitBreaker:
+    """
+    Предохранитель маркетплейса по скользящему окну последних результатов.
+    Размыкается, когда доля ошибок или доля страниц-заглушек (капча, блокировка)
+    превышает порог. В разомкнутом состоянии задачи откладываются до следующего обхода,
+    по истечении паузы пропускается одна пробная страница (half-open):
+    успех замыкает предохранитель, неудача размыкает его снова.
+    Проба, завершившаяся без результата (отмена, исключение), тоже размыкает его снова,
+    чтобы ожидающие пробу задачи не зависли.
+    """
+
+    def __init__(
+        self,
+        marketplace: str,
+        *,
+        window: int = 20,
+        min_samples: int = 10,
+        failure_rate: float = 0.5,
+        challenge_rate: float = 0.3,
+        open_seconds: float = 600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.marketplace = marketplace
+        self.min_samples = min_samples
+        self.failure_rate = failure_rate
+        self.challenge_rate = challenge_rate
+        self.open_seconds = open_seconds
+        self.clock = clock
+
+        self.state = BreakerState.CLOSED
+        self.opened_at = 0.0
+        # (is_failure, is_challenge) по каждой обработанной странице
+        self._outcomes: deque[tuple[bool, bool]] = deque(maxlen=window)
+        self._probe_done: Optional[asyncio.Event] = None
+        self._probe = 0
+
+    async def acquire(self) -> Optional[BreakerTicket]:
+        """
+        Возвращает пропуск, если страницу можно обрабатывать, и None, если задачу нужно отложить.
+        Пропуск передаётся в `record` вместе с результатом и в `release` после страницы.
+        Пока идёт пробная страница, остальные задачи ждут её результата.
+        """
+        while True:
+            if self.state is BreakerState.CLOSED:
+                return PASS
+
+            if self.state is BreakerState.OPEN:
+                if self.clock() - self.opened_at < self.open_seconds:
+                    return None
+                self.state = BreakerState.HALF_OPEN
+                self._probe_done = asyncio.Event()
+                self._probe += 1
+                logger.info("Circuit breaker for %s is half-open, sending probe", self.marketplace)
+                return BreakerTicket(self._probe)
+
+            await self._probe_done.wait()
+
+    def record(self, error: Optional[ParseError], ticket: BreakerTicket = PASS) -> None:
+        is_challenge = error is ParseError.BLOCKED
+        is_failure = error is not None and error.is_transient
+
+        if self.state is BreakerState.HALF_OPEN:
+            # Исход пробы решает только её результат; страницы, начатые до размыкания, не учитываются
+            if not self._is_pending_probe(ticket):
+                return
+            if is_failure:
+                self._open()
+            else:
+                logger.info("Circuit breaker for %s closed after successful probe", self.marketplace)
+                self.state = BreakerState.CLOSED
+                self._outcomes.clear()
+            self._probe_done.set()
+            return
+
+        self._outcomes.append((is_failure, is_challenge))
+        if self.state is BreakerState.CLOSED and self._should_open():
+            self._open()
+
+    def release(self, ticket: BreakerTicket) -> None:
+        """
+        Вызывается после страницы в любом случае. Если проба так и не записала результат
+        (задача отменена или упала), предохранитель снова размыкается и ожидающие задачи освобождаются.
+        """
+        if self.state is BreakerState.HALF_OPEN and self._is_pending_probe(ticket):
+            logger.warning("Circuit breaker for %s probe ended without result, reopening", self.marketplace)
+            self._open()
+            self._probe_done.set()
+
+    def _is_pending_probe(self, ticket: BreakerTicket) -> bool:
+        return ticket.probe != 0 and ticket.probe == self._probe
+
+    def _should_open(self) -> bool:
+        total = len(self._outcomes)
+        if total < self.min_samples:
+            return False
+        failures = sum(1 for is_failure, _ in self._outcomes if is_failure)
+        challenges = sum(1 for _, is_challenge in self._outcomes if is_challenge)
+        return failures / total >= self.failure_rate or challenges / total >= self.challenge_rate
+
+    def _open(self) -> None:
+        self.state = BreakerState.OPEN
+        self.opened_at = self.clock()
+        logger.warning(
+            "Circuit breaker for %s opened for %.0f seconds", self.marketplace, self.open_seconds
+        )
@@ -0,0 +1,66 @@
+import logging
+import math
+from collections import deque
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """
+    Скользящее окно задержек успешных страниц маркетплейса.
+    По нему определяется момент запуска страховочной (hedged) попытки.
+    """
+
+    def __init__(self, marketplace: str, *, window: int = 200, min_samples: int = 20):
+        self.marketplace = marketplace
+        self.min_samples = min_samples
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        Перцентиль `q` (0..1) по окну; None, пока выборка меньше `min_samples`.
+        """
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+        return ordered[index]
+
+    def p95(self) -> Optional[float]:
+        return self.percentile(0.95)
+
+
+class HedgeBudget:
+    """
+    Общий на весь обход лимит страховочных попыток: их число не превышает
+    доли `ratio` от числа основных страниц, чтобы хеджирование не удваивало нагрузку
+    на маркетплейсы при общей деградации.
+    """
+
+    def __init__(self, ratio: float = 0.05):
+        self.ratio = ratio
+        self.primaries = 0
+        self.hedges = 0
+        self.wins = 0
+
+    def record_primary(self) -> None:
+        self.primaries += 1
+
+    def try_acquire(self) -> bool:
+        if self.hedges + 1 > self.ratio * self.primaries:
+            return False
+        self.hedges += 1
+        return True
+
+    def record_win(self) -> None:
+        self.wins += 1
+
+    def log_summary(self) -> None:
+        if self.hedges:
+            logger.info(
+                "Hedged %d of %d pages, %d hedges finished first", self.hedges, self.primaries, self.wins
+            )
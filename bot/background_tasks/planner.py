@@ -0,0 +1,140 @@
+import logging
+import math
+from dataclasses import dataclass, field
+from typing import Optional
+
+from bot.background_tasks.aimd import AdaptiveConcurrencyLimiter
+from enums.parse_records import ParseTask
+
+logger = logging.getLogger(__name__)
+
+
+def task_priority(product_info: ParseTask) -> float:
+    """
+    Чем больше значение, тем ниже приоритет проверки.
+    Товары без истории цены (ни разу не распарсенные) получают наивысший приоритет,
+    остальные ранжируются по удалённости минимальной цены от целевой.
+    """
+    min_price, target_price = product_info.min_price, product_info.target_price
+    if min_price is None or not target_price:
+        return 0.0
+    return min_price / target_price
+
+
+@dataclass
+class SweepPlan:
+    tasks_by_marketplace: dict[str, list[ParseTask]]
+    estimates: dict[str, float] = field(default_factory=dict)
+    shed: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def estimated_seconds(self) -> float:
+        return sum(self.estimates.values())
+
+
+class SweepPlanner:
+    """
+    Оценивает длительность обхода по числу задач и наблюдаемой задержке страниц
+    каждого маркетплейса. Маркетплейсы обходятся последовательно, поэтому оценки складываются.
+    Если оценка не укладывается в интервал планировщика, сначала поднимается параллельность
+    (в пределах потолка ограничителя), а затем отбрасываются наименее приоритетные проверки.
+    Параллельность маркетплейса, которую ограничитель снизил за последние `raise_cooldown` секунд
+    (по умолчанию — интервал планировщика), не поднимается: снижение после блокировки или таймаута
+    не отменяется при планировании следующей страницы задач.
+    """
+
+    def __init__(
+        self,
+        interval_seconds: float,
+        *,
+        deadline_ratio: float = 0.9,
+        default_latency: float = 30.0,
+        raise_cooldown: Optional[float] = None,
+    ):
+        self.budget = interval_seconds * deadline_ratio
+        self.default_latency = default_latency
+        self.raise_cooldown = interval_seconds if raise_cooldown is None else raise_cooldown
+
+    def latency(self, limiter: AdaptiveConcurrencyLimiter) -> float:
+        return limiter.avg_latency or self.default_latency
+
+    def estimate(self, count: int, limiter: AdaptiveConcurrencyLimiter) -> float:
+        return math.ceil(count / limiter.limit) * self.latency(limiter)
+
+    def plan(
+        self,
+        tasks_by_marketplace: dict[str, list[ParseTask]],
+        limiters: dict[str, AdaptiveConcurrencyLimiter],
+        *,
+        share: float = 1.0,
+    ) -> SweepPlan:
+        """
+        `share` — доля обхода, которую составляют переданные задачи: при чтении задач страницами
+        каждая страница планируется в пропорциональной части бюджета.
+        """
+        budget = self.budget * share
+        tasks_by_marketplace = {m: list(tasks) for m, tasks in tasks_by_marketplace.items() if tasks}
+
+        def estimates() -> dict[str, float]:
+            return {m: self.estimate(len(tasks), limiters[m]) for m, tasks in tasks_by_marketplace.items()}
+
+        current = estimates()
+
+        # Поднимаем параллельность у самого долгого маркетплейса, пока есть запас до потолка
+        while sum(current.values()) > budget:
+            growable = [
+                m for m in current
+                if limiters[m].limit < limiters[m].ceiling and not limiters[m].decreased_within(self.raise_cooldown)
+            ]
+            if not growable:
+                break
+            slowest = max(growable, key=current.get)
+            limiters[slowest].limit += 1
+            current[slowest] = self.estimate(len(tasks_by_marketplace[slowest]), limiters[slowest])
+
+        shed = {}
+        excess = sum(current.values()) - budget
+        if excess > 0:
+            candidates = sorted(
+                (
+                    (task_priority(task), marketplace, task)
+                    for marketplace, tasks in tasks_by_marketplace.items()
+                    for task in tasks
+                    if task_priority(task) > 0
+                ),
+                key=lambda item: item[0],
+                reverse=True,
+            )
+            dropped = {marketplace: set() for marketplace in tasks_by_marketplace}
+            for _, marketplace, task in candidates:
+                if excess <= 0:
+                    break
+                dropped[marketplace].add(task.product_id)
+                # Одна задача занимает latency / limit секунд обхода
+                limiter = limiters[marketplace]
+                excess -= self.latency(limiter) / limiter.limit
+
+            for marketplace, product_ids in dropped.items():
+                if product_ids:
+                    tasks_by_marketplace[marketplace] = [
+                        task for task in tasks_by_marketplace[marketplace] if task.product_id not in product_ids
+                    ]
+                    shed[marketplace] = len(product_ids)
+            current = estimates()
+
+        plan = SweepPlan(tasks_by_marketplace=tasks_by_marketplace, estimates=current, shed=shed)
+        for marketplace, estimate in plan.estimates.items():
+            logger.info(
+                "Planned %s: %d tasks, concurrency %d, ~%.0f seconds, shed %d",
+                marketplace,
+                len(plan.tasks_by_marketplace[marketplace]),
+                limiters[marketplace].limit,
+                estimate,
+                shed.get(marketplace, 0),
+            )
+        if plan.estimated_seconds > budget:
+            logger.warning(
+                "Planned sweep duration %.0f seconds exceeds budget %.0f seconds",
+                plan.estimated_seconds, budget,
+            )
+        return plan
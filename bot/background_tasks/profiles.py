@@ -0,0 +1,119 @@
+import json
+import logging
+import os
+import random
+import shutil
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_META_FILE = "profile.json"
+# Сочетания локали и часового пояса, правдоподобные для покупателя из России
+LOCALES = [
+    ("ru-RU", "Europe/Moscow"),
+    ("ru-RU", "Europe/Samara"),
+    ("ru-RU", "Asia/Yekaterinburg"),
+    ("ru-RU", "Asia/Novosibirsk"),
+    ("ru", "Europe/Moscow"),
+]
+
+
+def random_fingerprint() -> dict:
+    """
+    Случайные user-agent, размер окна, локаль и часовой пояс для нового контекста браузера.
+    """
+    locale, timezone_id = random.choice(LOCALES)
+    return {
+        "locale": locale,
+        "timezone_id": timezone_id,
+        "user_agent": (
+            f"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+            f"(KHTML, like Gecko) Chrome/{random.randint(100, 115)}.0.0.0 Safari/537.36"
+        ),
+        "viewport": {"width": random.randint(1000, 1400), "height": random.randint(800, 1200)},
+    }
+
+
+def directory_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total
+
+
+class BrowserProfileStore:
+    """
+    Постоянные профили браузера (по одному на каждый контекст маркетплейса): HTTP-кеш, cookies, регион и согласия
+    сохраняются между обходами. Отпечаток (user-agent, окно) выбирается при создании профиля
+    и не меняется до его сброса, чтобы cookies не расходились с user-agent.
+    Ключ профиля — имя маркетплейса с номером контекста, например `ozon-0`.
+    Профиль сбрасывается целиком, когда старше `max_age_hours` или занимает больше `max_profile_mb`.
+    Размер HTTP-кеша ограничивается самим Chromium (`--disk-cache-size`).
+    """
+
+    def __init__(
+        self,
+        base_dir: str | Path,
+        *,
+        cache_size_mb: int = 256,
+        max_profile_mb: int = 1024,
+        max_age_hours: float = 72.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.base_dir = Path(base_dir)
+        self.cache_size_mb = cache_size_mb
+        self.max_profile_mb = max_profile_mb
+        self.max_age_hours = max_age_hours
+        self.clock = clock
+
+    def profile_dir(self, key: str) -> Path:
+        return self.base_dir / key
+
+    def launch_args(self) -> list[str]:
+        return [f"--disk-cache-size={self.cache_size_mb * 1024 * 1024}"]
+
+    def prepare(self, key: str, proxy_server: Optional[str] = None) -> dict:
+        """
+        Готовит профиль `key` к запуску и возвращает его отпечаток.
+        Устаревший, разросшийся или созданный для другого прокси профиль предварительно удаляется:
+        cookies сессии не должны переезжать на другой IP.
+        """
+        profile_dir = self.profile_dir(key)
+        meta = self._read_meta(profile_dir)
+
+        if meta is not None:
+            age_hours = (self.clock() - meta.get("created_at", 0)) / 3600
+            size_mb = directory_size(profile_dir) / (1024 * 1024)
+            proxy_changed = meta.get("proxy") != proxy_server
+            if age_hours >= self.max_age_hours or size_mb > self.max_profile_mb or proxy_changed:
+                logger.info(
+                    "Resetting %s browser profile (age %.0f h, size %.0f MB, proxy changed: %s)",
+                    key, age_hours, size_mb, proxy_changed,
+                )
+                self.reset(key)
+                meta = None
+
+        if meta is None:
+            # Профиль без метаданных не сопоставить с отпечатком, начинаем с чистого
+            self.reset(key)
+            meta = {"created_at": self.clock(), "proxy": proxy_server, **random_fingerprint()}
+            profile_dir.mkdir(parents=True, exist_ok=True)
+            (profile_dir / PROFILE_META_FILE).write_text(json.dumps(meta), encoding="utf-8")
+
+        return {name: value for name, value in meta.items() if name not in ("created_at", "proxy")}
+
+    def reset(self, key: str) -> None:
+        shutil.rmtree(self.profile_dir(key), ignore_errors=True)
+
+    @staticmethod
+    def _read_meta(profile_dir: Path) -> dict | None:
+        try:
+            return json.loads((profile_dir / PROFILE_META_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
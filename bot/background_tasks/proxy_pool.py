@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from enums.parse_errors import ParseError
+from bot.background_tasks.aimd import OVERLOAD_ERRORS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(eq=False)
+class ProxyState:
+    server: str
+    username: Optional[str] = None
+    password: Optional[str] = None
+    # Скользящие средние задержки страницы (секунды) и доли перегрузочных ошибок
+    avg_latency: Optional[float] = None
+    error_rate: float = 0.0
+    samples: int = 0
+    ejected_until: float = 0.0
+    in_flight: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+    @classmethod
+    def from_url(cls, url: str) -> "ProxyState":
+        parts = urlsplit(url if "://" in url else f"http://{url}")
+        server = f"{parts.scheme}://{parts.hostname}" + (f":{parts.port}" if parts.port else "")
+        return cls(server=server, username=parts.username, password=parts.password)
+
+    @property
+    def url(self) -> str:
+        if not self.username:
+            return self.server
+        scheme, host = self.server.split("://", 1)
+        return f"{scheme}://{self.username}:{self.password or ''}@{host}"
+
+    @property
+    def score(self) -> float:
+        """
+        Чем больше, тем лучше: доля успешных страниц с поправкой на задержку.
+        """
+        return (1 - self.error_rate) / (1 + (self.avg_latency or 0) / 10)
+
+    def playwright_proxy(self) -> dict:
+        proxy = {"server": self.server}
+        if self.username:
+            proxy["username"] = self.username
+            proxy["password"] = self.password or ""
+        return proxy
+
+
+class ProxyPool:
+    """
+    Пул прокси для контекстов браузера.
+    Контекст закрепляется за прокси (sticky): ключ сессии, например `ozon-0`, получает прокси
+    по rendezvous-хешированию, поэтому назначение не меняется между обходами и перезапусками,
+    пока прокси исправен. На каждый прокси действует свой лимит параллельных страниц
+    по маркетплейсу. Прокси, у которого доля таймаутов и блокировок превысила порог,
+    исключается на `eject_seconds`, его сессии переназначаются на другие прокси.
+    """
+
+    def __init__(
+        self,
+        proxies: list[str],
+        *,
+        max_concurrent: Optional[dict[str, int]] = None,
+        default_max_concurrent: int = 2,
+        eject_error_rate: float = 0.5,
+        eject_seconds: float = 900.0,
+        min_samples: int = 5,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.proxies = [ProxyState.from_url(url) for url in proxies]
+        self.max_concurrent = max_concurrent or {}
+        self.default_max_concurrent = default_max_concurrent
+        self.eject_error_rate = eject_error_rate
+        self.eject_seconds = eject_seconds
+        self.min_samples = min_samples
+        self.clock = clock
+        self._sticky: dict[str, ProxyState] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.proxies)
+
+    def is_ejected(self, proxy: ProxyState) -> bool:
+        if proxy.ejected_until and self.clock() >= proxy.ejected_until:
+            # Срок исключения истёк: прокси возвращается с чистой статистикой
+            proxy.ejected_until = 0.0
+            proxy.error_rate = 0.0
+            proxy.samples = 0
+            logger.info("Proxy %s returned to the pool", proxy.server)
+        return bool(proxy.ejected_until)
+
+    def assign(self, key: str) -> Optional[ProxyState]:
+        """
+        Прокси для сессии `key`: прежний, если он не исключён, иначе выбранный rendezvous-хешированием
+        среди доступных. Если исключены все, берётся тот, что вернётся раньше других.
+        """
+        if not self.proxies:
+            return None
+        current = self._sticky.get(key)
+        if current and not self.is_ejected(current):
+            return current
+
+        available = [proxy for proxy in self.proxies if not self.is_ejected(proxy)]
+        if available:
+            proxy = max(available, key=lambda p: hashlib.sha256(f"{key}|{p.server}".encode()).digest())
+        else:
+            proxy = min(self.proxies, key=lambda p: p.ejected_until)
+            logger.warning("All proxies are ejected, using %s for %s", proxy.server, key)
+
+        if current is not proxy:
+            logger.info("Session %s assigned to proxy %s", key, proxy.server)
+        self._sticky[key] = proxy
+        return proxy
+
+    def limit(self, marketplace: str) -> int:
+        return self.max_concurrent.get(marketplace, self.default_max_concurrent)
+
+    def has_capacity(self, proxy: Optional[ProxyState], marketplace: str) -> bool:
+        return proxy is None or proxy.in_flight[marketplace] < self.limit(marketplace)
+
+    def acquire(self, proxy: Optional[ProxyState], marketplace: str) -> None:
+        if proxy:
+            proxy.in_flight[marketplace] += 1
+
+    def release(self, proxy: Optional[ProxyState], marketplace: str) -> None:
+        if proxy:
+            proxy.in_flight[marketplace] -= 1
+
+    def record(self, proxy: Optional[ProxyState], latency: float, error: Optional[ParseError]) -> None:
+        if proxy is None:
+            return
+        failed = error in OVERLOAD_ERRORS
+        proxy.avg_latency = latency if proxy.avg_latency is None else 0.8 * proxy.avg_latency + 0.2 * latency
+        proxy.error_rate = 0.8 * proxy.error_rate + 0.2 * failed
+        proxy.samples += 1
+
+        if proxy.samples >= self.min_samples and proxy.error_rate >= self.eject_error_rate:
+            self.eject(proxy)
+
+    def eject(self, proxy: ProxyState) -> None:
+        if proxy.ejected_until:
+            return
+        proxy.ejected_until = self.clock() + self.eject_seconds
+        logger.warning(
+            "Proxy %s ejected for %.0f seconds (error rate %.2f)", proxy.server, self.eject_seconds, proxy.error_rate
+        )
+
+    async def check(self, url: str, *, timeout: float = 10.0) -> None:
+        """
+        Проверяет все доступные прокси запросом к `url` и исключает неответившие.
+        """
+        async def probe(proxy: ProxyState) -> None:
+            try:
+                async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+                    async with session.get(url, proxy=proxy.url) as response:
+                        if response.status < 500 and response.status != 407:
+                            return
+                        reason = f"status {response.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                reason = repr(e)
+            logger.warning("Proxy %s failed health check: %s", proxy.server, reason)
+            self.eject(proxy)
+
+        await asyncio.gather(*(probe(proxy) for proxy in self.proxies if not self.is_ejected(proxy)))
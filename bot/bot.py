@@ -1,4 +1,5 @@
 import logging
+from concurrent.futures import ProcessPoolExecutor
 
 import asyncpg
 from aiogram import Bot, Dispatcher
@@ -24,6 +25,7 @@ from bot.middlewares import (
 )
 from bot.locales.ru import RU
 from bot.background_tasks.background_tasks import on_startup
+from bot.parsers.rate_limiter import RedisTokenBucket
 from config.config import Config
 import bot.db_pool_singleton.db_pool_singleton as global_pool
 
@@ -33,17 +35,17 @@ logger = logging.getLogger(__name__)
 async def main(config: Config) -> None:
     logger.info("Starting bot...")
 
-    # Инициализируем хранилище для FSM через Redis
-    storage = RedisStorage(
-        redis=Redis(
-            host=config.redis.host,
-            port=config.redis.port,
-            db=config.redis.db,
-            password=config.redis.password,
-            username=config.redis.username,
-        )
+    redis = Redis(
+        host=config.redis.host,
+        port=config.redis.port,
+        db=config.redis.db,
+        password=config.redis.password,
+        username=config.redis.username,
     )
 
+    # Инициализируем хранилище для FSM через Redis
+    storage = RedisStorage(redis=redis)
+
     # Инициализируем бота с HTML разметкой по умолчанию
     bot = Bot(
         token=config.bot.token,
@@ -64,6 +66,17 @@ async def main(config: Config) -> None:
     )
     global_pool.db_pool_global = db_pool
     global_pool.bot_instance = bot
+    global_pool.parser_settings = config.parser
+    # Частота переходов на маркетплейсы ограничивается через Redis общим лимитом для всех процессов
+    global_pool.rate_limiter = RedisTokenBucket(
+        redis,
+        config.parser.host_rate_limits,
+        default_rate=config.parser.host_rate_default,
+        burst=config.parser.host_rate_burst,
+    )
+    # Разбор HTML-снимков выносится в отдельные процессы, браузер только загружает страницы
+    if config.parser.extraction_workers > 0:
+        global_pool.extraction_executor = ProcessPoolExecutor(max_workers=config.parser.extraction_workers)
 
     # Получаем локализацию
     locales = RU
@@ -107,3 +120,5 @@ async def main(config: Config) -> None:
         # Закрываем пул при завершении
         await db_pool.close()
         logger.info("Connection to Postgres closed")
+        if global_pool.extraction_executor:
+            global_pool.extraction_executor.shutdown(cancel_futures=True)
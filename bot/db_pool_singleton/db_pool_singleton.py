@@ -1,7 +1,19 @@
-from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Optional
 import asyncpg
 from aiogram import Bot
 
+from config.config import ParserSettings
+
+if TYPE_CHECKING:
+    from bot.parsers.rate_limiter import RedisTokenBucket
+
 bot_instance: Optional[Bot] = None
 
 db_pool_global: Optional[asyncpg.Pool] = None
+
+parser_settings: Optional[ParserSettings] = None
+
+rate_limiter: Optional["RedisTokenBucket"] = None
+
+extraction_executor: Optional[ProcessPoolExecutor] = None
@@ -11,6 +11,8 @@ logger = logging.getLogger(__name__)
 
 summary_router = Router()
 MAX_MSG_LENGTH = 4096
+# Период, за который в отчёте показывается изменение цены
+TREND_DAYS = 30
 
 
 async def send_long_message(message_obj: types.Message, text: str):
@@ -38,6 +40,9 @@ async def cmd_summary(message: types.Message, conn):
         products = await db.products.get_user_products_with_details(
             conn, user_id=user_id
         )
+        trends = await db.price_history.get_user_price_trends(
+            conn, user_id=user_id, days=TREND_DAYS
+        )
     except Exception:
         await message.answer("❌ К сожалению, возникли проблемы при получении данных.")
         logger.error("Failed to get user products with details.", exc_info=True) 
@@ -80,6 +85,13 @@ async def cmd_summary(message: types.Message, conn):
             continue
 
         if current_price is not None:
+            trend_line = ""
+            if product_id in trends:
+                first_price, last_price, low, high, changes = trends[product_id]
+                trend_line = (
+                    f"📈 За {TREND_DAYS} дн.: {first_price} → {last_price} ₽ "
+                    f"(от {low} до {high} ₽, изменений: {changes})\n"
+                )
             if current_price <= target_price:
                 status_line = "✅ Цель достигнута!\n"
                 diff_line = "\n"
@@ -97,6 +109,7 @@ async def cmd_summary(message: types.Message, conn):
                 f"💰 Текущая: {current_price} ₽"
                 f"{diff_line}"
                 f"📉 Минимум: {min_price} ₽\n"
+                f"{trend_line}"
                 f"🕒 Последняя проверка: {last_checked_str}\n"
             )
         else:
@@ -0,0 +1,151 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from enums.parse_errors import ParseError
+
+logger = logging.getLogger(__name__)
+
+HTML_SUFFIX = ".html.gz"
+META_SUFFIX = ".json"
+
+
+class ArtifactStore:
+    """
+    Снимки страниц для разбора ошибок без повторной загрузки с маркетплейса.
+    Сохраняются все страницы с ошибкой и доля `success_sample_rate` успешных:
+    сжатый HTML (`<id>.html.gz`) и метаданные (`<id>.json`) — маркетплейс, адрес,
+    результат парсера, чем найдена цена (`ParseResult.source`) и время по этапам. Каталог ограничен `max_mb`; при переполнении
+    удаляются снимки, к которым дольше всего не обращались (чтение обновляет mtime).
+    Размер каталога считается по записанным файлам: каталог сканируется при первом
+    сохранении и затем только при превышении `max_mb`.
+    Методы синхронные, из цикла событий их вызывают через `asyncio.to_thread`.
+    """
+
+    def __init__(
+        self,
+        base_dir: str | Path,
+        *,
+        max_mb: float = 200.0,
+        success_sample_rate: float = 0.02,
+        rng: Callable[[], float] = random.random,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.base_dir = Path(base_dir)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.success_sample_rate = success_sample_rate
+        self.rng = rng
+        self.clock = clock
+        self._total_bytes: Optional[int] = None
+
+    def should_capture(self, error: Optional[ParseError]) -> bool:
+        return error is not None or self.rng() < self.success_sample_rate
+
+    def save(
+        self,
+        marketplace: str,
+        url: str,
+        html: str,
+        *,
+        price: Optional[int] = None,
+        name: Optional[str] = None,
+        error: Optional[ParseError] = None,
+        source: Optional[str] = None,
+        stages: Optional[dict[str, float]] = None,
+    ) -> str:
+        """
+        Сохраняет снимок и возвращает его идентификатор.
+        """
+        captured_at = self.clock()
+        artifact_id = "{}{:06d}-{}-{}".format(
+            time.strftime("%Y%m%d%H%M%S", time.gmtime(captured_at)),
+            int(captured_at % 1 * 1_000_000),
+            marketplace,
+            hashlib.sha1(f"{url}|{captured_at}".encode()).hexdigest()[:10],
+        )
+        meta = {
+            "id": artifact_id,
+            "marketplace": marketplace,
+            "url": url,
+            "captured_at": captured_at,
+            "price": price,
+            "name": name,
+            "error": error.name if error else None,
+            "source": source,
+            "stages": {stage: round(seconds, 3) for stage, seconds in (stages or {}).items()},
+            "html_bytes": len(html.encode()),
+        }
+
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        if self._total_bytes is None:
+            self._total_bytes = sum(size for *_, size in self._snapshots())
+        html_path = self.base_dir / f"{artifact_id}{HTML_SUFFIX}"
+        meta_path = self.base_dir / f"{artifact_id}{META_SUFFIX}"
+        with gzip.open(html_path, "wt", encoding="utf-8") as f:
+            f.write(html)
+        meta_path.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        self._total_bytes += html_path.stat().st_size + meta_path.stat().st_size
+        if self._total_bytes > self.max_bytes:
+            self.evict()
+        return artifact_id
+
+    def entries(self, marketplace: Optional[str] = None) -> Iterator[dict]:
+        """
+        Метаданные сохранённых снимков в порядке сохранения.
+        """
+        if not self.base_dir.is_dir():
+            return
+        entries = []
+        for path in self.base_dir.glob(f"*{META_SUFFIX}"):
+            try:
+                meta = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if marketplace is None or meta.get("marketplace") == marketplace:
+                entries.append(meta)
+        yield from sorted(entries, key=lambda meta: (meta.get("captured_at", 0), meta["id"]))
+
+    def load_html(self, artifact_id: str) -> str:
+        path = self.base_dir / f"{artifact_id}{HTML_SUFFIX}"
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            html = f.read()
+        os.utime(path)
+        return html
+
+    def _snapshots(self) -> list[tuple[float, Path, Path, int]]:
+        snapshots = []
+        for path in self.base_dir.glob(f"*{HTML_SUFFIX}"):
+            meta_path = path.with_name(path.name[:-len(HTML_SUFFIX)] + META_SUFFIX)
+            try:
+                stat = path.stat()
+                size = stat.st_size + (meta_path.stat().st_size if meta_path.exists() else 0)
+            except OSError:
+                continue
+            snapshots.append((stat.st_mtime, path, meta_path, size))
+        return snapshots
+
+    def evict(self) -> None:
+        """
+        Удаляет давно не читанные снимки, пока каталог больше `max_bytes`.
+        """
+        snapshots = self._snapshots()
+        total = sum(size for *_, size in snapshots)
+
+        snapshots.sort(key=lambda item: item[0])
+        for _, path, meta_path, size in snapshots:
+            if total <= self.max_bytes:
+                break
+            for stale in (path, meta_path):
+                try:
+                    stale.unlink()
+                except FileNotFoundError:
+                    pass
+            total -= size
+            logger.debug("Artifact %s evicted", path.name)
+        self._total_bytes = total
@@ -0,0 +1,100 @@
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from playwright.async_api import Page
+
+logger = logging.getLogger(__name__)
+
+# Один вызов в странице собирает всё, что нужно для распознавания заглушки
+CHALLENGE_PROBE_JS = """() => ({
+    url: location.href,
+    title: document.title || '',
+    text: (document.body ? document.body.innerText : '').slice(0, 1500),
+    frames: Array.from(document.querySelectorAll('iframe')).map((f) => f.src || '').join(' '),
+})"""
+
+
+@dataclass(frozen=True)
+class ChallengeMarkers:
+    urls: tuple[str, ...] = ()
+    titles: tuple[str, ...] = ()
+    texts: tuple[str, ...] = ()
+    frames: tuple[str, ...] = ()
+
+    def __add__(self, other: "ChallengeMarkers") -> "ChallengeMarkers":
+        return ChallengeMarkers(
+            urls=self.urls + other.urls,
+            titles=self.titles + other.titles,
+            texts=self.texts + other.texts,
+            frames=self.frames + other.frames,
+        )
+
+
+# Признаки, общие для антибот-сервисов (Cloudflare, reCAPTCHA, hCaptcha, SmartCaptcha)
+COMMON_MARKERS = ChallengeMarkers(
+    urls=("/captcha", "showcaptcha", "__cf_chl", "/challenge"),
+    titles=("just a moment", "attention required", "access denied", "доступ ограничен", "проверка браузера"),
+    texts=(
+        "подтвердите, что вы не робот",
+        "вы не робот",
+        "checking your browser",
+        "enable javascript and cookies to continue",
+    ),
+    frames=("recaptcha", "hcaptcha", "smartcaptcha", "challenges.cloudflare.com"),
+)
+
+# Признаки заглушек отдельных маркетплейсов (все строки в нижнем регистре)
+MARKETPLACE_MARKERS = {
+    "wildberries": ChallengeMarkers(
+        titles=("почти готово",),
+        texts=("подозрительная активность",),
+    ),
+    "ozon": ChallengeMarkers(
+        urls=("/abt/", "antibot"),
+        titles=("antibot challenge",),
+        texts=("доступ к запрашиваемому ресурсу ограничен", "мы заметили подозрительную активность"),
+    ),
+    "yandex": ChallengeMarkers(
+        texts=(
+            "подтвердите, что запросы отправляли вы",
+            "запросы с вашего устройства похожи на автоматические",
+        ),
+    ),
+    "joom": ChallengeMarkers(),
+}
+
+
+def match_challenge(marketplace: str, probe: dict) -> Optional[str]:
+    """
+    Проверяет снимок страницы (url, title, text, frames) по признакам заглушки.
+    Возвращает описание найденного признака или None.
+    """
+    markers = COMMON_MARKERS + MARKETPLACE_MARKERS.get(marketplace, ChallengeMarkers())
+    fields = (
+        ("url", markers.urls),
+        ("title", markers.titles),
+        ("text", markers.texts),
+        ("frames", markers.frames),
+    )
+    for field_name, needles in fields:
+        value = (probe.get(field_name) or "").lower()
+        for needle in needles:
+            if needle in value:
+                return f"{field_name} contains '{needle}'"
+    return None
+
+
+async def detect_challenge(page: Page, marketplace: str) -> Optional[str]:
+    """
+    Распознаёт капчу или антибот-заглушку сразу после навигации, за один вызов в странице.
+    Если снимок снять не удалось, считается, что заглушки нет.
+    """
+    try:
+        probe = await page.evaluate(CHALLENGE_PROBE_JS)
+    except Exception as e:
+        logger.debug("Challenge probe failed for %s: %s", marketplace, e)
+        return None
+    if not isinstance(probe, dict):
+        return None
+    return match_challenge(marketplace, probe)
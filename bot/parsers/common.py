@@ -0,0 +1,96 @@
+import asyncio
+import logging
+from typing import Optional
+
+from playwright.async_api import Page, Response, Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+
+import bot.db_pool_singleton.db_pool_singleton as global_pool
+from enums.parse_errors import ParseError
+from enums.parse_records import ParseResult, ParseTask
+from bot.parsers.deadline import PageDeadline
+from bot.parsers.extraction import extract_offloaded
+
+logger = logging.getLogger(__name__)
+
+# Коды ответа, по которым маркетплейс явно сообщает о блокировке или отсутствии товара
+BLOCKED_STATUSES = {401, 403, 429, 498}
+NOT_FOUND_STATUSES = {404, 410}
+
+
+def classify_response(response: Optional[Response]) -> Optional[ParseError]:
+    """
+    Классифицирует ответ на `page.goto` по HTTP-статусу.
+    Возвращает None, если по статусу ошибку определить нельзя.
+    """
+    if response is None:
+        return None
+    status = response.status
+    if status in NOT_FOUND_STATUSES:
+        return ParseError.NOT_FOUND
+    if status in BLOCKED_STATUSES:
+        return ParseError.BLOCKED
+    if status >= 500:
+        return ParseError.TIMEOUT
+    return None
+
+
+def classify_exception(exc: BaseException) -> ParseError:
+    """
+    Классифицирует исключение, возникшее при обработке страницы.
+    Таймауты и сетевые ошибки навигации считаются временными.
+    """
+    if isinstance(exc, (PlaywrightTimeoutError, asyncio.TimeoutError)):
+        return ParseError.TIMEOUT
+    if isinstance(exc, PlaywrightError) and "net::ERR_" in str(exc):
+        return ParseError.TIMEOUT
+    return ParseError.PARSE_FAILED
+
+
+def build_result(
+    product_info: ParseTask,
+    price: Optional[int],
+    product_name: Optional[str],
+    error: Optional[ParseError],
+    source: Optional[str] = None,
+) -> ParseResult:
+    """
+    Собирает результат парсинга задачи: при ошибке цена и источник цены не заполняются,
+    иначе минимальная цена пересчитывается с учётом полученной.
+    user_id и product_id задачи передаются как есть: в задачах обхода это None и listing_id.
+    """
+    min_price = product_info.min_price
+
+    if error is None and price is None:
+        error = ParseError.PARSE_FAILED
+
+    if error is not None:
+        price, source = None, None
+    elif min_price is None or price <= min_price:
+        min_price = price
+    return ParseResult(
+        product_info.user_id, product_info.product_id, price, product_name,
+        min_price, error, product_info.target_price, product_info.url, source,
+    )
+
+
+async def extract_rendered(
+    page: Page,
+    marketplace: str,
+    product_info: ParseTask,
+    deadline: PageDeadline,
+) -> Optional[ParseResult]:
+    """
+    Запасной разбор отрендеренной страницы правилами `extract_product` (теми же, что ответы SSR
+    и снимки при replay), когда селекторы парсера видимой цены не нашли. Правила не учитывают
+    видимость элементов, поэтому на живой странице основной путь — селекторы.
+    Возвращает результат, если цена найдена, иначе None.
+    """
+    with deadline.stage("extract"):
+        html = await page.content()
+        extraction = await extract_offloaded(marketplace, html, global_pool.extraction_executor)
+    if extraction.price is None:
+        return None
+    logger.info(f"Rendered price: {extraction.price} ₽ ({extraction.source}), item: {extraction.name}")
+    return build_result(
+        product_info, extraction.price, extraction.name or "название товара не найдено", None, extraction.source,
+    )
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional
+
+from playwright.async_api import BrowserContext, Page
+
+from enums.parse_errors import ParseError
+from bot.parsers.page_pool import PagePool
+
+if TYPE_CHECKING:
+    from bot.background_tasks.proxy_pool import ProxyPool, ProxyState
+
+logger = logging.getLogger(__name__)
+
+# Вклад результата страницы в здоровье контекста: блокировка говорит об отпечатке,
+# таймаут — скорее о сети. Ошибки конкретного товара на здоровье не влияют.
+HEALTH_OUTCOMES = {
+    None: 1.0,
+    ParseError.BLOCKED: 0.0,
+    ParseError.TIMEOUT: 0.5,
+}
+
+
+@dataclass(eq=False)
+class ContextSlot:
+    index: int
+    context: BrowserContext
+    pages: PagePool
+    proxy: Optional["ProxyState"] = None
+    health: float = 1.0
+    in_flight: int = 0
+    served: int = 0
+    retiring: bool = False
+    idle: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class ContextPool:
+    """
+    Пул контекстов браузера одного маркетплейса, у каждого свой отпечаток
+    (user-agent, окно, локаль, часовой пояс) и свой пул вкладок.
+    Вкладка выдаётся из самого здорового и наименее загруженного контекста.
+    Здоровье — скользящее среднее исходов страниц; контекст с здоровьем ниже
+    `min_health` или обслуживший `max_pages` страниц выводится из ротации и после
+    завершения своих страниц заменяется новым с новым отпечатком.
+    `factory(index, fresh=..., proxy=...)` открывает контекст с номером `index` через прокси `proxy`
+    (ProxyState или None); `fresh=True` — с новым отпечатком.
+    Если передан пул прокси, каждый контекст закреплён за своим прокси, вкладка выдаётся только
+    из контекста, чей прокси не исчерпал лимит параллельности по маркетплейсу, а исходы страниц
+    учитываются в оценке прокси. Контекст исключённого прокси заменяется контекстом на другом прокси.
+    Интерфейс выдачи вкладок совпадает с PagePool, поэтому пул передаётся в run_marketplace_tasks
+    как `page_pool`. Контексты страховочных попыток открывает `hedge_factory(proxy=...)`
+    (см. `new_hedge_context`).
+    """
+
+    def __init__(
+        self,
+        marketplace: str,
+        factory: Callable[..., Awaitable[BrowserContext]],
+        *,
+        size: int = 2,
+        min_health: float = 0.3,
+        max_pages: int = 200,
+        page_pool_factory: Callable[[BrowserContext], PagePool] = PagePool,
+        proxies: Optional["ProxyPool"] = None,
+        hedge_factory: Optional[Callable[..., Awaitable[BrowserContext]]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.marketplace = marketplace
+        self.factory = factory
+        self.size = max(1, size)
+        self.min_health = min_health
+        self.max_pages = max_pages
+        self.page_pool_factory = page_pool_factory
+        self.proxies = proxies
+        self.hedge_factory = hedge_factory
+        self.clock = clock
+
+        self._slots: list[ContextSlot] = []
+        self._owners: dict[Page, tuple[ContextSlot, float]] = {}
+        self._capacity = asyncio.Condition()
+        self._rotations: set[asyncio.Task] = set()
+        self.rotated = 0
+
+    async def start(self) -> None:
+        for index in range(self.size):
+            self._slots.append(await self._open_slot(index, fresh=False))
+
+    async def acquire(self) -> Page:
+        async with self._capacity:
+            await self._capacity.wait_for(lambda: self._pick() is not None)
+            slot = self._pick()
+            slot.in_flight += 1
+            slot.served += 1
+            slot.idle.clear()
+            if self.proxies:
+                self.proxies.acquire(slot.proxy, self.marketplace)
+        try:
+            page = await slot.pages.acquire()
+        except BaseException:
+            await self._finish(slot)
+            raise
+        self._owners[page] = (slot, self.clock())
+        return page
+
+    async def release(self, page: Page, *, discard: bool = False, error: Optional[ParseError] = None) -> None:
+        slot, started_at = self._owners.pop(page)
+        if not discard and error in HEALTH_OUTCOMES:
+            slot.health = 0.8 * slot.health + 0.2 * HEALTH_OUTCOMES[error]
+        if self.proxies:
+            # Прерванная страница считается таймаутом прокси
+            self.proxies.record(slot.proxy, self.clock() - started_at, ParseError.TIMEOUT if discard else error)
+        try:
+            await slot.pages.release(page, discard=discard)
+        finally:
+            await self._finish(slot)
+
+        proxy_ejected = bool(self.proxies and slot.proxy and self.proxies.is_ejected(slot.proxy))
+        if not slot.retiring and (
+            slot.health < self.min_health or slot.served >= self.max_pages or proxy_ejected
+        ):
+            slot.retiring = True
+            logger.info(
+                "Rotating %s context #%d (health %.2f, served %d pages, proxy ejected: %s)",
+                self.marketplace, slot.index, slot.health, slot.served, proxy_ejected,
+            )
+            task = asyncio.create_task(self._rotate(slot))
+            self._rotations.add(task)
+            task.add_done_callback(self._rotations.discard)
+
+    async def new_hedge_context(self) -> BrowserContext:
+        """
+        Свежий контекст для страховочной попытки. С пулом прокси он идёт через прокси сессии
+        `<маркетплейс>-hedge`, как и контексты пула, а не с адреса сервера; исключённый прокси
+        заменяется так же. Закрывает контекст вызывающий. Передаётся в run_marketplace_tasks
+        как `context_factory`.
+        """
+        proxy = self.proxies.assign(f"{self.marketplace}-hedge") if self.proxies else None
+        return await self.hedge_factory(proxy=proxy)
+
+    def _pick(self) -> Optional[ContextSlot]:
+        active = [slot for slot in self._slots if not slot.retiring]
+        if not active:
+            # Пока все контексты на замене, ждём окончания ротации
+            if self._rotations:
+                return None
+            active = self._slots
+        candidates = [
+            slot for slot in active if not self.proxies or self.proxies.has_capacity(slot.proxy, self.marketplace)
+        ]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda s: s.health * (s.proxy.score if s.proxy else 1.0) / (1 + s.in_flight))
+
+    async def close(self) -> None:
+        if self._rotations:
+            await asyncio.gather(*self._rotations, return_exceptions=True)
+        slots, self._slots = self._slots, []
+        for slot in slots:
+            await self._close_slot(slot)
+
+    async def _finish(self, slot: ContextSlot) -> None:
+        async with self._capacity:
+            slot.in_flight -= 1
+            if slot.in_flight == 0:
+                slot.idle.set()
+            if self.proxies:
+                self.proxies.release(slot.proxy, self.marketplace)
+            self._capacity.notify_all()
+
+    async def _rotate(self, slot: ContextSlot) -> None:
+        # Дожидаемся страниц, уже выданных из этого контекста
+        await slot.idle.wait()
+        await self._close_slot(slot)
+        try:
+            replacement = await self._open_slot(slot.index, fresh=True)
+        except Exception as e:
+            logger.error("Failed to reopen %s context #%d: %s", self.marketplace, slot.index, e)
+            if len(self._slots) > 1:
+                self._slots.remove(slot)
+            else:
+                # Последний контекст не убираем, чтобы задачи завершились ошибкой, а не зависли
+                slot.retiring = False
+            replacement = None
+        if replacement:
+            self._slots[self._slots.index(slot)] = replacement
+            self.rotated += 1
+        async with self._capacity:
+            self._capacity.notify_all()
+
+    async def _open_slot(self, index: int, fresh: bool) -> ContextSlot:
+        proxy = self.proxies.assign(f"{self.marketplace}-{index}") if self.proxies else None
+        context = await self.factory(index, fresh=fresh, proxy=proxy)
+        slot = ContextSlot(index=index, context=context, pages=self.page_pool_factory(context), proxy=proxy)
+        slot.idle.set()
+        return slot
+
+    async def _close_slot(self, slot: ContextSlot) -> None:
+        await slot.pages.close()
+        try:
+            await slot.context.close()
+        except Exception as e:
+            logger.debug("Failed to close %s context #%d: %s", self.marketplace, slot.index, e)
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import math
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Бюджет времени страницы исчерпан."""
+
+
+class TimeoutMeter:
+    """
+    Копит время, проведённое страницами маркетплейса в каждом этапе
+    (навигация, ожидание загрузки, селекторы), и число таймаутов по этапам.
+    Итог пишется в лог после обхода и служит для подбора бюджета страницы.
+    """
+
+    def __init__(self, marketplace: str):
+        self.marketplace = marketplace
+        self.seconds: dict[str, float] = defaultdict(float)
+        self.calls: dict[str, int] = defaultdict(int)
+        self.timeouts: dict[str, int] = defaultdict(int)
+        self.pages = 0
+        self.expired_pages = 0
+
+    def add(self, stage: str, seconds: float, timed_out: bool) -> None:
+        self.seconds[stage] += seconds
+        self.calls[stage] += 1
+        if timed_out:
+            self.timeouts[stage] += 1
+
+    def log_summary(self) -> None:
+        if not self.pages:
+            return
+        stages = ", ".join(
+            f"{stage}: avg {self.seconds[stage] / self.calls[stage]:.1f}s, timeouts {self.timeouts[stage]}"
+            for stage in self.calls
+        )
+        logger.info(
+            "Page timings for %s (%d pages, %d expired): %s",
+            self.marketplace, self.pages, self.expired_pages, stages,
+        )
+
+
+class PageDeadline:
+    """
+    Общий бюджет времени на одну страницу. Каждое ожидание внутри парсера
+    получает таймаут не больше остатка бюджета, так что зависшая страница
+    освобождает слот параллельности вовремя.
+    """
+
+    def __init__(
+        self,
+        budget_seconds: float,
+        *,
+        meter: Optional[TimeoutMeter] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.clock = clock
+        self.meter = meter
+        self.expires_at = clock() + budget_seconds
+        # Время страницы по этапам, для метаданных снимков
+        self.stages: dict[str, float] = defaultdict(float)
+
+    def remaining(self) -> float:
+        return self.expires_at - self.clock()
+
+    def check(self) -> None:
+        if self.remaining() <= 0:
+            raise DeadlineExceeded("Page deadline exceeded")
+
+    def timeout(self, default_ms: int) -> int:
+        """
+        Таймаут ожидания Playwright в миллисекундах: не больше `default_ms` и остатка бюджета.
+        """
+        self.check()
+        remaining = self.remaining()
+        if math.isinf(remaining):
+            return default_ms
+        return min(default_ms, int(remaining * 1000))
+
+    async def sleep(self, seconds: float) -> None:
+        await asyncio.sleep(min(seconds, max(self.remaining(), 0)))
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = self.clock()
+        timed_out = False
+        try:
+            yield
+        except (asyncio.TimeoutError, PlaywrightTimeoutError):
+            timed_out = True
+            raise
+        finally:
+            seconds = self.clock() - started
+            self.stages[name] += seconds
+            if self.meter:
+                self.meter.add(name, seconds, timed_out)
+
+
+# Бюджет по умолчанию для вызовов вне общего цикла (тесты, ручной запуск)
+NO_DEADLINE = PageDeadline(math.inf)
@@ -0,0 +1,520 @@
+import asyncio
+import html as html_lib
+import json
+import logging
+import re
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Any, Iterable, Iterator, Optional, Tuple, Union
+
+from enums.parse_errors import ParseError
+
+logger = logging.getLogger(__name__)
+
+# Разметка страницы
+JSON_LD_RE = re.compile(
+    r'<script[^>]+type=["\']application/ld\+json["\'][^>]*>(.*?)</script>', re.IGNORECASE | re.DOTALL
+)
+TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+META_RE = re.compile(r"<meta\s[^>]*>", re.IGNORECASE)
+ATTR_RE = re.compile(r'([\w:-]+)\s*=\s*["\']([^"\']*)["\']')
+TAG_RE = re.compile(r"<[^>]+>")
+SCRIPT_RE = re.compile(r"<(script|style)\b.*?</\1>", re.IGNORECASE | re.DOTALL)
+COMMENT_RE = re.compile(r"<!--.*?-->", re.DOTALL)
+ELEMENT_TAG_RE = re.compile(r"<(/?)([a-zA-Z][\w-]*)(\s[^<>]*|/)?>")
+TEXT_NODE_RE = re.compile(r">([^<]+)<")
+BLOCK_BREAK_RE = re.compile(r"<(?:br|/p|/div|/li|/h[1-6]|/tr)\b[^>]*>", re.IGNORECASE)
+SPACES_RE = re.compile(r"[ \t\u00a0\u2006\u2009\u202f]+")
+BLANK_LINES_RE = re.compile(r"\s*\n\s*")
+VOID_TAGS = frozenset({"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "wbr"})
+
+# Цены
+WB_PRICE_RE = re.compile(r"(\d[\d\s]*\d)\s*₽")
+RUB_PRICE_RE = re.compile(r"(\d[\d\s\u00a0.,]*\d|\d)\s*₽")
+NOT_DIGITS_RE = re.compile(r"[^\d\s]")
+DIGIT_GROUP_RE = re.compile(r"\d[\d\s]*\d|\d")
+WHITESPACE_RE = re.compile(r"\s+")
+NUMBER_RE = re.compile(r"(\d+)")
+AMOUNT_RE = re.compile(r"\d[\d\s\u00a0.,]*")
+PRICE_IN_TEXT_RE = re.compile(r"\d+[ .,\u00a0]*₽")
+WB_PRICE_CLASSES = ("priceblockwalletprice", "redprice")
+WB_DISCOUNT_KEYWORDS = ("final", "discount", "sale", "red-price", "wallet-price")
+CURRENCY_SYMBOLS = ("₽", "$", "€")
+PRICE_NOT_FOUND = "Цена не найдена"
+
+
+@dataclass(frozen=True)
+class ExistenceRules:
+    absence: tuple[re.Pattern, ...]
+    positive: tuple[re.Pattern, ...]
+
+
+# Тексты отсутствия товара и положительные индикаторы по маркетплейсам
+EXISTENCE_RULES = {
+    "wildberries": ExistenceRules(
+        absence=(
+            re.compile(r"по вашему запросу ничего не найдено", re.IGNORECASE),
+            re.compile(r"нет\s*в\s*наличии", re.IGNORECASE),
+        ),
+        positive=(re.compile(r"артикул", re.IGNORECASE),),
+    ),
+    "ozon": ExistenceRules(
+        absence=(
+            re.compile(r"этот товар закончился", re.IGNORECASE),
+            re.compile(r"такой страницы не существует", re.IGNORECASE),
+            re.compile(r"произошла ошибка!", re.IGNORECASE),
+        ),
+        positive=(re.compile(r"о товаре", re.IGNORECASE),),
+    ),
+    "yandex": ExistenceRules(
+        absence=(
+            re.compile(r"Тут ничего нет", re.IGNORECASE),
+            re.compile(r"Попробуйте вернуться назад или поищите что-нибудь другое.", re.IGNORECASE),
+            re.compile(r"Нет в продаже", re.IGNORECASE),
+            re.compile(r"Такого товара у нас нет", re.IGNORECASE),
+        ),
+        positive=(re.compile(r"Артикул Маркета", re.IGNORECASE),),
+    ),
+    "joom": ExistenceRules(
+        absence=(
+            re.compile(r"ой! что-то пошло не так", re.IGNORECASE),
+            re.compile(r"упс\.", re.IGNORECASE),
+            re.compile(r"страница, которую вы ищете, не существует\.", re.IGNORECASE),
+            re.compile(r"товар раскупили", re.IGNORECASE),
+        ),
+        positive=(re.compile(r"описание", re.IGNORECASE),),
+    ),
+}
+
+
+@dataclass(frozen=True)
+class Extraction:
+    """
+    Результат разбора снимка страницы. `source` — правило, которое дало цену
+    (`dom` — правила маркетплейса, `structured` — JSON-LD или meta-теги, `none` — цена не найдена).
+    """
+    exists: bool
+    price: Optional[int]
+    name: Optional[str]
+    source: str = "none"
+
+    @property
+    def error(self) -> Optional[ParseError]:
+        if not self.exists:
+            return ParseError.NOT_FOUND
+        if self.price is None:
+            return ParseError.PARSE_FAILED
+        return None
+
+
+def check_existence(marketplace: str, visible_text: str) -> bool:
+    """
+    Проверяет наличие товара по видимому тексту страницы.
+    Возвращает False, если найден текст об отсутствии товара,
+    True — если найден хотя бы один из положительных текстов,
+    иначе возвращает True (считаем, что товар есть).
+    """
+    rules = EXISTENCE_RULES[marketplace]
+
+    for pattern in rules.absence:
+        if pattern.search(visible_text):
+            logger.info(f"Finded absence text: '{pattern.pattern}'")
+            return False
+
+    for pattern in rules.positive:
+        if pattern.search(visible_text):
+            logger.info(f"Finded positive text: '{pattern.pattern}'")
+            return True
+
+    logger.info("Not finded absence or positive text, return True")
+    return True
+
+
+def parse_rub_price(text: str) -> Optional[int]:
+    """
+    Цена — число перед символом ₽ (правило Joom); разделители разрядов и копеек отбрасываются.
+    """
+    text = text.strip()
+    match = RUB_PRICE_RE.search(text)
+    if not match:
+        return None
+    price_str = match.group(1)
+    price_str = price_str.replace(' ', '').replace('\u00a0', '').replace('.', '').replace(',', '')
+    try:
+        return int(price_str)
+    except ValueError:
+        logger.error(f"Invalid price string: '{price_str}' after parsing '{text}'")
+        return None
+
+
+def parse_digit_groups(text: str) -> Optional[int]:
+    """
+    Извлекает число из строки с ценой (правило Яндекс.Маркета).
+    Убирает спецсимволы, оставляет цифры и пробелы, берёт первое числовое значение.
+    """
+    clean_text = NOT_DIGITS_RE.sub('', text)
+    price_match = DIGIT_GROUP_RE.search(clean_text)
+    if price_match:
+        price_str = price_match.group(0).replace(' ', '').replace('\u2006', '')
+        try:
+            return int(price_str)
+        except ValueError:
+            return None
+    return None
+
+
+def parse_first_number(text: str) -> Optional[int]:
+    """
+    Первое число текста элемента цены после удаления пробелов (Ozon и Яндекс.Маркет).
+    """
+    price_match = NUMBER_RE.search(WHITESPACE_RE.sub('', text.strip()))
+    return int(price_match.group(1)) if price_match else None
+
+
+def select_wb_price(candidates: Iterable[Tuple[str, Optional[str]]]) -> Union[int, str]:
+    """
+    Выбирает цену со скидкой из элементов цены Wildberries, заданных парами (текст, class).
+    Из элементов с признаком скидки в классе берётся минимальная цена, иначе минимальная из всех.
+    Если цены нет — возвращает строку "Цена не найдена".
+    """
+    valid_prices = []
+    for text, cls in candidates:
+        match = WB_PRICE_RE.search(text.strip())
+        if not match:
+            continue
+        price_str = match.group(1).replace('\xa0', '').replace(' ', '')
+        try:
+            price_val = int(price_str)
+        except ValueError:
+            continue
+        valid_prices.append((price_val, (cls or "").lower()))
+
+    if not valid_prices:
+        return PRICE_NOT_FOUND
+
+    discount_prices = [price for price, cls in valid_prices if any(k in cls for k in WB_DISCOUNT_KEYWORDS)]
+    if discount_prices:
+        return min(discount_prices)
+    return min(price for price, _ in valid_prices)
+
+
+def iter_json_ld(html: str) -> Iterator[dict]:
+    """
+    Перебирает объекты JSON-LD страницы, включая вложенные в @graph и списки.
+    """
+    for raw in JSON_LD_RE.findall(html):
+        try:
+            data = json.loads(html_lib.unescape(raw.strip()))
+        except ValueError:
+            continue
+        stack = [data]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, list):
+                stack.extend(item)
+            elif isinstance(item, dict):
+                yield item
+                if "@graph" in item:
+                    stack.append(item["@graph"])
+
+
+def to_price(value: Any) -> Optional[int]:
+    try:
+        price = int(float(str(value).replace(" ", "").replace("\u00a0", "").replace(",", ".")))
+    except (TypeError, ValueError):
+        return None
+    return price if price > 0 else None
+
+
+def extract_ssr_product(html: str) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Извлекает цену и название из серверной разметки без выполнения JavaScript:
+    сначала из JSON-LD Product (offers.price / lowPrice), затем из meta-тегов
+    (itemprop="price", product:price:amount, og:title).
+    """
+    for item in iter_json_ld(html):
+        types = item.get("@type")
+        if "Product" not in (types if isinstance(types, list) else [types]):
+            continue
+        offers = item.get("offers")
+        for offer in offers if isinstance(offers, list) else [offers]:
+            if not isinstance(offer, dict):
+                continue
+            price = to_price(offer.get("price")) or to_price(offer.get("lowPrice"))
+            if price:
+                name = item.get("name")
+                return price, html_lib.unescape(name).strip() if isinstance(name, str) else None
+
+    meta = {}
+    for tag in META_RE.findall(html):
+        attrs = {key.lower(): value for key, value in ATTR_RE.findall(tag)}
+        key = attrs.get("itemprop") or attrs.get("property") or attrs.get("name")
+        if key and "content" in attrs:
+            meta.setdefault(key.lower(), html_lib.unescape(attrs["content"]).strip())
+
+    price = to_price(meta.get("price")) or to_price(meta.get("product:price:amount"))
+    name = meta.get("og:title") or meta.get("name")
+    return price, name or None
+
+
+def strip_scripts(html: str) -> str:
+    return SCRIPT_RE.sub(" ", COMMENT_RE.sub(" ", html))
+
+
+def html_to_text(html: str) -> str:
+    """
+    Приближение `document.body.innerText` для снимка HTML: без скриптов, стилей и тегов,
+    с переводами строк на границах блоков.
+    """
+    text = TAG_RE.sub(" ", BLOCK_BREAK_RE.sub("\n", strip_scripts(html)))
+    text = SPACES_RE.sub(" ", html_lib.unescape(text))
+    return BLANK_LINES_RE.sub("\n", text).strip()
+
+
+def page_title(html: str) -> str:
+    title = TITLE_RE.search(html)
+    return html_lib.unescape(title.group(1)).strip() if title else ""
+
+
+def element_text(inner_html: str) -> str:
+    return SPACES_RE.sub(" ", html_lib.unescape(TAG_RE.sub("", inner_html))).strip()
+
+
+class Element:
+    """
+    Элемент снимка. Атрибуты и текст (с потомками) вычисляются при первом обращении.
+    """
+    __slots__ = ("tag", "_raw_attrs", "_attrs", "_fragments", "_first", "_end")
+
+    def __init__(self, tag: str, raw_attrs: str, fragments: list[str], first: int, end: Optional[int] = None):
+        self.tag = tag
+        self._raw_attrs = raw_attrs
+        self._attrs: Optional[dict] = None
+        self._fragments = fragments
+        self._first = first
+        self._end = end
+
+    @property
+    def attrs(self) -> dict:
+        if self._attrs is None:
+            self._attrs = {key.lower(): html_lib.unescape(value) for key, value in ATTR_RE.findall(self._raw_attrs)}
+        return self._attrs
+
+    @property
+    def text(self) -> str:
+        # Незакрытый элемент тянется до конца снимка
+        end = len(self._fragments) if self._end is None else self._end
+        return SPACES_RE.sub(" ", html_lib.unescape("".join(self._fragments[self._first:end]))).strip()
+
+
+class HtmlSnapshot:
+    """
+    Снимок страницы, разобранный за один проход по тегам: текст между тегами собирается во фрагменты,
+    а элемент запоминает диапазон фрагментов до своего закрывающего тега. Закрывающий тег закрывает
+    последний открытый элемент того же тега. Снимок должен быть без скриптов (`strip_scripts`).
+    """
+
+    def __init__(self, html: str):
+        self.html = html
+        self.elements: list[Element] = []
+        fragments: list[str] = []
+        open_elements: dict[str, list[Element]] = {}
+        position = 0
+        for match in ELEMENT_TAG_RE.finditer(html):
+            start = match.start()
+            if start > position:
+                fragments.append(html[position:start])
+            position = match.end()
+            closing, tag, raw_attrs = match.groups()
+            tag = tag.lower()
+            if closing:
+                opened = open_elements.get(tag)
+                if opened:
+                    opened.pop()._end = len(fragments)
+                continue
+            raw_attrs = raw_attrs or ""
+            if tag in VOID_TAGS or raw_attrs.rstrip().endswith("/"):
+                self.elements.append(Element(tag, raw_attrs, fragments, len(fragments), len(fragments)))
+                continue
+            element = Element(tag, raw_attrs, fragments, len(fragments))
+            self.elements.append(element)
+            open_elements.setdefault(tag, []).append(element)
+        if position < len(html):
+            fragments.append(html[position:])
+
+    def find(self, tags: Optional[Iterable[str]] = None) -> Iterator[Element]:
+        """
+        Элементы в порядке документа; `tags` ограничивает перебор заданными тегами.
+        """
+        if not tags:
+            return iter(self.elements)
+        wanted = {tag.lower() for tag in tags}
+        return (element for element in self.elements if element.tag in wanted)
+
+    def text_nodes(self) -> Iterator[str]:
+        return iter_text_nodes(self.html)
+
+
+def iter_elements(html: str, tags: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, dict, str]]:
+    """
+    Перебирает элементы снимка в порядке документа: (тег, атрибуты, текст элемента с потомками).
+    `tags` ограничивает перебор заданными тегами. Снимок должен быть без скриптов (`strip_scripts`).
+    """
+    for element in HtmlSnapshot(html).find(tags):
+        yield element.tag, element.attrs, element.text
+
+
+def iter_text_nodes(html: str) -> Iterator[str]:
+    """
+    Непустые текстовые узлы снимка — аналог XPath `//*[contains(text(), ...)]`.
+    """
+    for raw in TEXT_NODE_RE.findall(html):
+        text = element_text(raw)
+        if text:
+            yield text
+
+
+def first_heading(page: HtmlSnapshot, tags: Iterable[str], min_length: int = 5) -> Optional[str]:
+    for element in page.find(tags):
+        text = element.text
+        if text and len(text) > min_length:
+            return text
+    return None
+
+
+def _wb_rules(page: HtmlSnapshot) -> Tuple[Optional[int], Optional[str]]:
+    candidates = [
+        (element.text, element.attrs.get("class"))
+        for element in page.find(("span",))
+        if any(name in element.attrs.get("class", "").lower() for name in WB_PRICE_CLASSES)
+    ]
+    price = select_wb_price(candidates)
+    name = next((text for text in (element.text for element in page.find(("h3",))) if text), None)
+    return (price if isinstance(price, int) else None), name
+
+
+def _ozon_rules(page: HtmlSnapshot) -> Tuple[Optional[int], Optional[str]]:
+    price_text = next(
+        (element.text for element in page.find() if element.attrs.get("data-widget") == "webPrice"), None
+    )
+    if price_text is None:
+        price_text = next((text for text in page.text_nodes() if "₽" in text), None)
+    if price_text is None:
+        price_text = next(
+            (element.text for element in page.find() if "price" in element.attrs.get("class", "").split()), None
+        )
+    price = parse_first_number(price_text) if price_text else None
+    name = next((text for text in (element.text for element in page.find(("h1",))) if text), None)
+    return price, name
+
+
+def _is_yandex_price(text: str) -> bool:
+    return "₽" in text and len([c for c in text if c.isdigit()]) >= 2
+
+
+def _yandex_rules(page: HtmlSnapshot) -> Tuple[Optional[int], Optional[str]]:
+    attribute_rules = (
+        ("data-widget", "Price"),
+        ("data-autotest-id", "price"),
+        ("data-zone-name", "price"),
+        ("class", "price"),
+    )
+    price_text = None
+    for attr, needle in attribute_rules:
+        price_text = next(
+            (
+                element.text for element in page.find()
+                if needle in element.attrs.get(attr, "") and _is_yandex_price(element.text)
+            ),
+            None,
+        )
+        if price_text:
+            break
+    if price_text is None:
+        price_text = next((text for text in page.text_nodes() if _is_yandex_price(text)), None)
+    price = parse_first_number(price_text) if price_text else None
+
+    name = None
+    for element in page.find(("h1",)):
+        attrs = element.attrs
+        if ("productCardTitle" in attrs.get("data-auto", "")
+                or "title" in attrs.get("data-additional-zone", "")) and len(element.text) > 5:
+            name = element.text
+            break
+    name = name or first_heading(page, ("h1",)) or first_heading(page, ("h1", "h2", "h3"))
+    return price, name
+
+
+def _joom_rules(page: HtmlSnapshot) -> Tuple[Optional[int], Optional[str]]:
+    price_text = None
+    for tag in ("span", "div", "p", "strong", "b"):
+        price_text = next(
+            (
+                text for text in (element.text for element in page.find((tag,)))
+                if any(symbol in text for symbol in CURRENCY_SYMBOLS) and AMOUNT_RE.search(text)
+            ),
+            None,
+        )
+        if price_text:
+            break
+    if price_text is None:
+        price_text = next(
+            (
+                text for text in page.text_nodes()
+                if any(symbol in text for symbol in CURRENCY_SYMBOLS) and AMOUNT_RE.search(text)
+            ),
+            None,
+        )
+    price = parse_rub_price(price_text) if price_text else None
+
+    name = first_heading(page, ("h1",))
+    if not name:
+        headers = [element.text for element in page.find(("h1", "h2", "h3"))]
+        longest = max(headers, key=len, default="")
+        name = longest if len(longest) > 5 else None
+    if not name:
+        name = next(
+            (text for text in page.text_nodes() if len(text) > 10 and not PRICE_IN_TEXT_RE.search(text)), None
+        )
+    return price, name
+
+
+MARKETPLACE_RULES = {
+    "wildberries": _wb_rules,
+    "ozon": _ozon_rules,
+    "yandex": _yandex_rules,
+    "joom": _joom_rules,
+}
+
+
+def extract_product(marketplace: str, html: str) -> Extraction:
+    """
+    Разбирает снимок HTML страницы товара теми же правилами, что и парсер маркетплейса
+    на живой странице, без браузера. Если правила маркетплейса цену не нашли,
+    используется серверная разметка (JSON-LD и meta-теги).
+    Видимость элементов по снимку не определить, поэтому учитываются все элементы.
+    Функция чистая и может выполняться в пуле процессов (`extract_offloaded`).
+    """
+    body = strip_scripts(html)
+    if not check_existence(marketplace, html_to_text(body)):
+        return Extraction(exists=False, price=None, name=None)
+
+    price, name = MARKETPLACE_RULES[marketplace](HtmlSnapshot(body))
+    if price is not None:
+        return Extraction(exists=True, price=price, name=name, source="dom")
+
+    structured_price, structured_name = extract_ssr_product(html)
+    if structured_price:
+        return Extraction(exists=True, price=structured_price, name=name or structured_name, source="structured")
+    return Extraction(exists=True, price=None, name=name)
+
+
+async def extract_offloaded(marketplace: str, html: str, executor: Optional[Executor] = None) -> Extraction:
+    """
+    Выполняет `extract_product` в пуле `executor` (например, ProcessPoolExecutor), чтобы разбор
+    больших страниц не занимал цикл событий. Без пула разбирает снимок в текущем потоке.
+    """
+    if executor is None:
+        return extract_product(marketplace, html)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, extract_product, marketplace, html)
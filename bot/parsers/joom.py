@@ -1,53 +1,35 @@
 import asyncio
-import re
 import random
 import logging
-from typing import Optional, Tuple, List
+from typing import Optional, List
 from playwright.async_api import Page, BrowserContext, TimeoutError as PlaywrightTimeoutError
 
+from enums.parse_errors import ParseError
+from enums.parse_records import ParseResult, ParseTask
+from bot.parsers.challenge import detect_challenge
+from bot.parsers.common import build_result, classify_exception, classify_response, extract_rendered
+from bot.parsers.deadline import NO_DEADLINE, PageDeadline
+# parse_price остаётся в модуле для совместимости: правило Joom живёт в extraction
+from bot.parsers.extraction import AMOUNT_RE, PRICE_IN_TEXT_RE, check_existence, parse_rub_price as parse_price
+from bot.parsers.rate_limiter import throttle
+from bot.parsers.runner import run_marketplace_tasks
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-import re
-
 async def check_product_exists(page: Page) -> bool:
     """
-    Проверяет наличие товара по видимому тексту страницы.
-    Ищет тексты отсутствия товара и положительные индикаторы.
-    Поиск текста — регистр-независимый.
-    Возвращает False, если найден текст об отсутствии товара,
-    True — если найден хотя бы один из положительных текстов,
-    Иначе возвращает True (считаем, что товар есть).
+    Проверяет наличие товара по видимому тексту страницы
+    правилами `bot.parsers.extraction.check_existence`.
+    Возвращает False, если найден текст об отсутствии товара, иначе True.
     """
     visible_text = await page.evaluate("() => document.body.innerText")
+    return check_existence("joom", visible_text)
 
-    absence_patterns = [
-        re.compile(r"ой! что-то пошло не так", re.IGNORECASE),
-        re.compile(r"упс\.", re.IGNORECASE),
-        re.compile(r"страница, которую вы ищете, не существует\.", re.IGNORECASE),
-        re.compile(r"товар раскупили", re.IGNORECASE)
-    ]
-    positive_patterns = [
-        re.compile(r"описание", re.IGNORECASE)
-    ]
-
-    for pattern in absence_patterns:
-        if pattern.search(visible_text):
-            logger.info(f"Finded absence text: '{pattern.pattern}'")
-            return False
 
-    for pattern in positive_patterns:
-        if pattern.search(visible_text):
-            logger.info(f"Finded positive text: '{pattern.pattern}'")
-            return True
 
-    logger.info("Not finded absence or positive text, return True")
-    return True
-
-
-
-async def find_product_name(page: Page) -> Optional[str]:
+async def find_product_name(page: Page, deadline: PageDeadline = NO_DEADLINE) -> Optional[str]:
     selectors = [
         'h1.root___e0mAF.collapsed___tnXms',
         'h1.product-title',
@@ -58,7 +40,7 @@ async def find_product_name(page: Page) -> Optional[str]:
     ]
     for selector in selectors:
         try:
-            element = await page.wait_for_selector(selector, timeout=2000)
+            element = await page.wait_for_selector(selector, timeout=deadline.timeout(2000))
             if element:
                 text = (await element.text_content()) or ""
                 text = text.strip()
@@ -82,11 +64,12 @@ async def find_product_name(page: Page) -> Optional[str]:
 
     elements = await page.query_selector_all("xpath=//*[string-length(normalize-space(text())) > 10]")
     for elem in elements:
+        deadline.check()
         try:
             if await elem.is_visible():
                 text = (await elem.text_content()) or ""
                 text = text.strip()
-                if text and not re.search(r'\d+[ ., ]*₽', text):
+                if text and not PRICE_IN_TEXT_RE.search(text):
                     return text
         except Exception:
             continue
@@ -94,7 +77,7 @@ async def find_product_name(page: Page) -> Optional[str]:
     return None
 
 
-async def find_price(page: Page) -> Optional[str]:
+async def find_price(page: Page, deadline: PageDeadline = NO_DEADLINE) -> Optional[str]:
     possible_tags = ['span', 'div', 'p', 'strong', 'b']
     currency_symbols = ['₽', '$', '€']
 
@@ -102,12 +85,13 @@ async def find_price(page: Page) -> Optional[str]:
     for tag in possible_tags:
         elements = await page.query_selector_all(tag)
         for elem in elements:
+            deadline.check()
             try:
                 if await elem.is_visible():
                     text = (await elem.text_content()) or ""
                     text = text.strip()
                     if any(symbol in text for symbol in currency_symbols):
-                        if re.search(r'\d[\d\s\u00a0.,]*', text):
+                        if AMOUNT_RE.search(text):
                             return text
             except Exception:
                 continue
@@ -116,11 +100,12 @@ async def find_price(page: Page) -> Optional[str]:
     xpath_expr = "//*[contains(text(), '₽') or contains(text(), '$') or contains(text(), '€')]"
     elements = await page.query_selector_all(f"xpath={xpath_expr}")
     for elem in elements:
+        deadline.check()
         try:
             if await elem.is_visible():
                 text = (await elem.text_content()) or ""
                 text = text.strip()
-                if re.search(r'\d[\d\s\u00a0.,]*', text):
+                if AMOUNT_RE.search(text):
                     return text
         except Exception:
             continue
@@ -130,21 +115,8 @@ async def find_price(page: Page) -> Optional[str]:
 
 
 
-def parse_price(text: str) -> Optional[int]:
-    text = text.strip()
-    match = re.search(r'(\d[\d\s\u00a0.,]*\d|\d)\s*₽', text)
-    if not match:
-        return None
-    price_str = match.group(1)
-    price_str = price_str.replace(' ', '').replace('\u00a0', '').replace('.', '').replace(',', '')
-    try:
-        return int(price_str)
-    except ValueError:
-        logger.error(f"Invalid price string: '{price_str}' after parsing '{text}'")
-        return None
-
-async def wait_for_full_load(page, timeout=30000):
-    await page.wait_for_load_state("load")  # ждать полной загрузки страницы
+async def wait_for_full_load(page, timeout=30000, deadline: PageDeadline = NO_DEADLINE):
+    await page.wait_for_load_state("load", timeout=deadline.timeout(timeout))  # ждать полной загрузки страницы
 
     check_interval = 1000
     max_checks = timeout // check_interval
@@ -153,6 +125,9 @@ async def wait_for_full_load(page, timeout=30000):
     required_stable_iterations = 3
 
     for _ in range(max_checks):
+        # Не тратим на стабилизацию остаток бюджета, нужный для поиска цены
+        if deadline.remaining() < check_interval / 1000 * 2:
+            break
         try:
             html = await page.content()
         except Exception:
@@ -172,79 +147,76 @@ async def wait_for_full_load(page, timeout=30000):
         await page.wait_for_timeout(check_interval)
 
 async def single_task(
-    context: BrowserContext,
-    product_info: Tuple[int, int, str, Optional[int], Optional[int]]
-) -> Tuple[int, int, Optional[int], Optional[str], Optional[int], Optional[str], Optional[int], Optional[str]]:
-    user_id, product_id, url, min_price, target_price = product_info
-
-    page = await context.new_page()
+    page: Page,
+    product_info: ParseTask,
+    deadline: PageDeadline = NO_DEADLINE,
+) -> ParseResult:
+    url, product_id = product_info.url, product_info.product_id
 
     try:
-        await page.goto(url, wait_until="load", timeout=60000)     # задержка для эмуляции поведения пользователя
-
-        await wait_for_full_load(page)
+        await throttle(url, deadline)
+        with deadline.stage("goto"):
+            response = await page.goto(url, wait_until="load", timeout=deadline.timeout(60000))
+        error = classify_response(response)
+        if error:
+            logger.warning(f"Bad response status {response.status} in joom: {url}")
+            return build_result(product_info, None, None, error)
+
+        # Капча или антибот-заглушка: сразу освобождаем слот вместо ожидания селекторов
+        with deadline.stage("challenge"):
+            challenge = await detect_challenge(page, "joom")
+        if challenge:
+            logger.warning(f"Anti-bot challenge in joom ({challenge}): {url}")
+            return build_result(product_info, None, None, ParseError.BLOCKED)
+
+        with deadline.stage("full_load"):
+            await wait_for_full_load(page, deadline=deadline)
         
         exists = await check_product_exists(page)
         if not exists:
             logger.info(f"Item {product_id} not found: {url}")
-            return (user_id, product_id, None, None, min_price, "Товар не найден", target_price, url)
+            return build_result(product_info, None, None, ParseError.NOT_FOUND)
 
-
-        price_text = await find_price(page)
+        with deadline.stage("price"):
+            price_text = await find_price(page, deadline)
         price = parse_price(price_text) if price_text else None
 
 
-        name = await find_product_name(page)
+        with deadline.stage("name"):
+            name = await find_product_name(page, deadline)
         name = name or "название товара не найдено"
 
 
-        if price is not None and name:
+        if price is not None:
             logger.info(f"Price: {price} ₽, item: {name}")
-            if min_price is not None:
-                if int(price) <= int(min_price):
-                    return (user_id, product_id, price, name, price, None, target_price, url)
-                else:
-                    return (user_id, product_id, price, name, min_price, None, target_price, url)
-            else:
-                return (user_id, product_id, price, name, price, None, target_price, url)
-        elif price is not None:
-            logger.info(f"Finded only price: {price} ₽")
-            if min_price is not None:
-                if int(price) <= int(min_price):
-                    return (user_id, product_id, price, None, price, None, target_price, url)
-                else:
-                    return (user_id, product_id, price, None, min_price, None, target_price, url)
-            else:
-                return (user_id, product_id, price, None, price, None, target_price, url)
-        else:
-            logger.info("Price not found")
-            return (user_id, product_id, None, None, min_price, "Цена не найдена", target_price, url)
+            return build_result(product_info, price, name, None, "selector")
+
+        # Видимой цены селекторы не нашли: правила извлечения по HTML страницы как запасной вариант
+        extracted = await extract_rendered(page, "joom", product_info, deadline)
+        if extracted:
+            return extracted
+
+        logger.info("Price not found")
+        return build_result(product_info, None, None, ParseError.PARSE_FAILED)
 
 
     except Exception as e:
-        logger.error(f"Error in single_task {product_id}: {e}")
-        return (user_id, product_id, None, None, min_price, f"Ошибка обработки", target_price, url)
-    finally:
-        await page.close()
+        error = classify_exception(e)
+        logger.error(f"Error in single_task {product_id} ({error.name}): {e}")
+        return build_result(product_info, None, None, error)
         
 
 
 async def process_many_joom_tasks(
-    marketplace_tasks: List[Tuple[int, int, str, Optional[int], Optional[int]]],
+    marketplace_tasks: List[ParseTask],
     context: BrowserContext,
-    max_concurrent: int = 5
-) -> List[Tuple[int, int, Optional[int], Optional[str], Optional[int], Optional[str], Optional[int], Optional[str]]]:
-            
-    semaphore = asyncio.Semaphore(max_concurrent)
-
-    async def sem_task(product_info):
-        async with semaphore:
-            return await single_task(context=context, product_info=product_info)
-
-    tasks = [asyncio.create_task(sem_task(info)) for info in marketplace_tasks]
-    results = await asyncio.gather(*tasks)
-
-    return results
+    max_concurrent: int = 5,
+    **runner_options,
+) -> List[ParseResult]:
+    return await run_marketplace_tasks(
+        "joom", marketplace_tasks, context, single_task,
+        max_concurrent=max_concurrent, **runner_options,
+    )
 
 
 if __name__ == "__main__":
@@ -258,13 +230,12 @@ if __name__ == "__main__":
         # Добавьте свои товары тут
     ]
 
-    results = asyncio.run(process_many_joom_tasks(products_to_check, max_concurrent=3))
+    results = asyncio.run(process_many_joom_tasks([ParseTask(*item) for item in products_to_check], max_concurrent=3))
 
     for result in results:
-        user_id, product_id, price, name, min_price, status, target_price, url = result
         logger.info(
-            f"User {user_id}, Product {product_id}, Price: {price}, Name: {name}, "
-            f"Min: {min_price}, Status: {status}, Target: {target_price}, URL: {url}"
+            f"User {result.user_id}, Product {result.product_id}, Price: {result.price}, Name: {result.product_name}, "
+            f"Min: {result.min_price}, Status: {result.last_error}, Target: {result.target_price}, URL: {result.url}"
         )
 
 
@@ -1,10 +1,17 @@
 import asyncio
 import random
-import re
 import logging
-from typing import Tuple, Optional
 from playwright.async_api import Page, BrowserContext
 
+from enums.parse_errors import ParseError
+from enums.parse_records import ParseResult, ParseTask
+from bot.parsers.challenge import detect_challenge
+from bot.parsers.common import build_result, classify_exception, classify_response, extract_rendered
+from bot.parsers.deadline import NO_DEADLINE, PageDeadline
+from bot.parsers.extraction import check_existence, parse_first_number
+from bot.parsers.rate_limiter import throttle
+from bot.parsers.runner import run_marketplace_tasks
+
 
 logger = logging.getLogger(__name__)
 # logging.basicConfig(level=logging.INFO)
@@ -12,37 +19,13 @@ logger = logging.getLogger(__name__)
 
 async def check_product_existence_by_text(page: Page) -> bool:
     """
-    Проверяет наличие товара по тексту страницы visible_text.
-    Ищет тексты отсутствия товара и положительные индикаторы.
-    Поиск текста — регистр-независимый.
-    Возвращает False, если найден текст об отсутствии товара,
-    True — если найден хотя бы один из положительных текстов,
-    Иначе возвращает True (считаем, что товар есть).
+    Проверяет наличие товара по тексту страницы visible_text
+    правилами `bot.parsers.extraction.check_existence`.
+    Возвращает False, если найден текст об отсутствии товара, иначе True.
     """
 
     visible_text = await page.evaluate("() => document.body.innerText")
-
-    absence_patterns = [
-        re.compile(r"этот товар закончился", re.IGNORECASE),
-        re.compile(r"такой страницы не существует", re.IGNORECASE),
-        re.compile(r"произошла ошибка!", re.IGNORECASE),
-    ]
-    positive_patterns = [
-        re.compile(r"о товаре", re.IGNORECASE),
-    ]
-
-    for pattern in absence_patterns:
-        if pattern.search(visible_text):
-            logger.info(f"Finded absence text: '{pattern.pattern}'")
-            return False
-
-    for pattern in positive_patterns:
-        if pattern.search(visible_text):
-            logger.info(f"Finded positive text: '{pattern.pattern}'")
-            return True
-
-    logger.info("Not finded absence or positive text, return True")
-    return True
+    return check_existence("ozon", visible_text)
 
 
 async def find_price_element(page: Page):
@@ -62,88 +45,76 @@ async def find_price_element(page: Page):
 
 
 async def fetch_product_data(
-        user_id: int,
-        product_id: int,
-        url: str,
-        min_price: int,
-        target_price: int,
-        context: BrowserContext
-) -> Tuple[int, int, Optional[int], Optional[str], Optional[int], Optional[str], int, str]:
-    """
-    Возвращает кортеж:
-    (user_id, product_id, price_or_none, product_name_or_none, min_price, last_error_or_none, target_price, url)
-    """
+        product_info: ParseTask,
+        page: Page,
+        deadline: PageDeadline = NO_DEADLINE,
+) -> ParseResult:
+    url, product_id = product_info.url, product_info.product_id
+
     try:
-        page = await context.new_page()
-        await page.goto(url, wait_until="load", timeout=60000)
+        await throttle(url, deadline)
+        with deadline.stage("goto"):
+            response = await page.goto(url, wait_until="load", timeout=deadline.timeout(60000))
+        error = classify_response(response)
+        if error:
+            logger.warning(f"Bad response status {response.status} in ozon: {url}")
+            return build_result(product_info, None, None, error)
+
+        # Капча или антибот-заглушка: сразу освобождаем слот вместо ожидания селекторов
+        with deadline.stage("challenge"):
+            challenge = await detect_challenge(page, "ozon")
+        if challenge:
+            logger.warning(f"Anti-bot challenge in ozon ({challenge}): {url}")
+            return build_result(product_info, None, None, ParseError.BLOCKED)
+
         # await asyncio.sleep(random.uniform(2, 2.7))
 
         is_exists = await check_product_existence_by_text(page)
         if not is_exists:
             logger.info(f"Item {product_id} not found: {url}")
-            return (user_id, product_id, None, None, min_price, "Товар не найден", target_price, url)
+            return build_result(product_info, None, None, ParseError.NOT_FOUND)
 
-        await page.wait_for_selector("h1", state='visible', timeout=30000)
+        with deadline.stage("name"):
+            await page.wait_for_selector("h1", state='visible', timeout=deadline.timeout(30000))
         product_name = (await page.inner_text("h1")).strip()
 
-        price_element = await find_price_element(page)
-        if not price_element:
+        with deadline.stage("price"):
+            price_element = await find_price_element(page)
+        price = parse_first_number(await price_element.inner_text()) if price_element else None
+        if price is None:
+            # Видимой цены селекторы не нашли: правила извлечения по HTML страницы как запасной вариант
+            extracted = await extract_rendered(page, "ozon", product_info, deadline)
+            if extracted:
+                return extracted
             logger.info(f"Price element not found: {url}")
-            return (user_id, product_id, None, product_name, min_price, "Товар не найден", target_price, url)
-
-        price_text = (await price_element.inner_text()).strip()
-        clean_price_text = re.sub(r'\s+', '', price_text)
-        price_match = re.search(r'(\d+)', clean_price_text)
-        price = int(price_match.group(1)) if price_match else None
-
-        if min_price and price:
-            if int(price) <= int(min_price):
-                logger.info(f"Price is less than min price: {url}")
-                return (user_id, product_id, price, product_name, price, None, target_price, url)
-            else:
-                return (user_id, product_id, price, product_name, min_price, None, target_price, url)
-        else:
-            return (user_id, product_id, price, product_name, price, None, target_price, url)
+            return build_result(product_info, None, product_name, ParseError.PARSE_FAILED)
+
+        return build_result(product_info, price, product_name, None, "selector")
 
     except Exception as e:
-        logger.error(f"Error fetching product data in ozon: {url} - {e}")
-        return (user_id, product_id, None, None, min_price, "Товар не найден", target_price, url)
-
-    finally:
-        await page.close()
-
-async def fetch_product_data_with_semaphore(
-        sem: asyncio.Semaphore,
-        user_id: int,
-        product_id: int,
-        url: str,
-        min_price: int,
-        target_price: int,
-        context: BrowserContext
-):
-    async with sem:
-        return await fetch_product_data(user_id, product_id, url, min_price, target_price, context)
+        error = classify_exception(e)
+        logger.error(f"Error fetching product data in ozon ({error.name}): {url} - {e}")
+        return build_result(product_info, None, None, error)
+
+
+async def single_task(
+        page: Page,
+        product_info: ParseTask,
+        deadline: PageDeadline = NO_DEADLINE,
+) -> ParseResult:
+    return await fetch_product_data(product_info, page, deadline)
 
 
 async def process_many_ozon_tasks(
-        marketplace_tasks: list[Tuple[int, int, str, int, int]],
+        marketplace_tasks: list[ParseTask],
         context: BrowserContext,
-        max_concurrent: int = 3
+        max_concurrent: int = 3,
+        **runner_options,
 ):
-
-    sem = asyncio.Semaphore(max_concurrent)
-
-    tasks = []
-    for user_id, product_id, url, min_price, target_price in marketplace_tasks:
-        tasks.append(
-            fetch_product_data_with_semaphore(
-                sem, user_id, product_id, url, min_price, target_price, context
-            )
-        )
-
-    results = await asyncio.gather(*tasks)
-
-    return results
+    return await run_marketplace_tasks(
+        "ozon", marketplace_tasks, context, single_task,
+        max_concurrent=max_concurrent, **runner_options,
+    )
 
 
 
@@ -157,16 +128,15 @@ if __name__ == "__main__":
         (3, 103, "https://ozon.ru/t/cBGw8Nk", 1000, 900),
     ]
 
-    results = asyncio.run(process_many_ozon_tasks(products_data, max_concurrent=3))
+    results = asyncio.run(process_many_ozon_tasks([ParseTask(*item) for item in products_data], max_concurrent=3))
 
     for res in results:
-        user_id, product_id, price, product_name, min_price, _, target_price, url = res
-        print(f"User: {user_id}, Product: {product_id}, URL: {url}")
-        if product_name:
-            print(f"Название товара: {product_name}")
-        if price is not None:
-            print(f"Цена: {price} ₽")
+        print(f"User: {res.user_id}, Product: {res.product_id}, URL: {res.url}")
+        if res.product_name:
+            print(f"Название товара: {res.product_name}")
+        if res.price is not None:
+            print(f"Цена: {res.price} ₽")
         else:
             print("Цена не найдена")
-        print(f"Минимальная цена для оповещения: {min_price}, Целевая цена: {target_price}")
+        print(f"Минимальная цена для оповещения: {res.min_price}, Целевая цена: {res.target_price}")
         print()
@@ -0,0 +1,97 @@
+import logging
+from typing import Optional
+
+from playwright.async_api import BrowserContext, Page
+
+from enums.parse_errors import ParseError
+
+logger = logging.getLogger(__name__)
+
+# Очистка состояния вкладки перед возвратом в пул; localStorage и cookies общие для контекста и не трогаются
+CLEAR_PAGE_STATE_JS = "() => { try { sessionStorage.clear(); } catch (e) {} }"
+# Размер JS-кучи страницы, байты (performance.memory есть только в Chromium)
+HEAP_SIZE_JS = "() => (performance.memory ? performance.memory.usedJSHeapSize : 0)"
+
+
+class PagePool:
+    """
+    Пул открытых вкладок одного контекста браузера.
+    Вместо new_page/close на каждый товар вкладка после использования очищается,
+    переводится на about:blank и возвращается в пул. Вкладка закрывается и заменяется
+    новой после `max_uses` навигаций, при превышении `memory_limit_mb` или если
+    обработка была прервана и её состояние неизвестно.
+    """
+
+    def __init__(
+        self,
+        context: BrowserContext,
+        *,
+        size: int = 10,
+        max_uses: int = 50,
+        memory_limit_mb: Optional[float] = 512.0,
+    ):
+        self.context = context
+        self.size = size
+        self.max_uses = max_uses
+        self.memory_limit_mb = memory_limit_mb
+
+        self._idle: list[Page] = []
+        self._uses: dict[Page, int] = {}
+        self.created = 0
+        self.recycled = 0
+
+    async def acquire(self) -> Page:
+        if self._idle:
+            page = self._idle.pop()
+        else:
+            page = await self.context.new_page()
+            self._uses[page] = 0
+            self.created += 1
+        self._uses[page] += 1
+        return page
+
+    async def release(self, page: Page, *, discard: bool = False, error: Optional[ParseError] = None) -> None:
+        """
+        Возвращает вкладку в пул. `discard=True` — вкладку нужно закрыть без переиспользования
+        (обработка отменена по бюджету времени или завершилась исключением).
+        Исход страницы `error` пулу вкладок не нужен и принимается для совместимости с ContextPool.
+        """
+        if discard or len(self._idle) >= self.size or self._uses.get(page, 0) >= self.max_uses:
+            await self._close(page)
+            return
+
+        try:
+            if await self._over_memory_limit(page):
+                await self._close(page)
+                return
+            await page.evaluate(CLEAR_PAGE_STATE_JS)
+            await page.goto("about:blank")
+        except BaseException as e:
+            await self._close(page)
+            if not isinstance(e, Exception):
+                raise
+            logger.debug("Failed to reset pooled page, closing it: %s", e)
+            return
+
+        self._idle.append(page)
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for page in idle:
+            await self._close(page)
+        if self.created:
+            logger.debug("Page pool closed: %d pages created, %d recycled", self.created, self.recycled)
+
+    async def _over_memory_limit(self, page: Page) -> bool:
+        if not self.memory_limit_mb:
+            return False
+        heap_bytes = await page.evaluate(HEAP_SIZE_JS)
+        return heap_bytes > self.memory_limit_mb * 1024 * 1024
+
+    async def _close(self, page: Page) -> None:
+        self._uses.pop(page, None)
+        self.recycled += 1
+        try:
+            await page.close()
+        except Exception as e:
+            logger.debug("Failed to close pooled page: %s", e)
@@ -0,0 +1,113 @@
+import logging
+from urllib.parse import urlsplit
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+import bot.db_pool_singleton.db_pool_singleton as global_pool
+from bot.parsers.deadline import NO_DEADLINE, DeadlineExceeded, PageDeadline
+
+logger = logging.getLogger(__name__)
+
+# Атомарное списание токена из корзины хоста. Время берётся у Redis, чтобы часы
+# разных узлов не влияли на пополнение. Возвращает 0, если токен списан,
+# иначе — через сколько секунд он появится.
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+def host_key(url: str) -> str:
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class RedisTokenBucket:
+    """
+    Ограничитель частоты переходов на хост маркетплейса, общий для всех процессов и узлов.
+    Корзина токенов хранится в Redis по ключу хоста; перед каждым `page.goto`
+    берётся токен, а при пустой корзине ожидание ограничено бюджетом страницы.
+    `rates` — запросов в секунду по хостам (поддомены наследуют лимит домена).
+    Если Redis недоступен, переходы не блокируются.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        rates: dict[str, float],
+        *,
+        default_rate: float = 1.0,
+        burst: float = 5.0,
+        key_prefix: str = "parser:rate:",
+    ):
+        self.redis = redis
+        self.rates = {host.lower(): rate for host, rate in rates.items()}
+        self.default_rate = default_rate
+        self.burst = burst
+        self.key_prefix = key_prefix
+        self._script = redis.register_script(TOKEN_BUCKET_LUA)
+        self._redis_failed = False
+
+    def rate_for(self, host: str) -> tuple[str, float]:
+        """
+        Возвращает настроенный домен и его лимит для хоста `host`.
+        """
+        for domain, rate in self.rates.items():
+            if host == domain or host.endswith(f".{domain}"):
+                return domain, rate
+        return host, self.default_rate
+
+    async def try_acquire(self, url: str) -> float:
+        """
+        Пытается взять токен для хоста `url`. Возвращает 0 при успехе, иначе время ожидания в секундах.
+        """
+        domain, rate = self.rate_for(host_key(url))
+        try:
+            wait = float(await self._script(keys=[self.key_prefix + domain], args=[rate, self.burst]))
+        except RedisError as e:
+            if not self._redis_failed:
+                logger.warning("Rate limiter is unavailable, navigation is not throttled: %s", e)
+                self._redis_failed = True
+            return 0.0
+        self._redis_failed = False
+        return wait
+
+    async def acquire(self, url: str, deadline: PageDeadline = NO_DEADLINE) -> None:
+        """
+        Ждёт токен для хоста `url`. Если ожидание не укладывается в бюджет страницы,
+        бросает DeadlineExceeded, не дожидаясь его истечения.
+        """
+        while True:
+            wait = await self.try_acquire(url)
+            if wait <= 0:
+                return
+            if wait >= deadline.remaining():
+                raise DeadlineExceeded(f"Rate limit wait {wait:.1f}s exceeds page deadline")
+            await deadline.sleep(wait)
+
+
+async def throttle(url: str, deadline: PageDeadline = NO_DEADLINE) -> None:
+    """
+    Берёт токен общего ограничителя процесса (задаётся при запуске бота) перед переходом на `url`.
+    Без ограничителя переходы не ограничиваются.
+    """
+    limiter = global_pool.rate_limiter
+    if limiter:
+        with deadline.stage("rate_limit"):
+            await limiter.acquire(url, deadline)
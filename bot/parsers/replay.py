@@ -0,0 +1,128 @@
+"""
+Повторный разбор сохранённых снимков страниц текущими правилами извлечения.
+
+    python -m bot.parsers.replay --dir browser_artifacts --marketplace ozon --failed-only
+
+Для каждого снимка печатается исход парсера при сохранении и исход текущих правил,
+в конце — сводка: сколько ошибок исправлено, сколько успешных страниц разобрано иначе
+и у скольких цену теперь дал другой источник, чем при сохранении.
+"""
+import argparse
+import logging
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from bot.parsers.artifacts import ArtifactStore
+from bot.parsers.extraction import Extraction, extract_product
+
+logger = logging.getLogger(__name__)
+
+MARKETPLACES = ("wildberries", "ozon", "joom", "yandex")
+
+
+@dataclass(frozen=True)
+class ReplayOutcome:
+    meta: dict
+    extraction: Extraction
+
+    @property
+    def status(self) -> str:
+        """
+        `fixed` — при сохранении была ошибка, теперь цена извлекается;
+        `changed` — успешная страница разобрана иначе (другая цена или ошибка);
+        `same` — исход не изменился.
+        """
+        live_error = self.meta.get("error")
+        new_error = self.extraction.error
+        if live_error and new_error is None:
+            return "fixed"
+        if not live_error and (new_error is not None or self.extraction.price != self.meta.get("price")):
+            return "changed"
+        return "same"
+
+    @property
+    def source_changed(self) -> bool:
+        """
+        Цену при сохранении дал другой источник (например, селекторы живой страницы, а не правило).
+        Снимки без источника в метаданных и страницы без цены не сравниваются.
+        """
+        live_source = self.meta.get("source")
+        return bool(live_source) and self.extraction.price is not None and live_source != self.extraction.source
+
+
+def _replay_one(args: tuple[str, str]) -> Extraction:
+    marketplace, html = args
+    return extract_product(marketplace, html)
+
+
+def replay(
+    store: ArtifactStore,
+    *,
+    marketplace: Optional[str] = None,
+    failed_only: bool = False,
+    workers: int = 0,
+) -> list[ReplayOutcome]:
+    """
+    Разбирает снимки хранилища правилами `extract_product`; при `workers > 0` — в пуле процессов.
+    """
+    entries = [
+        meta for meta in store.entries(marketplace)
+        if not failed_only or meta.get("error")
+    ]
+    jobs = ((meta["marketplace"], store.load_html(meta["id"])) for meta in entries)
+    if workers > 0:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            extractions = list(executor.map(_replay_one, jobs))
+    else:
+        extractions = [_replay_one(job) for job in jobs]
+    return [ReplayOutcome(meta, extraction) for meta, extraction in zip(entries, extractions)]
+
+
+def print_report(outcomes: Iterable[ReplayOutcome], out=sys.stdout) -> dict[str, int]:
+    totals = {"fixed": 0, "changed": 0, "same": 0}
+    source_changed = 0
+    for outcome in outcomes:
+        meta, extraction = outcome.meta, outcome.extraction
+        status = outcome.status
+        totals[status] += 1
+        source_changed += outcome.source_changed
+        new_error = extraction.error.name if extraction.error else None
+        print(
+            f"{status:<8} {meta['id']}  live: {meta.get('price')}/{meta.get('error')} ({meta.get('source')})  "
+            f"replay: {extraction.price}/{new_error} ({extraction.source})"
+            f"{'  source changed' if outcome.source_changed else ''}  {meta['url']}",
+            file=out,
+        )
+    print(
+        f"Total: {sum(totals.values())}, fixed: {totals['fixed']}, "
+        f"changed: {totals['changed']}, same: {totals['same']}, source changed: {source_changed}",
+        file=out,
+    )
+    totals["source_changed"] = source_changed
+    return totals
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay stored page snapshots through the current extractors")
+    parser.add_argument("--dir", default="browser_artifacts", help="artifact directory (PARSER_ARTIFACTS_DIR)")
+    parser.add_argument("--marketplace", choices=MARKETPLACES)
+    parser.add_argument("--failed-only", action="store_true", help="replay only pages that failed when captured")
+    parser.add_argument("--workers", type=int, default=0, help="parse in a process pool of this size")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    outcomes = replay(
+        ArtifactStore(args.dir),
+        marketplace=args.marketplace,
+        failed_only=args.failed_only,
+        workers=args.workers,
+    )
+    totals = print_report(outcomes)
+    # Ненулевой код, если успешные при сохранении страницы теперь разбираются иначе
+    return 1 if totals["changed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
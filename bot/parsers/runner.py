@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional, Union
+
+from playwright.async_api import BrowserContext, Page
+
+from enums.parse_errors import ParseError
+from enums.parse_records import ParseResult, ParseTask
+from bot.parsers.artifacts import ArtifactStore
+from bot.parsers.common import build_result, classify_exception
+from bot.parsers.deadline import PageDeadline, TimeoutMeter
+from bot.parsers.page_pool import PagePool
+from bot.parsers.ssr import SsrModeTracker, fetch_ssr
+
+if TYPE_CHECKING:
+    from bot.background_tasks.aimd import AdaptiveConcurrencyLimiter
+    from bot.background_tasks.circuit_breaker import CircuitBreaker
+    from bot.background_tasks.hedging import HedgeBudget, LatencyTracker
+    from bot.parsers.context_pool import ContextPool
+
+logger = logging.getLogger(__name__)
+
+
+async def run_marketplace_tasks(
+    marketplace: str,
+    marketplace_tasks: list[ParseTask],
+    context: Optional[BrowserContext],
+    fetch: Callable[[Page, ParseTask, PageDeadline], Awaitable[ParseResult]],
+    *,
+    max_concurrent: int,
+    page_budget: float = 90.0,
+    breaker: Optional["CircuitBreaker"] = None,
+    limiter: Optional["AdaptiveConcurrencyLimiter"] = None,
+    latency: Optional["LatencyTracker"] = None,
+    hedge_budget: Optional["HedgeBudget"] = None,
+    context_factory: Optional[Callable[[], Awaitable[BrowserContext]]] = None,
+    page_pool: Optional[Union[PagePool, "ContextPool"]] = None,
+    ssr: Optional[SsrModeTracker] = None,
+    artifacts: Optional[ArtifactStore] = None,
+) -> list[ParseResult]:
+    """
+    Общий цикл обработки задач одного маркетплейса с ограничением параллельности.
+    Вкладки берутся из пула `page_pool` — PagePool одного контекста или ContextPool
+    (если пул не передан, он создаётся для `context` на время вызова),
+    каждая страница получает общий бюджет времени `page_budget`:
+    все ожидания внутри парсера ограничены его остатком, а по истечении бюджета
+    обработка отменяется, страница закрывается и задача получает ошибку TIMEOUT.
+    Если передан адаптивный ограничитель, параллельность задаёт он, а не `max_concurrent`.
+    Если передан предохранитель, каждый результат учитывается в нём, а задачи,
+    пришедшиеся на разомкнутое состояние, откладываются до следующего обхода
+    и в результат не попадают.
+    Если переданы `latency`, `hedge_budget` и `context_factory`, страница, не давшая
+    результата за p95 задержки маркетплейса, дублируется в свежем контексте,
+    и берётся первый успешный результат из двух попыток.
+    Если передан `ssr` и режим SSR включён, сначала пробуется извлечение из серверной
+    разметки без выполнения JavaScript, а полный рендеринг запускается только при неудаче.
+    Если передан `artifacts`, HTML отрендеренных страниц с ошибкой и выборки успешных
+    сохраняется в нём до возврата вкладки в пул.
+    """
+    semaphore = asyncio.Semaphore(max_concurrent)
+    meter = TimeoutMeter(marketplace)
+    owns_pool = page_pool is None
+    if owns_pool:
+        page_pool = PagePool(context, size=limiter.ceiling if limiter else max_concurrent)
+
+    async def pooled_fetch(product_info: ParseTask, deadline: PageDeadline) -> ParseResult:
+        page = await page_pool.acquire()
+        result = None
+        try:
+            if ssr and ssr.should_try():
+                result = await ssr_attempt(page, product_info, deadline)
+            if result is None:
+                result = await fetch(page, product_info, deadline)
+            if artifacts and artifacts.should_capture(result.last_error):
+                await capture(page, product_info, result, deadline)
+            return result
+        finally:
+            # Прерванную вкладку не переиспользуем: её состояние неизвестно
+            await page_pool.release(page, discard=result is None, error=result.last_error if result else None)
+
+    async def capture(page: Page, product_info: ParseTask, result: ParseResult, deadline: PageDeadline) -> None:
+        # Результат SSR получен без навигации вкладки: снимать нечего
+        if page.url == "about:blank":
+            return
+        try:
+            html = await asyncio.wait_for(page.content(), timeout=10)
+            await asyncio.to_thread(
+                artifacts.save, marketplace, product_info.url, html,
+                price=result.price, name=result.product_name, error=result.last_error, source=result.source,
+                stages=dict(deadline.stages),
+            )
+        except Exception as e:
+            logger.debug(f"Failed to save {marketplace} page artifact: {product_info.url} - {e}")
+
+    async def ssr_attempt(page: Page, product_info: ParseTask, deadline: PageDeadline) -> Optional[ParseResult]:
+        try:
+            result = await fetch_ssr(page, marketplace, product_info, deadline)
+        except Exception as e:
+            logger.debug(f"SSR request failed for {marketplace}: {product_info.url} - {e}")
+            result = None
+
+        if result is None:
+            ssr.record(False)
+            return None
+        if not ssr.validating:
+            ssr.record(True)
+            return result
+
+        # Режим ещё не подтверждён: сверяем цену с полным рендерингом и возвращаем его результат
+        rendered = await fetch(page, product_info, deadline)
+        if rendered.last_error is None:
+            ssr.record(rendered.price == result.price)
+        return rendered
+
+    async def hedge_attempt(product_info: ParseTask, deadline: PageDeadline) -> ParseResult:
+        hedge_context = await context_factory()
+        try:
+            page = await hedge_context.new_page()
+            try:
+                return await fetch(page, product_info, deadline)
+            finally:
+                await page.close()
+        finally:
+            await hedge_context.close()
+
+    async def fetch_hedged(product_info: ParseTask, deadline: PageDeadline) -> ParseResult:
+        hedge_after = latency.p95() if latency and hedge_budget and context_factory else None
+        if hedge_after is None or hedge_after >= deadline.remaining():
+            return await pooled_fetch(product_info, deadline)
+
+        primary = asyncio.ensure_future(pooled_fetch(product_info, deadline))
+        attempts = {primary}
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=hedge_after)
+            if done or not hedge_budget.try_acquire():
+                return await primary
+
+            logger.info("Hedging %s page after %.1fs: %s", marketplace, hedge_after, product_info.url)
+            hedge = asyncio.ensure_future(hedge_attempt(product_info, deadline))
+            attempts.add(hedge)
+
+            # Первый успешный результат; ошибка принимается, только если вторая попытка тоже завершилась
+            pending = set(attempts)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is not None:
+                        if not pending:
+                            raise attempt.exception()
+                        continue
+                    result = attempt.result()
+                    if result.last_error is None or not pending:
+                        if attempt is hedge:
+                            hedge_budget.record_win()
+                        return result
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+            await asyncio.gather(*attempts, return_exceptions=True)
+
+    async def fetch_page(product_info: ParseTask) -> ParseResult:
+        deadline = PageDeadline(page_budget, meter=meter)
+        meter.pages += 1
+        if hedge_budget:
+            hedge_budget.record_primary()
+        started_at = time.monotonic()
+        try:
+            result = await asyncio.wait_for(fetch_hedged(product_info, deadline), timeout=page_budget)
+        except asyncio.TimeoutError:
+            meter.expired_pages += 1
+            logger.warning("Page budget %.0fs expired for %s: %s", page_budget, marketplace, product_info.url)
+            return build_result(product_info, None, None, ParseError.TIMEOUT)
+        except Exception as e:
+            logger.error(f"Error opening page for {marketplace}: {product_info.url} - {e}")
+            return build_result(product_info, None, None, classify_exception(e))
+
+        if latency and result.last_error is None:
+            latency.record(time.monotonic() - started_at)
+        return result
+
+    async def run_one(product_info: ParseTask) -> Optional[ParseResult]:
+        if limiter:
+            await limiter.acquire()
+        else:
+            await semaphore.acquire()
+
+        ticket = None
+        try:
+            if breaker:
+                ticket = await breaker.acquire()
+                if ticket is None:
+                    return None
+
+            started_at = limiter.clock() if limiter else 0.0
+            result = await fetch_page(product_info)
+            if breaker:
+                breaker.record(result.last_error, ticket)
+            if limiter:
+                limiter.record(started_at, result.last_error)
+            return result
+        finally:
+            if ticket:
+                breaker.release(ticket)
+            if limiter:
+                await limiter.release()
+            else:
+                semaphore.release()
+
+    try:
+        results = await asyncio.gather(*(run_one(info) for info in marketplace_tasks))
+    finally:
+        if owns_pool:
+            await page_pool.close()
+
+    processed = [result for result in results if result is not None]
+    deferred = len(results) - len(processed)
+    if deferred:
+        logger.warning("Deferred %d %s tasks while circuit breaker is open", deferred, marketplace)
+    meter.log_summary()
+
+    return processed
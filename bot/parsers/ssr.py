@@ -0,0 +1,135 @@
+import logging
+from collections import deque
+from typing import Optional
+
+from playwright.async_api import Page
+
+import bot.db_pool_singleton.db_pool_singleton as global_pool
+from enums.parse_records import ParseResult, ParseTask
+from bot.parsers.challenge import match_challenge
+from bot.parsers.common import build_result, classify_response
+from bot.parsers.deadline import PageDeadline
+from bot.parsers.extraction import extract_offloaded, html_to_text, page_title
+from bot.parsers.rate_limiter import throttle
+
+logger = logging.getLogger(__name__)
+
+# Заглушки антибота короткие; текст больших страниц не проверяем, чтобы не ловить строки из бандлов
+CHALLENGE_HTML_LIMIT = 30000
+
+SSR_MODES = {"off", "on", "auto"}
+
+
+class SsrModeTracker:
+    """
+    Режим извлечения из серверной разметки для одного маркетплейса.
+    `on` — всегда сначала пробовать SSR, `off` — никогда, `auto` — по доле успехов.
+    В режиме `auto`, пока режим не включён, SSR-результат проверяется полным рендерингом
+    и считается успешным, только если цены совпали. Режим включается, когда в окне набрано
+    `min_samples` проверок и доля успехов не ниже `enable_rate`, и выключается, когда доля падает.
+    В выключенном режиме после обучения пробуется каждая `probe_every`-я страница,
+    чтобы режим мог включиться снова.
+    """
+
+    def __init__(
+        self,
+        marketplace: str,
+        *,
+        mode: str = "auto",
+        window: int = 50,
+        min_samples: int = 10,
+        enable_rate: float = 0.8,
+        probe_every: int = 20,
+    ):
+        if mode not in SSR_MODES:
+            raise ValueError(f"Unknown SSR mode {mode!r} for {marketplace}")
+        self.marketplace = marketplace
+        self.mode = mode
+        self.min_samples = min_samples
+        self.enable_rate = enable_rate
+        self.probe_every = probe_every
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._skipped = 0
+        self._enabled: Optional[bool] = None
+
+    @property
+    def success_rate(self) -> Optional[float]:
+        if not self._outcomes:
+            return None
+        return sum(self._outcomes) / len(self._outcomes)
+
+    @property
+    def enabled(self) -> bool:
+        if self.mode != "auto":
+            return self.mode == "on"
+        return len(self._outcomes) >= self.min_samples and self.success_rate >= self.enable_rate
+
+    @property
+    def validating(self) -> bool:
+        """
+        SSR-результат нужно сверить с полным рендерингом.
+        """
+        return self.mode == "auto" and not self.enabled
+
+    def should_try(self) -> bool:
+        if self.mode == "off":
+            return False
+        if self.enabled or len(self._outcomes) < self.min_samples:
+            return True
+        self._skipped += 1
+        if self._skipped >= self.probe_every:
+            self._skipped = 0
+            return True
+        return False
+
+    def record(self, success: bool) -> None:
+        self._outcomes.append(success)
+        enabled = self.enabled
+        if self._enabled is not None and enabled != self._enabled:
+            logger.info(
+                "SSR mode for %s %s (success rate %.2f)",
+                self.marketplace, "enabled" if enabled else "disabled", self.success_rate,
+            )
+        self._enabled = enabled
+
+
+async def fetch_ssr(
+    page: Page,
+    marketplace: str,
+    product_info: ParseTask,
+    deadline: PageDeadline,
+) -> Optional[ParseResult]:
+    """
+    Загружает HTML страницы запросом контекста (cookies общие с браузером, JavaScript не выполняется)
+    и извлекает цену и название. Возвращает результат, только если цену удалось извлечь,
+    и None, если нужен полный рендеринг: при заглушке антибота (браузер может пройти JS-проверку)
+    и при любом отсутствии товара, включая ответ 404 — NOT_FOUND отключает подписки,
+    поэтому его подтверждает только браузер.
+    """
+    url = product_info.url
+    await throttle(url, deadline)
+    with deadline.stage("ssr"):
+        response = await page.request.get(url, timeout=deadline.timeout(20000))
+        if classify_response(response):
+            return None
+        html = await response.text()
+
+    probe = {
+        "url": response.url,
+        "title": page_title(html),
+        "text": html_to_text(html) if len(html) < CHALLENGE_HTML_LIMIT else "",
+        "frames": "",
+    }
+    challenge = match_challenge(marketplace, probe)
+    if challenge:
+        logger.info(f"Anti-bot challenge in {marketplace} SSR response ({challenge}), falling back to rendering: {url}")
+        return None
+
+    # Отсутствие товара по серверной разметке тоже не подтверждаем: это решит полный рендеринг
+    extraction = await extract_offloaded(marketplace, html, global_pool.extraction_executor)
+    if not extraction.price:
+        return None
+    logger.info(f"SSR price: {extraction.price} ₽ ({extraction.source}), item: {extraction.name}")
+    return build_result(
+        product_info, extraction.price, extraction.name or "название товара не найдено", None, extraction.source,
+    )
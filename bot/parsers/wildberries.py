@@ -1,46 +1,31 @@
 import asyncio
-import re
 import random
 import time
 import logging
-from typing import Optional, Union, Tuple
+from typing import Optional, Union
 from playwright.async_api import Page, BrowserContext
+
+from enums.parse_errors import ParseError
+from enums.parse_records import ParseResult, ParseTask
+from bot.parsers.challenge import detect_challenge
+from bot.parsers.common import build_result, classify_exception, classify_response, extract_rendered
+from bot.parsers.deadline import NO_DEADLINE, PageDeadline
+from bot.parsers.extraction import check_existence, select_wb_price
+from bot.parsers.rate_limiter import throttle
+from bot.parsers.runner import run_marketplace_tasks
     
 # logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
  
 async def check_product_exists(page: Page) -> bool:
     """
-    Проверяет наличие товара по тексту страницы visible_text.
-    Ищет тексты отсутствия товара и положительные индикаторы.
-    Поиск текста — регистр-независимый.
-    Возвращает False, если найден текст об отсутствии товара,
-    True — если найден хотя бы один из положительных текстов,
-    Иначе возвращает True (считаем, что товар есть).
+    Проверяет наличие товара по тексту страницы visible_text
+    правилами `bot.parsers.extraction.check_existence`.
+    Возвращает False, если найден текст об отсутствии товара, иначе True.
     """
 
     visible_text = await page.evaluate("() => document.body.innerText")
-    
-    absence_patterns = [
-        re.compile(r"по вашему запросу ничего не найдено", re.IGNORECASE),
-        re.compile(r"нет\s*в\s*наличии", re.IGNORECASE)
-    ]
-    positive_patterns = [
-        re.compile(r"артикул", re.IGNORECASE)
-    ]
-    
-    for pattern in absence_patterns:
-        if pattern.search(visible_text):
-            logger.info(f"Finded absence text: '{pattern.pattern}'")
-            return False
-
-    for pattern in positive_patterns:
-        if pattern.search(visible_text):
-            logger.info(f"Finded positive text: '{pattern.pattern}'")
-            return True
-
-    logger.info("Not finded absence or positive text, return True")
-    return True
+    return check_existence("wildberries", visible_text)
 
 
 async def get_discount_price_wb(page: Page) -> Union[int, str]:
@@ -54,46 +39,23 @@ async def get_discount_price_wb(page: Page) -> Union[int, str]:
 )
     count = await price_locator.count()
 
-    valid_prices = []
+    candidates = []
     for i in range(count):
         elem = price_locator.nth(i)
-        text = (await elem.inner_text()).strip()
-        match = re.search(r'(\d[\d\s]*\d)\s*₽', text)
-        if not match:
-            continue
-        price_str = match.group(1).replace('\xa0', '').replace(' ', '')
-        try:
-            price_val = int(price_str)
-        except ValueError:
-            continue
-        cls = (await elem.get_attribute('class')) or ""
-        cls = cls.lower()
-        tag = await elem.evaluate("(el) => el.tagName.toLowerCase()")
-        valid_prices.append({"price": price_val, "class": cls, "tag": tag})
-
-    if not valid_prices:
-        return "Цена не найдена"
-
-    discount_keywords = ["final", "discount", "sale", "red-price", "wallet-price"]
-    discount_prices = [
-        item["price"] for item in valid_prices if any(k in item["class"] for k in discount_keywords)
-    ]
-
-    if discount_prices:
-        discount_price = min(discount_prices)
-    else:
-        discount_price = min(item["price"] for item in valid_prices)
+        text = await elem.inner_text()
+        cls = await elem.get_attribute('class')
+        candidates.append((text, cls))
 
-    return discount_price
+    return select_wb_price(candidates)
 
 
-async def get_wb_product_name(page: Page) -> Optional[str]:
+async def get_wb_product_name(page: Page, deadline: PageDeadline = NO_DEADLINE) -> Optional[str]:
     """
     Получает название товара на уже загруженной странице.
     Возвращает None если название не найдено.
     """
     try:
-        product_name_el = await page.wait_for_selector("h3", timeout=15000)
+        product_name_el = await page.wait_for_selector("h3", timeout=deadline.timeout(15000))
         if product_name_el is None:
             return None
         product_name = (await product_name_el.inner_text()).strip()
@@ -103,8 +65,8 @@ async def get_wb_product_name(page: Page) -> Optional[str]:
         return None
 
 
-async def wait_for_full_load(page, timeout=30000):
-    await page.wait_for_load_state("load")  # дождаться полной загрузки страницы
+async def wait_for_full_load(page, timeout=30000, deadline: PageDeadline = NO_DEADLINE):
+    await page.wait_for_load_state("load", timeout=deadline.timeout(timeout))  # дождаться полной загрузки страницы
 
     check_interval = 1000
     max_checks = timeout // check_interval
@@ -113,6 +75,9 @@ async def wait_for_full_load(page, timeout=30000):
     required_stable_iterations = 3
 
     for _ in range(max_checks):
+        # Не тратим на стабилизацию остаток бюджета, нужный для поиска цены
+        if deadline.remaining() < check_interval / 1000 * 2:
+            break
         try:
             html = await page.content()
         except Exception:
@@ -133,92 +98,84 @@ async def wait_for_full_load(page, timeout=30000):
 
 
 async def single_task(
-    context: BrowserContext,
-    product_info: Tuple[int, int, str, int, int],
-) -> Tuple[int, int, Optional[int], Optional[str], Optional[int], Optional[str], int, str]:
+    page: Page,
+    product_info: ParseTask,
+    deadline: PageDeadline = NO_DEADLINE,
+) -> ParseResult:
     """
-    Одна задача: создаёт контекст и страницу, загружает URL,
+    Одна задача: загружает URL на выданной странице,
     проверяет наличие товара и получает цену и название.
     """
-    user_id = product_info[0]
-    product_id = product_info[1]
-    url = product_info[2]
-    min_price = product_info[3]
-    target_price = product_info[4]
-    
-    try:
-        page = await context.new_page()
+    url = product_info.url
 
+    try:
         # Переход на страницу
-        await page.goto(url, wait_until="load", timeout=60000)    
-        await asyncio.sleep(random.uniform(2.0, 2.7))
+        await throttle(url, deadline)
+        with deadline.stage("goto"):
+            response = await page.goto(url, wait_until="load", timeout=deadline.timeout(60000))
+        error = classify_response(response)
+        if error:
+            logger.warning(f"Bad response status {response.status} in wildberries: {url}")
+            return build_result(product_info, None, None, error)
+
+        # Капча или антибот-заглушка: сразу освобождаем слот вместо ожидания селекторов
+        with deadline.stage("challenge"):
+            challenge = await detect_challenge(page, "wildberries")
+        if challenge:
+            logger.warning(f"Anti-bot challenge in wildberries ({challenge}): {url}")
+            return build_result(product_info, None, None, ParseError.BLOCKED)
+
+        await deadline.sleep(random.uniform(2.0, 2.7))
         
-        await wait_for_full_load(page)
+        with deadline.stage("full_load"):
+            await wait_for_full_load(page, deadline=deadline)
 
         # Проверяем наличие товара
         exists = await check_product_exists(page)
         if not exists:
             logger.warning("Item not found in marketplace")
-            return (user_id, product_id, None, None, min_price, "Товар не найден", target_price, url)
+            return build_result(product_info, None, None, ParseError.NOT_FOUND)
 
         # Получаем цену
-        price = await get_discount_price_wb(page)
+        with deadline.stage("price"):
+            price = await get_discount_price_wb(page)
 
         # Получаем название
-        name = await get_wb_product_name(page)
+        with deadline.stage("name"):
+            name = await get_wb_product_name(page, deadline)
         name = name or "название товара не найдено"
 
-        if isinstance(price, int) and name:
+        if isinstance(price, int):
             logger.info(f"Price: {price} ₽, item: {name}")
-            if min_price:
-                if int(price) <= int(min_price):
-                    return (user_id, product_id, price, name, price, None, target_price, url)
-                else:
-                    return (user_id, product_id, price, name, min_price, None, target_price, url)
-            else:
-                return (user_id, product_id, price, name, price, None, target_price, url)
-            
-        elif isinstance(price, int):
-            logger.info(f"Founded only price: {price} ₽")
-            if min_price:
-                if int(price) <= int(min_price):
-                    return (user_id, product_id, price, None, price, None, target_price, url)
-                else:
-                    return (user_id, product_id, price, None, min_price, None, target_price, url)
-            else:
-                return (user_id, product_id, price, None, price, None, target_price, url)
+            return build_result(product_info, price, name, None, "selector")
 
-        else:
-            logger.info("Price not found")
-            return (user_id, product_id, None, None, min_price, "Товар не найден", target_price, url)
+        # Видимой цены селекторы не нашли: правила извлечения по HTML страницы как запасной вариант
+        extracted = await extract_rendered(page, "wildberries", product_info, deadline)
+        if extracted:
+            return extracted
+
+        logger.info("Price not found")
+        return build_result(product_info, None, None, ParseError.PARSE_FAILED)
     
     except Exception as e:
-        logger.error(f"Error fetching product data in wildberries: {url} - {e}")
-        return (user_id, product_id, None, None, min_price, "Товар не найден", target_price, url)
-    
-    finally:
-        await page.close()
+        error = classify_exception(e)
+        logger.error(f"Error fetching product data in wildberries ({error.name}): {url} - {e}")
+        return build_result(product_info, None, None, error)
 
 
 async def process_many_wb_tasks(
-    marketplace_tasks: list[Tuple[int, int, str, int, int]],
+    marketplace_tasks: list[ParseTask],
     context: BrowserContext,
-    max_concurrent: int = 5
-) -> list[Tuple[int, int, Optional[int], Optional[str], Optional[int], Optional[str], int, str]]:
+    max_concurrent: int = 5,
+    **runner_options,
+) -> list[ParseResult]:
     """
     Запускает несколько одновременных задач по списку url и возвращает результаты.
     """
-           
-    semaphore = asyncio.Semaphore(max_concurrent)
-
-    async def sem_task(product_info):
-        async with semaphore:
-            return await single_task(context=context, product_info=product_info)
-
-    tasks = [asyncio.create_task(sem_task(info)) for info in marketplace_tasks]
-    results = await asyncio.gather(*tasks)
-
-    return results
+    return await run_marketplace_tasks(
+        "wildberries", marketplace_tasks, context, single_task,
+        max_concurrent=max_concurrent, **runner_options,
+    )
 
 
 if __name__ == "__main__":
@@ -234,7 +191,9 @@ if __name__ == "__main__":
     ]
 
     start_time = time.time()
-    results = asyncio.run(process_many_wb_tasks(products_id_and_urls_and_min_prices, max_concurrent=10))
+    results = asyncio.run(process_many_wb_tasks(
+        [ParseTask(*item) for item in products_id_and_urls_and_min_prices], max_concurrent=10,
+    ))
     logger.info(f"Результаты: {results}")
     logger.info(f"Время выполнения: {time.time() - start_time:.2f} секунд")
 
@@ -2,11 +2,21 @@ import asyncio
 import random
 import re
 import logging
-from typing import Tuple, Optional
+from typing import Optional
 from aiogram import F
 from playwright.async_api import Page, BrowserContext
 from playwright.async_api import TimeoutError
 
+from enums.parse_errors import ParseError
+from enums.parse_records import ParseResult, ParseTask
+from bot.parsers.challenge import detect_challenge
+from bot.parsers.common import build_result, classify_exception, classify_response, extract_rendered
+from bot.parsers.deadline import NO_DEADLINE, PageDeadline
+# parse_price остаётся в модуле для совместимости: правило Маркета живёт в extraction
+from bot.parsers.extraction import check_existence, parse_digit_groups as parse_price, parse_first_number
+from bot.parsers.rate_limiter import throttle
+from bot.parsers.runner import run_marketplace_tasks
+
 
 # Настройка логгера
 logger = logging.getLogger(__name__)
@@ -16,40 +26,15 @@ logger = logging.getLogger(__name__)
 
 async def check_product_existence_by_text(page: Page) -> bool:
     """
-    Проверяет наличие товара по тексту страницы visible_text.
-    Ищет тексты отсутствия товара и положительные индикаторы.
-    Поиск текста — регистр-независимый.
-    Возвращает False, если найден текст об отсутствии товара,
-    True — если найден хотя бы один из положительных текстов,
-    Иначе возвращает True (считаем, что товар есть).
+    Проверяет наличие товара по тексту страницы visible_text
+    правилами `bot.parsers.extraction.check_existence`.
+    Возвращает False, если найден текст об отсутствии товара, иначе True.
     """
     visible_text = await page.evaluate("() => document.body.innerText")
-
-    absence_patterns = [
-        re.compile(r"Тут ничего нет", re.IGNORECASE),
-        re.compile(r"Попробуйте вернуться назад или поищите что-нибудь другое.", re.IGNORECASE),
-        re.compile(r"Нет в продаже", re.IGNORECASE),
-        re.compile(r"Такого товара у нас нет", re.IGNORECASE),
-    ]
-    positive_patterns = [
-        re.compile(r"Артикул Маркета", re.IGNORECASE),
-    ]
-
-    for pattern in absence_patterns:
-        if pattern.search(visible_text):
-            logger.info(f"Finded absence text: '{pattern.pattern}'")
-            return False
-
-    for pattern in positive_patterns:
-        if pattern.search(visible_text):
-            logger.info(f"Finded positive text: '{pattern.pattern}'")
-            return True
-
-    logger.info("Not finded absence or positive text, return True")
-    return True
+    return check_existence("yandex", visible_text)
 
 
-async def find_price_element(page: Page):
+async def find_price_element(page: Page, deadline: PageDeadline = NO_DEADLINE):
     """
     Устойчивый поиск элемента с ценой на Яндекс.Маркете.
     Использует несколько вариантов селекторов, включая частичные совпадения атрибутов,
@@ -68,6 +53,7 @@ async def find_price_element(page: Page):
     for sel in selectors:
         elems = await page.query_selector_all(sel)
         for elem in elems:
+            deadline.check()
             if await elem.is_visible():
                 text = (await elem.inner_text()).strip()
                 if not text:
@@ -82,6 +68,7 @@ async def find_price_element(page: Page):
     # Если не нашли по селекторам, ищем по тексту всего документа
     elements = await page.query_selector_all("xpath=//*[contains(text(), '₽')]")
     for elem in elements:
+        deadline.check()
         if await elem.is_visible():
             text = (await elem.inner_text()).strip()
             if text:
@@ -92,25 +79,7 @@ async def find_price_element(page: Page):
     return None
 
 
-def parse_price(text: str) -> Optional[int]:
-    """
-    Извлекает число из строки с ценой.
-    Убирает пробелы и спецсимволы, оставляет только цифры.
-    Берёт первое числовое значение.
-    """
-    clean_text = re.sub(r'[^\d\s]', '', text)
-    price_match = re.search(r'\d[\d\s]*\d|\d', clean_text)
-    if price_match:
-        price_str = price_match.group(0).replace(' ', '').replace('\u2006', '')  # очищаем пробелы
-        try:
-            return int(price_str)
-        except ValueError:
-            return None
-    return None
-
-
-
-async def find_product_name(page: Page) -> Optional[str]:
+async def find_product_name(page: Page, deadline: PageDeadline = NO_DEADLINE) -> Optional[str]:
     """
     Поиск названия товара с использованием нескольких стратегий.
     """
@@ -122,7 +91,7 @@ async def find_product_name(page: Page) -> Optional[str]:
     ]
     for sel in selectors:
         try:
-            await page.wait_for_selector(sel, timeout=4000)
+            await page.wait_for_selector(sel, timeout=deadline.timeout(4000))
             elem = await page.query_selector(sel)
             if elem:
                 text = (await elem.inner_text()).strip()
@@ -141,94 +110,82 @@ async def find_product_name(page: Page) -> Optional[str]:
 
 
 async def fetch_product_data(
-    user_id: int,
-    product_id: int,
-    url: str,
-    min_price: int,
-    target_price: int,
-    context: BrowserContext
-) -> Tuple[int, int, Optional[int], Optional[str], int, Optional[str], int, str]:
-    """
-    Возвращает кортеж:
-    (user_id, product_id, price_or_none, product_name_or_none, min_price, last_error_or_none, target_price, url)
-    """
+    product_info: ParseTask,
+    page: Page,
+    deadline: PageDeadline = NO_DEADLINE,
+) -> ParseResult:
+    url, product_id = product_info.url, product_info.product_id
+
     try:
-        page = await context.new_page()
-        await page.goto(url, wait_until="load", timeout=60000)
-        await asyncio.sleep(random.uniform(2, 4))
+        await throttle(url, deadline)
+        with deadline.stage("goto"):
+            response = await page.goto(url, wait_until="load", timeout=deadline.timeout(60000))
+        error = classify_response(response)
+        if error:
+            logger.warning(f"Bad response status {response.status} in Yandex Market: {url}")
+            return build_result(product_info, None, None, error)
+
+        # Капча или антибот-заглушка: сразу освобождаем слот вместо ожидания селекторов
+        with deadline.stage("challenge"):
+            challenge = await detect_challenge(page, "yandex")
+        if challenge:
+            logger.warning(f"Anti-bot challenge in Yandex Market ({challenge}): {url}")
+            return build_result(product_info, None, None, ParseError.BLOCKED)
+
+        await deadline.sleep(random.uniform(2, 4))
 
         is_exists = await check_product_existence_by_text(page)
         if not is_exists:
             logger.info(f"Item {product_id} not found: {url}")
-            return (user_id, product_id, None, None, min_price, "Товар не найден", target_price, url)
+            return build_result(product_info, None, None, ParseError.NOT_FOUND)
 
-        product_name = await find_product_name(page)
+        with deadline.stage("name"):
+            product_name = await find_product_name(page, deadline)
         if not product_name:
+            # Селекторы не нашли даже название: правила извлечения по HTML страницы как запасной вариант
+            extracted = await extract_rendered(page, "yandex", product_info, deadline)
+            if extracted:
+                return extracted
             logger.info(f"Product name not found: {url}")
-            return (user_id, product_id, None, None, min_price, "Название не найдено", target_price, url)
+            return build_result(product_info, None, None, ParseError.PARSE_FAILED)
 
-        price_element = await find_price_element(page)
-        if not price_element:
+        with deadline.stage("price"):
+            price_element = await find_price_element(page, deadline)
+        price = parse_first_number(await price_element.inner_text()) if price_element else None
+        if price is None:
+            # Видимой цены селекторы не нашли: правила извлечения по HTML страницы как запасной вариант
+            extracted = await extract_rendered(page, "yandex", product_info, deadline)
+            if extracted:
+                return extracted
             logger.info(f"Price element not found: {url}")
-            return (user_id, product_id, None, product_name, min_price, "Цена не найдена", target_price, url)
-
-        price_text = (await price_element.inner_text()).strip()
-        clean_price_text = re.sub(r'\s+', '', price_text)
-        price_match = re.search(r'(\d+)', clean_price_text)
-        price = int(price_match.group(1)) if price_match else None
+            return build_result(product_info, None, product_name, ParseError.PARSE_FAILED)
 
-        if price is None:
-            logger.info(f"Cannot parse price: {url}")
-            return (user_id, product_id, None, product_name, min_price, "Цена не распознана", target_price, url)
-
-        if min_price:
-            if int(price) <= int(min_price):
-                logger.info(f"Price is less than min price: {url} Price: {price}, Min price: {min_price}")
-                return (user_id, product_id, price, product_name, price, None, target_price, url)
-            else:
-                return (user_id, product_id, price, product_name, min_price, None, target_price, url)
-        else:
-            return (user_id, product_id, price, product_name, price, None, target_price, url)
+        return build_result(product_info, price, product_name, None, "selector")
 
     except Exception as e:
-        logger.error(f"Error while fetching product data in Yandex Market: {url} - {e}")
-        return (user_id, product_id, None, None, min_price, "Товар не найден", target_price, url)
-
-    finally:
-        await page.close()
+        error = classify_exception(e)
+        logger.error(f"Error while fetching product data in Yandex Market ({error.name}): {url} - {e}")
+        return build_result(product_info, None, None, error)
 
 
-async def fetch_product_data_with_semaphore(
-        sem: asyncio.Semaphore,
-        user_id: int,
-        product_id: int,
-        url: str,
-        min_price: int,
-        target_price: int,
-        context: BrowserContext
-    ):
-    async with sem:
-        return await fetch_product_data(user_id, product_id, url, min_price, target_price, context)
+async def single_task(
+    page: Page,
+    product_info: ParseTask,
+    deadline: PageDeadline = NO_DEADLINE,
+) -> ParseResult:
+    return await fetch_product_data(product_info, page, deadline)
 
 
 async def process_many_yandex_market_tasks(
-    marketplace_tasks: list[Tuple[int, int, str, int, int]],
+    marketplace_tasks: list[ParseTask],
     context: BrowserContext,
-    max_concurrent: int = 3
+    max_concurrent: int = 3,
+    **runner_options,
 ):
-                
-    sem = asyncio.Semaphore(max_concurrent)
-
-    tasks = [
-        fetch_product_data_with_semaphore(
-            sem, user_id, product_id, url, min_price, target_price, context
-        )
-        for user_id, product_id, url, min_price, target_price in marketplace_tasks
-    ]
-
-    results = await asyncio.gather(*tasks)
-
-    return results
+    return await run_marketplace_tasks(
+        "yandex", marketplace_tasks, context, single_task,
+        max_concurrent=max_concurrent, **runner_options,
+    )
 
 
 if __name__ == "__main__":
@@ -240,18 +197,17 @@ if __name__ == "__main__":
         (3, 503, "https://market.yandex.ru/card/korpus-zalman-minitower-p10-mini-tower-plastikstalderevosteklo-5-slotov-rasshireniya/4511565227?do-waremd5=V2Ujf-g1Nqe4XPUi0HYDDQ&sponsored=1&cpc=TwxnC3avKh_qXNOvdM5o_oJXTLigqN6lWjoBAkrcWkysA9Bgaq3KZW6rP2oJcRGjw6Fo--iuT3MpMeCLSIsutNcQ13GcReVxe-y8COwhgG9-lB3CWsLZ_bGlNElJLnQrl_EJvjRuaPU-O7vqiHEZd7vGbEWDXTCVwtG6Nz84Gxhnao_egpD1zt3GTFSVi5cn3J28qnk7DwohQWxsvb5JiBInmjmTQjB30BgcNJa_9rMIIRfj8AQKFv1cxZR_UnICSIADfCk4GNhAVCJYMBfnnTz7LBBRPqegr_C3IZc9Z5UOFLmB7eLD-Z4KloDY4bt56VslozAj6Vx1etMWM2wbXBQI3iXGN4bG5sq3Imt7obktA4jZ5VegyQ%2C%2C&ogV=-4", 1000, 900),
     ]
 
-    results = asyncio.run(process_many_yandex_market_tasks(products_data, max_concurrent=3))
+    results = asyncio.run(process_many_yandex_market_tasks([ParseTask(*item) for item in products_data], max_concurrent=3))
 
     for res in results:
-        user_id, product_id, price, product_name, min_price, last_error, target_price, url = res
-        logger.info(f"User: {user_id}, Product: {product_id}, URL: {url}")
-        if product_name:
-            logger.info(f"Название товара: {product_name}")
-        if price is not None:
-            logger.info(f"Цена: {price} ₽")
+        logger.info(f"User: {res.user_id}, Product: {res.product_id}, URL: {res.url}")
+        if res.product_name:
+            logger.info(f"Название товара: {res.product_name}")
+        if res.price is not None:
+            logger.info(f"Цена: {res.price} ₽")
         else:
             logger.info("Цена не найдена")
-        logger.info(f"Минимальная цена для оповещения: {min_price}, Целевая цена: {target_price}")
-        if last_error:
-            logger.info(f"Ошибка/статус: {last_error}")
+        logger.info(f"Минимальная цена для оповещения: {res.min_price}, Целевая цена: {res.target_price}")
+        if res.last_error:
+            logger.info(f"Ошибка/статус: {res.last_error}")
         logger.info("")
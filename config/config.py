@@ -1,6 +1,6 @@
 import logging
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from environs import Env
 
@@ -37,12 +37,94 @@ class LoggSettings:
     format: str
 
 
+@dataclass
+class ParserSettings:
+    # Повторы временных ошибок в рамках одного обхода
+    retry_attempts: int = 2
+    retry_backoff_seconds: float = 30.0
+    # Карантин после K подряд неудачных обходов
+    quarantine_after_failures: int = 3
+    quarantine_minutes: int = 240
+    quarantine_max_minutes: int = 2880
+    # Предохранитель маркетплейса по доле ошибок и страниц-заглушек
+    breaker_window: int = 20
+    breaker_min_samples: int = 10
+    breaker_failure_rate: float = 0.5
+    breaker_challenge_rate: float = 0.3
+    breaker_open_seconds: float = 600.0
+    # Границы адаптивной (AIMD) параллельности по маркетплейсам
+    concurrency_floor: dict[str, int] = field(
+        default_factory=lambda: {"wildberries": 1, "ozon": 1, "joom": 1, "yandex": 1}
+    )
+    concurrency_initial: dict[str, int] = field(
+        default_factory=lambda: {"wildberries": 5, "ozon": 3, "joom": 5, "yandex": 3}
+    )
+    concurrency_ceiling: dict[str, int] = field(
+        default_factory=lambda: {"wildberries": 10, "ozon": 6, "joom": 10, "yandex": 6}
+    )
+    latency_target_seconds: float = 45.0
+    # Общий бюджет времени на одну страницу
+    page_budget_seconds: float = 90.0
+    # Страховочные попытки для страниц дольше p95: доля от нагрузки и минимальная выборка задержек
+    hedge_budget_ratio: float = 0.05
+    hedge_min_samples: int = 20
+    # Переиспользование вкладок: замена после N навигаций или при превышении размера JS-кучи
+    page_pool_max_uses: int = 50
+    page_pool_memory_limit_mb: float = 512.0
+    # Постоянные профили браузера по маркетплейсам: каталог, лимит HTTP-кеша, лимит профиля и период сброса
+    profiles_dir: str = "browser_profiles"
+    profile_cache_mb: int = 256
+    profile_max_mb: int = 1024
+    profile_max_age_hours: float = 72.0
+    # Пул контекстов со своими отпечатками: число контекстов по маркетплейсам и условия их замены
+    contexts_per_marketplace: dict[str, int] = field(
+        default_factory=lambda: {"wildberries": 2, "ozon": 2, "joom": 2, "yandex": 2}
+    )
+    context_min_health: float = 0.3
+    context_max_pages: int = 200
+    # Пул прокси: адреса, лимит страниц на прокси по маркетплейсам, порог и срок исключения, адрес проверки
+    proxies: list[str] = field(default_factory=list)
+    proxy_max_concurrent: dict[str, int] = field(
+        default_factory=lambda: {"wildberries": 4, "ozon": 2, "joom": 4, "yandex": 2}
+    )
+    proxy_eject_error_rate: float = 0.5
+    proxy_eject_seconds: float = 900.0
+    proxy_check_url: str = "https://www.wildberries.ru/"
+    # Общий для всех процессов лимит переходов на хост маркетплейса, запросов в секунду
+    host_rate_limits: dict[str, float] = field(
+        default_factory=lambda: {
+            "wildberries.ru": 2.0, "ozon.ru": 1.0, "joom.ru": 2.0, "joom.com": 2.0, "market.yandex.ru": 1.0,
+        }
+    )
+    host_rate_default: float = 1.0
+    host_rate_burst: float = 5.0
+    # Извлечение из серверной разметки без JavaScript: режим по маркетплейсам (auto/on/off) и автовключение
+    ssr_mode: dict[str, str] = field(
+        default_factory=lambda: {"wildberries": "auto", "ozon": "auto", "joom": "auto", "yandex": "auto"}
+    )
+    ssr_min_samples: int = 10
+    ssr_enable_rate: float = 0.8
+    ssr_probe_every: int = 20
+    # Процессы для разбора HTML вне цикла событий (0 — разбор в процессе бота)
+    extraction_workers: int = 2
+    # Снимки страниц с ошибками и доли успешных для воспроизведения разбора: каталог, предел размера
+    artifacts_dir: str = "browser_artifacts"
+    artifacts_max_mb: float = 200.0
+    artifacts_success_rate: float = 0.02
+    # Интервал обхода и доля интервала, в которую обход должен уложиться
+    sweep_interval_minutes: int = 120
+    sweep_deadline_ratio: float = 0.9
+    # Задачи обхода читаются из БД страницами по `sweep_batch_size` карточек
+    sweep_batch_size: int = 500
+
+
 @dataclass
 class Config:
     bot: BotSettings
     db: DatabaseSettings
     redis: RedisSettings
     log: LoggSettings
+    parser: ParserSettings
 
 @dataclass
 class TestConfig:
@@ -121,11 +203,83 @@ def load_config(path: str | None = None) -> Config | TestConfig:
             format=env("LOG_FORMAT")
         )
 
+        parser_settings = ParserSettings(
+            retry_attempts=env.int("PARSER_RETRY_ATTEMPTS", default=2),
+            retry_backoff_seconds=env.float("PARSER_RETRY_BACKOFF_SECONDS", default=30.0),
+            quarantine_after_failures=env.int("PARSER_QUARANTINE_AFTER_FAILURES", default=3),
+            quarantine_minutes=env.int("PARSER_QUARANTINE_MINUTES", default=240),
+            quarantine_max_minutes=env.int("PARSER_QUARANTINE_MAX_MINUTES", default=2880),
+            breaker_window=env.int("PARSER_BREAKER_WINDOW", default=20),
+            breaker_min_samples=env.int("PARSER_BREAKER_MIN_SAMPLES", default=10),
+            breaker_failure_rate=env.float("PARSER_BREAKER_FAILURE_RATE", default=0.5),
+            breaker_challenge_rate=env.float("PARSER_BREAKER_CHALLENGE_RATE", default=0.3),
+            breaker_open_seconds=env.float("PARSER_BREAKER_OPEN_SECONDS", default=600.0),
+            concurrency_floor=env.dict(
+                "PARSER_CONCURRENCY_FLOOR", subcast_values=int,
+                default={"wildberries": 1, "ozon": 1, "joom": 1, "yandex": 1},
+            ),
+            concurrency_initial=env.dict(
+                "PARSER_CONCURRENCY_INITIAL", subcast_values=int,
+                default={"wildberries": 5, "ozon": 3, "joom": 5, "yandex": 3},
+            ),
+            concurrency_ceiling=env.dict(
+                "PARSER_CONCURRENCY_CEILING", subcast_values=int,
+                default={"wildberries": 10, "ozon": 6, "joom": 10, "yandex": 6},
+            ),
+            latency_target_seconds=env.float("PARSER_LATENCY_TARGET_SECONDS", default=45.0),
+            page_budget_seconds=env.float("PARSER_PAGE_BUDGET_SECONDS", default=90.0),
+            hedge_budget_ratio=env.float("PARSER_HEDGE_BUDGET_RATIO", default=0.05),
+            hedge_min_samples=env.int("PARSER_HEDGE_MIN_SAMPLES", default=20),
+            page_pool_max_uses=env.int("PARSER_PAGE_POOL_MAX_USES", default=50),
+            page_pool_memory_limit_mb=env.float("PARSER_PAGE_POOL_MEMORY_LIMIT_MB", default=512.0),
+            profiles_dir=env("PARSER_PROFILES_DIR", default="browser_profiles"),
+            profile_cache_mb=env.int("PARSER_PROFILE_CACHE_MB", default=256),
+            profile_max_mb=env.int("PARSER_PROFILE_MAX_MB", default=1024),
+            profile_max_age_hours=env.float("PARSER_PROFILE_MAX_AGE_HOURS", default=72.0),
+            contexts_per_marketplace=env.dict(
+                "PARSER_CONTEXTS_PER_MARKETPLACE", subcast_values=int,
+                default={"wildberries": 2, "ozon": 2, "joom": 2, "yandex": 2},
+            ),
+            context_min_health=env.float("PARSER_CONTEXT_MIN_HEALTH", default=0.3),
+            context_max_pages=env.int("PARSER_CONTEXT_MAX_PAGES", default=200),
+            proxies=env.list("PARSER_PROXIES", default=[]),
+            proxy_max_concurrent=env.dict(
+                "PARSER_PROXY_MAX_CONCURRENT", subcast_values=int,
+                default={"wildberries": 4, "ozon": 2, "joom": 4, "yandex": 2},
+            ),
+            proxy_eject_error_rate=env.float("PARSER_PROXY_EJECT_ERROR_RATE", default=0.5),
+            proxy_eject_seconds=env.float("PARSER_PROXY_EJECT_SECONDS", default=900.0),
+            proxy_check_url=env("PARSER_PROXY_CHECK_URL", default="https://www.wildberries.ru/"),
+            host_rate_limits=env.dict(
+                "PARSER_HOST_RATE_LIMITS", subcast_values=float,
+                default={
+                    "wildberries.ru": 2.0, "ozon.ru": 1.0, "joom.ru": 2.0, "joom.com": 2.0, "market.yandex.ru": 1.0,
+                },
+            ),
+            host_rate_default=env.float("PARSER_HOST_RATE_DEFAULT", default=1.0),
+            host_rate_burst=env.float("PARSER_HOST_RATE_BURST", default=5.0),
+            ssr_mode=env.dict(
+                "PARSER_SSR_MODE",
+                default={"wildberries": "auto", "ozon": "auto", "joom": "auto", "yandex": "auto"},
+            ),
+            ssr_min_samples=env.int("PARSER_SSR_MIN_SAMPLES", default=10),
+            ssr_enable_rate=env.float("PARSER_SSR_ENABLE_RATE", default=0.8),
+            ssr_probe_every=env.int("PARSER_SSR_PROBE_EVERY", default=20),
+            extraction_workers=env.int("PARSER_EXTRACTION_WORKERS", default=2),
+            artifacts_dir=env("PARSER_ARTIFACTS_DIR", default="browser_artifacts"),
+            artifacts_max_mb=env.float("PARSER_ARTIFACTS_MAX_MB", default=200.0),
+            artifacts_success_rate=env.float("PARSER_ARTIFACTS_SUCCESS_RATE", default=0.02),
+            sweep_interval_minutes=env.int("PARSER_SWEEP_INTERVAL_MINUTES", default=120),
+            sweep_deadline_ratio=env.float("PARSER_SWEEP_DEADLINE_RATIO", default=0.9),
+            sweep_batch_size=env.int("PARSER_SWEEP_BATCH_SIZE", default=500),
+        )
+
         logger.info("Configuration loaded successfully")
 
         return Config(
             bot=BotSettings(token=token, admin_ids=admin_ids),
             db=db,
             redis=redis,
-            log=logg_settings
+            log=logg_settings,
+            parser=parser_settings,
         )
\ No newline at end of file
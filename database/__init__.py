@@ -1,12 +1,14 @@
 from . import activity_table
 from . import users_table
 from . import products_table   
+from . import price_history_table
 from . import join_query
 
 class DBInterface:
     users = users_table
     activity = activity_table
     products = products_table
+    price_history = price_history_table
     join_query = join_query
 
 db = DBInterface()
\ No newline at end of file
@@ -15,11 +15,11 @@ async def get_user_role_and_active_products_count(
             """
             SELECT
                 u.role,
-                COUNT(p.product_id) AS products_count
+                COUNT(s.product_id) AS products_count
             FROM
                 users u
             LEFT JOIN
-                products p ON u.telegram_id = p.user_id AND p.is_active = TRUE
+                subscriptions s ON u.telegram_id = s.user_id AND s.is_active = TRUE
             WHERE
                 u.telegram_id = $1
             GROUP BY
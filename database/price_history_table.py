@@ -0,0 +1,133 @@
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from asyncpg import Connection
+
+logger = logging.getLogger(__name__)
+
+# История цен карточек: точка пишется только при смене цены, таблица разбита на месячные секции.
+# Дневную свёртку `price_history_daily` для отчётов ведёт триггер на вставку точек
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def partition_name(month: date) -> str:
+    return f"price_history_{month:%Y_%m}"
+
+
+async def ensure_price_history_partitions(
+    conn: Connection,
+    *,
+    months: int = 2,
+    today: Optional[date] = None,
+) -> List[str]:
+    """
+    Создаёт недостающие месячные секции `price_history`, начиная с текущего месяца.
+    Существующие секции не трогаются, поэтому родительская таблица блокируется только при создании новой.
+    Возвращает имена созданных секций.
+    """
+    month = month_start(today or datetime.now(timezone.utc).date())
+    created = []
+    for _ in range(months):
+        name = partition_name(month)
+        if await conn.fetchval("SELECT to_regclass($1);", name) is None:
+            await conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF price_history "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00+00') TO ('{next_month(month):%Y-%m-%d} 00:00+00');"
+            )
+            created.append(name)
+        month = next_month(month)
+    if created:
+        logger.info("Price history partitions created: %s", ", ".join(created))
+    return created
+
+
+async def add_price_points(
+    conn: Connection,
+    *,
+    points: List[Tuple[int, int]],
+) -> None:
+    """
+    Записывает точки (listing_id, price) одной командой COPY; время точки — момент записи.
+    Секции на текущий и следующий месяц создаются заранее: миграцией и в начале каждого обхода.
+    """
+    if not points:
+        return
+    await conn.copy_records_to_table("price_history", records=points, columns=["listing_id", "price"])
+    logger.info("Price history points added: %d", len(points))
+
+
+async def get_price_series(
+    conn: Connection,
+    *,
+    listing_id: int,
+    since: datetime,
+    bucket: timedelta = timedelta(days=1),
+) -> List[Tuple[datetime, int, int, int]]:
+    """
+    Прореженная история цены карточки с `since`: по интервалам `bucket`
+    (начало интервала, минимальная, максимальная и последняя цена).
+    """
+    rows = await conn.fetch(
+        """
+        SELECT date_bin($3, recorded_at, $2) AS bucket,
+               MIN(price) AS min_price,
+               MAX(price) AS max_price,
+               (array_agg(price ORDER BY recorded_at DESC))[1] AS last_price
+        FROM price_history
+        WHERE listing_id = $1 AND recorded_at >= $2
+        GROUP BY bucket
+        ORDER BY bucket;
+        """,
+        listing_id, since, bucket,
+    )
+    logger.info("Got %d price buckets for listing_id=%d", len(rows), listing_id)
+    return [(r["bucket"], r["min_price"], r["max_price"], r["last_price"]) for r in rows]
+
+
+async def get_user_price_trends(
+    conn: Connection,
+    *,
+    user_id: int,
+    days: int = 30,
+) -> Dict[int, Tuple[int, int, int, int, int]]:
+    """
+    Тренд цены товаров пользователя за `days` последних дней (по UTC) одним запросом:
+    {product_id: (первая цена, последняя цена, минимум, максимум, число изменений)}.
+    Читается только дневная свёртка `price_history_daily`, сырые точки не сканируются.
+    Первая цена — действовавшая в начале периода, то есть последняя цена дня до него, если он есть.
+    Товары без изменений цены за период в результат не попадают.
+    """
+    rows = await conn.fetch(
+        """
+        SELECT s.product_id,
+               COALESCE(prev.last_price, (array_agg(d.first_price ORDER BY d.day))[1]) AS first_price,
+               (array_agg(d.last_price ORDER BY d.day DESC))[1] AS last_price,
+               LEAST(MIN(d.min_price), prev.last_price) AS min_price,
+               GREATEST(MAX(d.max_price), prev.last_price) AS max_price,
+               SUM(d.changes) AS changes
+        FROM subscriptions s
+        JOIN price_history_daily d ON d.listing_id = s.listing_id
+        LEFT JOIN LATERAL (
+            SELECT p.last_price
+            FROM price_history_daily p
+            WHERE p.listing_id = s.listing_id AND p.day < (now() AT TIME ZONE 'UTC')::date - $2::int
+            ORDER BY p.day DESC
+            LIMIT 1
+        ) prev ON TRUE
+        WHERE s.user_id = $1 AND d.day >= (now() AT TIME ZONE 'UTC')::date - $2::int
+        GROUP BY s.product_id, prev.last_price;
+        """,
+        user_id, days,
+    )
+    logger.info("Got price trends for %d products of user_id=%d", len(rows), user_id)
+    return {
+        r["product_id"]: (r["first_price"], r["last_price"], r["min_price"], r["max_price"], r["changes"])
+        for r in rows
+    }
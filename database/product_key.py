@@ -0,0 +1,39 @@
+import re
+from urllib.parse import urlsplit
+
+# Идентификатор товара в адресе карточки; ссылки с разными slug, параметрами
+# и поддоменами на один товар дают один ключ
+PRODUCT_KEY_PATTERNS = {
+    "wildberries": [re.compile(r"/catalog/(\d+)")],
+    "ozon": [re.compile(r"/product/(?:[^/?#]*-)?(\d+)(?:[/?#]|$)")],
+    "yandex": [
+        re.compile(r"/product(?:--[^/?#]*)?/(\d+)"),
+        re.compile(r"/(card)/[^/?#]+/(\d+)"),
+    ],
+    "joom": [re.compile(r"/products/([0-9a-fA-F]{24})")],
+}
+HOST_PREFIXES = ("www.", "m.")
+
+
+def normalize_url(url: str) -> str:
+    """
+    Адрес без схемы, параметров и якоря, с хостом в нижнем регистре и без `www.`/`m.`.
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    return f"{host}{parts.path.rstrip('/')}"
+
+
+def canonical_product_key(marketplace: str, url: str) -> str:
+    """
+    Ключ товара маркетплейса: идентификатор из адреса карточки, а если его нет —
+    нормализованный адрес. Вместе с маркетплейсом однозначно задаёт запись в `listings`.
+    """
+    for pattern in PRODUCT_KEY_PATTERNS.get(marketplace, ()):
+        match = pattern.search(url)
+        if match:
+            return "/".join(group.lower() for group in match.groups())
+    return normalize_url(url)
@@ -1,9 +1,17 @@
 import logging
+from datetime import datetime
 from typing import List, Optional, Tuple
 from asyncpg import Connection
 
+from enums.parse_records import ListingWriteBatch, SweepListing
+from .product_key import canonical_product_key
+
 logger = logging.getLogger(__name__)
 
+# Товар пользователя — подписка (`subscriptions`, её product_id) на карточку маркетплейса (`listings`).
+# Цена, название и состояние проверки хранятся в карточке один раз, сколько бы пользователей её ни отслеживали.
+# Часто меняющиеся поля карточки лежат в `listing_state`, запросы чтения берут карточку целиком из `listing_details`.
+
 
 async def add_product(
     conn: Connection,
@@ -13,12 +21,26 @@ async def add_product(
     product_url: str,
     target_price: int,
 ) -> None:
+    # Повторно добавленная карточка, отмеченная как отсутствующая, снова попадает в обход
     await conn.execute(
         """
-        INSERT INTO products (user_id, marketplace, product_url, target_price)
-        VALUES ($1, $2, $3, $4);
+        WITH listing AS (
+            INSERT INTO listings (marketplace, product_key, product_url)
+            VALUES ($2, $5, $3)
+            ON CONFLICT (marketplace, product_key) DO UPDATE
+            SET updated_at = now()
+            RETURNING listing_id
+        ), state AS (
+            INSERT INTO listing_state (listing_id, marketplace)
+            SELECT listing_id, $2 FROM listing
+            ON CONFLICT (listing_id) DO UPDATE
+            SET last_error = NULL
+            WHERE listing_state.last_error IS NOT NULL
+        )
+        INSERT INTO subscriptions (user_id, listing_id, target_price)
+        SELECT $1, listing_id, $4 FROM listing;
         """,
-        user_id, marketplace, product_url, target_price,
+        user_id, marketplace, product_url, target_price, canonical_product_key(marketplace, product_url),
     )
     logger.info(
         "Product added: user_id=%d, marketplace=%s, url=%s, target_price=%d",
@@ -33,16 +55,17 @@ async def get_user_active_products(
 ) -> List[Tuple[int, Optional[str], str, int]]:
     rows = await conn.fetch(
         """
-        SELECT product_id, product_name, product_url, target_price, marketplace
-        FROM products
-        WHERE user_id = $1 AND is_active = TRUE AND (last_error IS NULL OR last_error = '')
-        ORDER BY marketplace;
+        SELECT s.product_id, l.product_name, l.product_url, s.target_price, l.marketplace
+        FROM subscriptions s
+        JOIN listing_details l ON l.listing_id = s.listing_id
+        WHERE s.user_id = $1 AND s.is_active = TRUE AND (l.last_error IS NULL OR l.last_error = '')
+        ORDER BY l.marketplace;
         """,
         user_id,
     )
     logger.info("Got %d active products", len(rows))
     return [
-        (r["product_id"], r["product_name"], r["product_url"], r["target_price"], r["marketplace"]) 
+        (r["product_id"], r["product_name"], r["product_url"], r["target_price"], r["marketplace"])
         for r in rows
     ]
 
@@ -53,19 +76,20 @@ async def get_user_inactive_products(
 ) -> List[Tuple[int, Optional[str], str]]:
     rows = await conn.fetch(
         """
-        SELECT product_id, product_name, product_url, target_price, marketplace
-        FROM products
-        WHERE user_id = $1 AND is_active = FALSE OR last_error IS NOT NULL
-        ORDER BY marketplace;
+        SELECT s.product_id, l.product_name, l.product_url, s.target_price, l.marketplace
+        FROM subscriptions s
+        JOIN listing_details l ON l.listing_id = s.listing_id
+        WHERE s.user_id = $1 AND (s.is_active = FALSE OR l.last_error IS NOT NULL)
+        ORDER BY l.marketplace;
         """,
         user_id,
     )
     logger.info("Got %d inactive products", len(rows))
     return [
-        (r["product_id"], r["product_name"], r["product_url"], r["target_price"], r["marketplace"]) 
+        (r["product_id"], r["product_name"], r["product_url"], r["target_price"], r["marketplace"])
         for r in rows
     ]
-    
+
 async def get_user_inactive_products_to_turn_on_after_block_bot(
     conn: Connection,
     *,
@@ -73,18 +97,20 @@ async def get_user_inactive_products_to_turn_on_after_block_bot(
 ) -> List[Tuple[int, Optional[str], str]]:
     rows = await conn.fetch(
         """
-        SELECT product_id
-        FROM products
-        WHERE user_id = $1 AND is_active = FALSE AND last_error IS NULL
+        SELECT s.product_id
+        FROM subscriptions s
+        JOIN listing_details l ON l.listing_id = s.listing_id
+        WHERE s.user_id = $1 AND s.is_active = FALSE AND l.last_error IS NULL
+        ORDER BY s.product_id;
         """,
         user_id,
     )
     logger.info("Got %d inactive products after block bot", len(rows))
     return [
-        (r["product_id"]) 
+        (r["product_id"])
         for r in rows
     ]
-    
+
 async def get_product_by_id_and_user(
     conn: Connection,
     *,
@@ -93,9 +119,10 @@ async def get_product_by_id_and_user(
 ) -> Optional[Tuple[Optional[str], str]]:
     row = await conn.fetchrow(
         """
-        SELECT product_name, product_url
-        FROM products
-        WHERE product_id = $1 AND user_id = $2;
+        SELECT l.product_name, l.product_url
+        FROM subscriptions s
+        JOIN listings l ON l.listing_id = s.listing_id
+        WHERE s.product_id = $1 AND s.user_id = $2;
         """,
         product_id, user_id,
     )
@@ -110,9 +137,18 @@ async def delete_product_by_id(
     *,
     product_id: int,
 ) -> None:
+    # Карточка без подписчиков удаляется вместе с последней подпиской
     await conn.execute(
         """
-        DELETE FROM products WHERE product_id = $1;
+        WITH deleted AS (
+            DELETE FROM subscriptions WHERE product_id = $1 RETURNING listing_id
+        )
+        DELETE FROM listings l
+        USING deleted d
+        WHERE l.listing_id = d.listing_id
+            AND NOT EXISTS (
+                SELECT 1 FROM subscriptions s WHERE s.listing_id = d.listing_id AND s.product_id <> $1
+            );
         """,
         product_id,
     )
@@ -126,10 +162,12 @@ async def get_user_products_with_details(
 ) -> List[Tuple[int, Optional[str], str, int, int, int, str, str]]:
     rows = await conn.fetch(
         """
-        SELECT product_id, product_name, product_url, target_price, current_price, min_price, marketplace, last_error, last_checked
-        FROM products
-        WHERE user_id = $1
-        ORDER BY last_error DESC, marketplace;
+        SELECT s.product_id, l.product_name, l.product_url, s.target_price, l.current_price, l.min_price,
+               l.marketplace, l.last_error, l.last_checked
+        FROM subscriptions s
+        JOIN listing_details l ON l.listing_id = s.listing_id
+        WHERE s.user_id = $1
+        ORDER BY l.last_error DESC, l.marketplace;
         """,
         user_id,
     )
@@ -159,8 +197,9 @@ async def change_product_active_status(
 ) -> None:
     await conn.execute(
         """
-        UPDATE products
-        SET is_active = $1
+        UPDATE subscriptions
+        SET is_active = $1,
+            updated_at = now()
         WHERE product_id = $2;
         """,
         is_active, product_id,
@@ -168,55 +207,184 @@ async def change_product_active_status(
     logger.info("Product alive status changed to `%s` for product_id=%d", is_active, product_id)
 
 
-async def get_products_items_for_parsing(
+async def get_products_items_for_parsing_page(
     conn: Connection,
-) -> List[Tuple[int, str, str, int, int]]:
+    *,
+    marketplace: str,
+    after_listing_id: int = 0,
+    limit: int = 500,
+) -> List[SweepListing]:
+    # Страница задач обхода маркетплейса после `after_listing_id` (keyset-пагинация):
+    # каждая страница читается по индексу (marketplace, listing_id), сколько бы карточек ни было в каталоге.
+    # Целевая цена — наибольшая среди активных подписок, то есть та, до которой цена опустится первой
+    rows = await conn.fetch(
+        """
+        SELECT ls.listing_id, l.product_url, ls.marketplace, ls.min_price, s.target_price,
+               ls.current_price, l.product_name, ls.fail_count
+        FROM listing_state ls
+        JOIN listings l ON l.listing_id = ls.listing_id
+        CROSS JOIN LATERAL (
+            SELECT MAX(target_price) AS target_price
+            FROM subscriptions
+            WHERE listing_id = ls.listing_id AND is_active = TRUE
+        ) s
+        WHERE ls.marketplace = $1 AND ls.listing_id > $2
+            AND (ls.last_error IS NULL OR ls.last_error = '')
+            AND (ls.next_check_at IS NULL OR ls.next_check_at <= now())
+            AND s.target_price IS NOT NULL
+        ORDER BY ls.listing_id
+        LIMIT $3;
+        """,
+        marketplace, after_listing_id, limit,
+    )
+    logger.info("Got %d %s listings for parsing after listing_id=%d", len(rows), marketplace, after_listing_id)
+    return [SweepListing(**r) for r in rows]
+
+
+async def count_products_items_for_parsing(conn: Connection) -> dict[str, int]:
+    # Число задач обхода по маркетплейсам — для планирования без загрузки самих задач
     rows = await conn.fetch(
         """
-        SELECT user_id, product_id, product_url, marketplace, min_price, target_price
-        FROM products
-        WHERE is_active = TRUE AND (last_error IS NULL OR last_error = '');
+        SELECT ls.marketplace, COUNT(*) AS tasks_count
+        FROM listing_state ls
+        WHERE (ls.last_error IS NULL OR ls.last_error = '')
+            AND (ls.next_check_at IS NULL OR ls.next_check_at <= now())
+            AND EXISTS (
+                SELECT 1 FROM subscriptions s WHERE s.listing_id = ls.listing_id AND s.is_active = TRUE
+            )
+        GROUP BY ls.marketplace;
         """
     )
-    logger.info("Got %d products for parsing", len(rows))
-    return [(r["user_id"], r["product_id"], r["product_url"], r["marketplace"], r["min_price"], r["target_price"]) for r in rows]
+    logger.info("Counted listings for parsing in %d marketplaces", len(rows))
+    return {r["marketplace"]: r["tasks_count"] for r in rows}
 
 
-async def change_product_details_after_parsing(
+async def change_listings_details_after_parsing(
     conn: Connection,
     *,
-    product_id: int,
-    current_price: int,
-    product_name: Optional[str],
-    min_price: int,
-    last_error: str,
-    is_active: bool,
+    batch: ListingWriteBatch,
+) -> List[int]:
+    # Пачка результатов обхода одним запросом: столбцы пачки передаются массивами и разворачиваются unnest.
+    # Возвращает listing_id карточек, цена которых изменилась
+    if not batch:
+        return []
+    rows = await conn.fetch(
+        """
+        WITH batch AS (
+            SELECT *
+            FROM unnest($1::bigint[], $2::int[], $3::text[], $4::int[], $5::text[])
+                AS b(listing_id, current_price, product_name, min_price, last_error)
+        ), name AS (
+            UPDATE listings l
+            SET product_name = b.product_name,
+                updated_at = now()
+            FROM batch b
+            WHERE l.listing_id = b.listing_id AND l.product_name IS DISTINCT FROM b.product_name
+        )
+        UPDATE listing_state ls
+        SET current_price = b.current_price,
+            min_price = b.min_price,
+            last_checked = now(),
+            last_error = b.last_error,
+            fail_count = 0,
+            next_check_at = NULL
+        FROM batch b, listing_state old
+        WHERE ls.listing_id = b.listing_id AND old.listing_id = ls.listing_id
+        RETURNING ls.listing_id, old.current_price IS DISTINCT FROM ls.current_price AS price_changed;
+        """,
+        batch.listing_ids, batch.current_prices, batch.product_names, batch.min_prices, batch.last_errors,
+    )
+    logger.info("Listing details changed for %d listings", len(rows))
+    return [r["listing_id"] for r in rows if r["price_changed"]]
+
+
+async def touch_listings_checked(
+    conn: Connection,
+    *,
+    listing_ids: List[int],
 ) -> None:
+    # Карточки, разобранные с теми же ценой и названием: одним запросом сдвигается только время проверки
+    if not listing_ids:
+        return
     await conn.execute(
         """
-        UPDATE products
-        SET current_price = $1,
-            product_name = $2,
-            min_price = $3,
+        UPDATE listing_state
+        SET last_checked = now()
+        WHERE listing_id = ANY($1::bigint[]);
+        """,
+        listing_ids,
+    )
+    logger.info("Last checked time bumped for %d unchanged listings", len(listing_ids))
+
+
+async def register_listings_parsing_failures(
+    conn: Connection,
+    *,
+    listing_ids: List[int],
+    quarantine_after: int,
+    quarantine_minutes: int,
+    quarantine_max_minutes: int,
+) -> List[Tuple[int, int, Optional[datetime]]]:
+    # Неудачи пачки одним запросом: listing_id передаются массивом и разворачиваются unnest.
+    # Карточка остаётся в обходе; после quarantine_after неудач подряд
+    # следующая проверка откладывается, интервал удваивается с каждой неудачей.
+    # Возвращает (listing_id, fail_count, next_check_at) по каждой найденной карточке
+    if not listing_ids:
+        return []
+    rows = await conn.fetch(
+        """
+        UPDATE listing_state ls
+        SET fail_count = ls.fail_count + 1,
             last_checked = now(),
-            last_error = $4,
-            is_active =  $5,
-            updated_at = now()
-        WHERE product_id = $6;
+            next_check_at = CASE
+                WHEN ls.fail_count + 1 >= $2 THEN now() + make_interval(
+                    mins => LEAST($3 * power(2, ls.fail_count + 1 - $2), $4)::int
+                )
+                ELSE NULL
+            END
+        FROM unnest($1::bigint[]) AS b(listing_id)
+        WHERE ls.listing_id = b.listing_id
+        RETURNING ls.listing_id, ls.fail_count, ls.next_check_at;
         """,
-        current_price, product_name, min_price, last_error, is_active, product_id,
-    )    
-    logger.info("Product details changed for product_id=%d", product_id)
+        listing_ids, quarantine_after, quarantine_minutes, quarantine_max_minutes,
+    )
+    logger.info("Parsing failures registered for %d listings", len(rows))
+    return [(r["listing_id"], r["fail_count"], r["next_check_at"]) for r in rows]
+
+
+async def get_subscribers_to_notify(
+    conn: Connection,
+    *,
+    prices: dict[int, int],
+) -> List[Tuple[int, int, int, int]]:
+    """
+    Активные подписки, чья целевая цена достигнута, по ценам карточек {listing_id: price}
+    одним запросом: (listing_id, user_id, chat_id, target_price).
+    """
+    rows = await conn.fetch(
+        """
+        SELECT s.listing_id, s.user_id, u.chat_id, s.target_price
+        FROM unnest($1::bigint[], $2::int[]) AS p(listing_id, price)
+        JOIN subscriptions s ON s.listing_id = p.listing_id
+        JOIN users u ON u.telegram_id = s.user_id
+        WHERE s.is_active = TRUE AND p.price <= s.target_price
+        ORDER BY s.listing_id, s.product_id;
+        """,
+        list(prices), list(prices.values()),
+    )
+    logger.info("Got %d subscribers to notify for %d listings", len(rows), len(prices))
+    return [(r["listing_id"], r["user_id"], r["chat_id"], r["target_price"]) for r in rows]
 
 
 # Количество активных товаров, сгруппированных по маркетплейсам
 async def get_active_products_by_marketplace(conn: Connection) -> Optional[List[Tuple[str, int]]]:
     rows = await conn.fetch(
         """
-        SELECT marketplace, COUNT(*) AS active_count
-        FROM products
-        WHERE is_active = TRUE AND (last_error IS NULL OR last_error = '')
-        GROUP BY marketplace;
+        SELECT l.marketplace, COUNT(*) AS active_count
+        FROM subscriptions s
+        JOIN listing_details l ON l.listing_id = s.listing_id
+        WHERE s.is_active = TRUE AND (l.last_error IS NULL OR l.last_error = '')
+        GROUP BY l.marketplace;
         """
     )
     logger.info("Active products by marketplace retrieved")
@@ -228,13 +396,14 @@ async def get_active_products_by_marketplace(conn: Connection) -> Optional[List[
 async def get_inactive_products_by_marketplace(conn: Connection) -> Optional[List[Tuple[str, int]]]:
     rows = await conn.fetch(
         """
-        SELECT marketplace, COUNT(*) AS active_count
-        FROM products
-        WHERE last_error IS NOT NULL
-        GROUP BY marketplace;
+        SELECT ls.marketplace, COUNT(*) AS active_count
+        FROM listing_state ls
+        JOIN subscriptions s ON s.listing_id = ls.listing_id
+        WHERE ls.last_error IS NOT NULL
+        GROUP BY ls.marketplace;
         """
     )
     logger.info("Active products by marketplace retrieved")
     if rows:
         return [(row["marketplace"], row["active_count"]) for row in rows]
-    return None
\ No newline at end of file
+    return None
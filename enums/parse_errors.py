@@ -0,0 +1,17 @@
+from enum import Enum
+
+
+class ParseError(str, Enum):
+    """
+    Типы ошибок парсинга. Значение сохраняется в `listings.last_error`
+    и показывается пользователю в /summary.
+    """
+    TIMEOUT = "Маркетплейс не ответил вовремя"
+    BLOCKED = "Маркетплейс ограничил доступ"
+    NOT_FOUND = "Товар не найден"
+    PARSE_FAILED = "Цена не найдена"
+
+    @property
+    def is_transient(self) -> bool:
+        # Только подтверждённое отсутствие товара считается постоянной ошибкой
+        return self is not ParseError.NOT_FOUND
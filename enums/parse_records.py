@@ -0,0 +1,91 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from enums.parse_errors import ParseError
+
+
+@dataclass(slots=True)
+class ParseTask:
+    """
+    Задача парсинга одной карточки. В задачах обхода user_id — None, а product_id — listing_id:
+    подписчики выбираются уже после парсинга.
+    """
+    user_id: Optional[int]
+    product_id: int
+    url: str
+    min_price: Optional[int]
+    target_price: Optional[int]
+
+
+@dataclass(slots=True)
+class ParseResult:
+    """
+    Результат парсинга задачи: цена и название, пересчитанная минимальная цена
+    или ошибка, из-за которой цену получить не удалось.
+    `source` — чем найдена цена: `selector` — селекторами живой страницы,
+    иначе правило `Extraction.source` (`dom` или `structured`).
+    """
+    user_id: Optional[int]
+    product_id: int
+    price: Optional[int]
+    product_name: Optional[str]
+    min_price: Optional[int]
+    last_error: Optional[ParseError]
+    target_price: Optional[int]
+    url: str
+    source: Optional[str] = None
+
+
+@dataclass(slots=True)
+class SweepListing:
+    """
+    Карточка, прочитанная для обхода: задача парсинга и значения карточки до обхода.
+    Целевая цена — наибольшая среди активных подписок.
+    """
+    listing_id: int
+    product_url: str
+    marketplace: str
+    min_price: Optional[int]
+    target_price: int
+    current_price: Optional[int]
+    product_name: Optional[str]
+    fail_count: int
+
+    def task(self) -> ParseTask:
+        # Вместо user_id None: подписчики выбираются после парсинга
+        return ParseTask(None, self.listing_id, self.product_url, self.min_price, self.target_price)
+
+    def is_unchanged_by(self, result: ParseResult) -> bool:
+        """
+        Успешный результат совпадает с карточкой и переписывать её не нужно.
+        """
+        return (
+            result.last_error is None
+            and self.fail_count == 0
+            and self.current_price == result.price
+            and self.min_price == result.min_price
+            and self.product_name == (result.product_name or None)
+        )
+
+
+@dataclass(slots=True)
+class ListingWriteBatch:
+    """
+    Результаты обхода по столбцам: пачка записывается в `listing_state` одним запросом,
+    каждый список передаётся в БД массивом.
+    """
+    listing_ids: List[int] = field(default_factory=list)
+    current_prices: List[Optional[int]] = field(default_factory=list)
+    product_names: List[Optional[str]] = field(default_factory=list)
+    min_prices: List[Optional[int]] = field(default_factory=list)
+    last_errors: List[Optional[str]] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.listing_ids)
+
+    def append(self, result: ParseResult) -> None:
+        self.listing_ids.append(result.product_id)
+        self.current_prices.append(result.price)
+        self.product_names.append(result.product_name or None)
+        self.min_prices.append(result.min_price)
+        self.last_errors.append(result.last_error.value if result.last_error else None)
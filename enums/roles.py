@@ -7,7 +7,7 @@ class UserRole(str, Enum):
     USER = "user"
     ADMIN = "admin"
     
-@dataclass
+@dataclass(slots=True)
 class UserRow:
     id: int
     telegram_id: int
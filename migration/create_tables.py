@@ -6,6 +6,8 @@ import logging
 import asyncpg
 from asyncpg.exceptions import PostgresError
 from config.config import Config, load_config
+from migration.migrator import migrate
+from migration.versions import MIGRATIONS
 
 config: Config = load_config()
 
@@ -31,59 +33,11 @@ async def main():
             host=config.db.host,
             port=config.db.port,
         )
-        async with connection.transaction():
-            # Таблица пользователей
-            await connection.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id BIGSERIAL PRIMARY KEY,
-                    telegram_id BIGINT UNIQUE NOT NULL,
-                    chat_id BIGINT UNIQUE NOT NULL,
-                    username VARCHAR(64),
-                    language VARCHAR(8),
-                    role VARCHAR(16) DEFAULT 'user',
-                    is_alive BOOLEAN DEFAULT TRUE,
-                    banned BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMPTZ DEFAULT now(),
-                    updated_at TIMESTAMPTZ DEFAULT now()
-                );
-            """)
-
-
-            # Таблица активности
-            await connection.execute("""
-                CREATE TABLE IF NOT EXISTS activity (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL REFERENCES users(telegram_id) ON DELETE CASCADE,
-                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-                    activity_date DATE NOT NULL DEFAULT CURRENT_DATE,
-                    actions INT NOT NULL DEFAULT 1
-                );
-                CREATE UNIQUE INDEX IF NOT EXISTS idx_activity_user_day
-                ON activity (user_id, activity_date);
-            """)
-
-            # Таблица товаров
-            await connection.execute("""
-                CREATE TABLE IF NOT EXISTS products (
-                    product_id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL REFERENCES users(telegram_id) ON DELETE CASCADE,
-                    marketplace VARCHAR(32) NOT NULL,
-                    product_name VARCHAR(255),
-                    product_url TEXT NOT NULL,
-                    target_price INTEGER NOT NULL CHECK (target_price > 0),
-                    current_price INTEGER,
-                    min_price INTEGER,
-                    is_active BOOLEAN DEFAULT TRUE,
-                    last_checked TIMESTAMPTZ,
-                    last_error TEXT,
-                    created_at TIMESTAMPTZ DEFAULT now(),
-                    updated_at TIMESTAMPTZ DEFAULT now()
-                );
-            """)
-            
-
-            logger.info("Tables `users`, `activity`, and `products` were successfully created")
-
+        applied = await migrate(connection, MIGRATIONS)
+        if applied:
+            logger.info("Applied migrations: %s", ", ".join(map(str, applied)))
+        else:
+            logger.info("Database schema is up to date")
     except PostgresError as db_error:
         logger.exception("Database-specific error: %s", db_error)
     except Exception as e:
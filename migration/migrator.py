@@ -0,0 +1,99 @@
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable, Optional
+
+from asyncpg import Connection
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки: две копии миграций не выполняются одновременно
+MIGRATIONS_LOCK_KEY = 7_341_029_001
+
+
+@dataclass(frozen=True)
+class Migration:
+    """
+    Версия схемы. Каждая миграция идемпотентна (IF NOT EXISTS), поэтому повторный
+    запуск после сбоя безопасен. Миграции с `CREATE INDEX CONCURRENTLY` не могут идти
+    в транзакции: они помечаются `transactional=False` и выполняются по одному запросу.
+    """
+    version: int
+    name: str
+    upgrade: Callable[[Connection], Awaitable[None]]
+    transactional: bool = True
+
+
+async def applied_versions(conn: Connection) -> set[int]:
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        """
+    )
+    rows = await conn.fetch("SELECT version FROM schema_migrations;")
+    return {row["version"] for row in rows}
+
+
+async def migrate(
+    conn: Connection,
+    migrations: Iterable[Migration],
+    *,
+    target: Optional[int] = None,
+) -> list[int]:
+    """
+    Применяет ещё не применённые миграции по возрастанию версии (до `target` включительно)
+    и возвращает их версии.
+    """
+    migrations = sorted(migrations, key=lambda migration: migration.version)
+    versions = [migration.version for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise ValueError(f"Duplicate migration versions: {versions}")
+
+    await conn.execute("SELECT pg_advisory_lock($1);", MIGRATIONS_LOCK_KEY)
+    try:
+        done = await applied_versions(conn)
+        applied = []
+        for migration in migrations:
+            if migration.version in done or (target is not None and migration.version > target):
+                continue
+            logger.info("Applying migration %04d_%s", migration.version, migration.name)
+            if migration.transactional:
+                async with conn.transaction():
+                    await migration.upgrade(conn)
+                    await record_migration(conn, migration)
+            else:
+                await migration.upgrade(conn)
+                await record_migration(conn, migration)
+            applied.append(migration.version)
+        return applied
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1);", MIGRATIONS_LOCK_KEY)
+
+
+async def record_migration(conn: Connection, migration: Migration) -> None:
+    await conn.execute(
+        "INSERT INTO schema_migrations (version, name) VALUES ($1, $2) ON CONFLICT (version) DO NOTHING;",
+        migration.version, migration.name,
+    )
+
+
+async def create_index_concurrently(conn: Connection, name: str, definition: str) -> None:
+    """
+    Строит индекс без блокировки записи в таблицу. Прерванный `CONCURRENTLY` оставляет
+    невалидный индекс, который `IF NOT EXISTS` счёл бы готовым, поэтому он сначала удаляется.
+    """
+    invalid = await conn.fetchval(
+        """
+        SELECT NOT i.indisvalid
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = $1 AND pg_table_is_visible(c.oid);
+        """,
+        name,
+    )
+    if invalid:
+        logger.warning("Dropping invalid index %s left by an interrupted build", name)
+        await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name};")
+    await conn.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition};")
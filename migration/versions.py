@@ -0,0 +1,354 @@
+from datetime import datetime, timezone
+
+from asyncpg import Connection
+
+from database.price_history_table import ensure_price_history_partitions
+from database.product_key import canonical_product_key
+from migration.migrator import Migration, create_index_concurrently
+
+
+async def initial_schema(conn: Connection) -> None:
+    # Таблица пользователей
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id BIGSERIAL PRIMARY KEY,
+            telegram_id BIGINT UNIQUE NOT NULL,
+            chat_id BIGINT UNIQUE NOT NULL,
+            username VARCHAR(64),
+            language VARCHAR(8),
+            role VARCHAR(16) DEFAULT 'user',
+            is_alive BOOLEAN DEFAULT TRUE,
+            banned BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMPTZ DEFAULT now(),
+            updated_at TIMESTAMPTZ DEFAULT now()
+        );
+    """)
+
+    # Таблица активности
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS activity (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL REFERENCES users(telegram_id) ON DELETE CASCADE,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            activity_date DATE NOT NULL DEFAULT CURRENT_DATE,
+            actions INT NOT NULL DEFAULT 1
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_activity_user_day
+        ON activity (user_id, activity_date);
+    """)
+
+    # Таблица товаров
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS products (
+            product_id SERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL REFERENCES users(telegram_id) ON DELETE CASCADE,
+            marketplace VARCHAR(32) NOT NULL,
+            product_name VARCHAR(255),
+            product_url TEXT NOT NULL,
+            target_price INTEGER NOT NULL CHECK (target_price > 0),
+            current_price INTEGER,
+            min_price INTEGER,
+            is_active BOOLEAN DEFAULT TRUE,
+            last_checked TIMESTAMPTZ,
+            last_error TEXT,
+            fail_count INTEGER NOT NULL DEFAULT 0,
+            next_check_at TIMESTAMPTZ,
+            created_at TIMESTAMPTZ DEFAULT now(),
+            updated_at TIMESTAMPTZ DEFAULT now()
+        );
+    """)
+
+    # Счётчик неудач и карантин для таблиц, созданных до их появления
+    await conn.execute("""
+        ALTER TABLE products ADD COLUMN IF NOT EXISTS fail_count INTEGER NOT NULL DEFAULT 0;
+        ALTER TABLE products ADD COLUMN IF NOT EXISTS next_check_at TIMESTAMPTZ;
+    """)
+
+
+async def hot_query_indexes(conn: Connection) -> None:
+    # Товары пользователя (списки, /remove, счётчик в join_query) и каскадное удаление по user_id
+    await create_index_concurrently(conn, "idx_products_user_marketplace", "products (user_id, marketplace)")
+    # Задачи обхода: только активные товары без ошибки, в порядке product_id
+    await create_index_concurrently(
+        conn,
+        "idx_products_sweep",
+        "products (product_id) WHERE is_active = TRUE AND (last_error IS NULL OR last_error = '')",
+    )
+    # Сводка по товарам с ошибкой в /summary
+    await create_index_concurrently(
+        conn, "idx_products_failed_marketplace", "products (marketplace) WHERE last_error IS NOT NULL",
+    )
+    # Бан и проверка бана по username
+    await create_index_concurrently(conn, "idx_users_username", "users (username)")
+    # Активные за день: подсчёт DISTINCT user_id только по индексу
+    await create_index_concurrently(conn, "idx_activity_date_user", "activity (activity_date, user_id)")
+    await conn.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_activity_date;")
+    await conn.execute("ANALYZE products; ANALYZE users; ANALYZE activity;")
+
+
+async def listings_and_subscriptions(conn: Connection) -> None:
+    # Карточка маркетплейса: цена, название и состояние проверки, по одной на товар
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS listings (
+            listing_id BIGSERIAL PRIMARY KEY,
+            marketplace VARCHAR(32) NOT NULL,
+            product_key TEXT NOT NULL,
+            product_url TEXT NOT NULL,
+            product_name VARCHAR(255),
+            current_price INTEGER,
+            min_price INTEGER,
+            last_checked TIMESTAMPTZ,
+            last_error TEXT,
+            fail_count INTEGER NOT NULL DEFAULT 0,
+            next_check_at TIMESTAMPTZ,
+            created_at TIMESTAMPTZ DEFAULT now(),
+            updated_at TIMESTAMPTZ DEFAULT now(),
+            UNIQUE (marketplace, product_key)
+        );
+        CREATE INDEX IF NOT EXISTS idx_listings_sweep
+        ON listings (listing_id) WHERE last_error IS NULL OR last_error = '';
+        CREATE INDEX IF NOT EXISTS idx_listings_failed_marketplace
+        ON listings (marketplace) WHERE last_error IS NOT NULL;
+    """)
+
+    # Подписка пользователя на карточку; product_id сохраняет номера товаров из `products`
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            product_id BIGSERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL REFERENCES users(telegram_id) ON DELETE CASCADE,
+            listing_id BIGINT NOT NULL REFERENCES listings(listing_id) ON DELETE CASCADE,
+            target_price INTEGER NOT NULL CHECK (target_price > 0),
+            is_active BOOLEAN NOT NULL DEFAULT TRUE,
+            created_at TIMESTAMPTZ DEFAULT now(),
+            updated_at TIMESTAMPTZ DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS idx_subscriptions_user ON subscriptions (user_id);
+        CREATE INDEX IF NOT EXISTS idx_subscriptions_listing ON subscriptions (listing_id);
+    """)
+
+    if await conn.fetchval("SELECT to_regclass('products');") is None:
+        return
+
+    # Строки `products` с одним ключом товара сливаются в карточку: состояние берётся
+    # из самой свежей проверки, минимальная цена — наименьшая из всех
+    listings: dict[tuple[str, str], dict] = {}
+    subscriptions = []
+    never = datetime.min.replace(tzinfo=timezone.utc)
+    for row in await conn.fetch("SELECT * FROM products ORDER BY product_id;"):
+        key = (row["marketplace"], canonical_product_key(row["marketplace"], row["product_url"]))
+        listing = listings.setdefault(key, {
+            "listing_id": len(listings) + 1,
+            "product_url": row["product_url"],
+            "min_price": None,
+            "created_at": row["created_at"],
+            "checked": row,
+        })
+        prices = [price for price in (listing["min_price"], row["min_price"]) if price is not None]
+        listing["min_price"] = min(prices, default=None)
+        if (row["last_checked"] or never) >= (listing["checked"]["last_checked"] or never):
+            listing["checked"] = row
+        # Товар, отключённый без ошибки (пользователь заблокировал бота), — неактивная подписка
+        is_active = row["is_active"] is not False or row["last_error"] is not None
+        subscriptions.append((
+            row["product_id"], row["user_id"], listing["listing_id"], row["target_price"], is_active,
+            row["created_at"], row["updated_at"],
+        ))
+
+    await conn.copy_records_to_table(
+        "listings",
+        records=[
+            (
+                listing["listing_id"], marketplace, product_key, listing["product_url"],
+                listing["checked"]["product_name"], listing["checked"]["current_price"], listing["min_price"],
+                listing["checked"]["last_checked"], listing["checked"]["last_error"],
+                listing["checked"]["fail_count"], listing["checked"]["next_check_at"],
+                listing["created_at"], listing["checked"]["updated_at"],
+            )
+            for (marketplace, product_key), listing in listings.items()
+        ],
+        columns=[
+            "listing_id", "marketplace", "product_key", "product_url", "product_name", "current_price",
+            "min_price", "last_checked", "last_error", "fail_count", "next_check_at", "created_at", "updated_at",
+        ],
+    )
+    await conn.copy_records_to_table(
+        "subscriptions",
+        records=subscriptions,
+        columns=["product_id", "user_id", "listing_id", "target_price", "is_active", "created_at", "updated_at"],
+    )
+    await conn.execute("""
+        SELECT setval(pg_get_serial_sequence('listings', 'listing_id'), COALESCE(MAX(listing_id), 1), MAX(listing_id) IS NOT NULL)
+        FROM listings;
+        SELECT setval(pg_get_serial_sequence('subscriptions', 'product_id'), COALESCE(MAX(product_id), 1), MAX(product_id) IS NOT NULL)
+        FROM subscriptions;
+    """)
+    # Старая таблица остаётся для сверки и удаляется миграцией drop_products_legacy
+    await conn.execute("ALTER TABLE products RENAME TO products_legacy;")
+
+
+async def listing_state(conn: Connection) -> None:
+    # Часто меняющиеся поля карточки вынесены в узкую таблицу: обход переписывает только её строку.
+    # Свободное место на странице (fillfactor) и отсутствие индексов на цене и времени проверки
+    # позволяют PostgreSQL обновлять строку без новых записей в индексах (HOT).
+    # Неизменный маркетплейс повторён здесь для сводки по ошибкам без чтения `listings`
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS listing_state (
+            listing_id BIGINT PRIMARY KEY REFERENCES listings(listing_id) ON DELETE CASCADE,
+            marketplace VARCHAR(32) NOT NULL,
+            current_price INTEGER,
+            min_price INTEGER,
+            last_checked TIMESTAMPTZ,
+            last_error TEXT,
+            fail_count INTEGER NOT NULL DEFAULT 0,
+            next_check_at TIMESTAMPTZ
+        ) WITH (fillfactor = 70);
+        INSERT INTO listing_state (
+            listing_id, marketplace, current_price, min_price, last_checked, last_error, fail_count, next_check_at
+        )
+        SELECT listing_id, marketplace, current_price, min_price, last_checked, last_error, fail_count, next_check_at
+        FROM listings
+        ON CONFLICT (listing_id) DO NOTHING;
+    """)
+
+    # Индексы по ошибке переезжают вместе с ней; ключи — неизменные listing_id и маркетплейс
+    await conn.execute("""
+        DROP INDEX IF EXISTS idx_listings_sweep;
+        DROP INDEX IF EXISTS idx_listings_failed_marketplace;
+        CREATE INDEX IF NOT EXISTS idx_listing_state_sweep
+        ON listing_state (listing_id) WHERE last_error IS NULL OR last_error = '';
+        CREATE INDEX IF NOT EXISTS idx_listing_state_failed
+        ON listing_state (marketplace) WHERE last_error IS NOT NULL;
+        ALTER TABLE listings
+            DROP COLUMN IF EXISTS current_price,
+            DROP COLUMN IF EXISTS min_price,
+            DROP COLUMN IF EXISTS last_checked,
+            DROP COLUMN IF EXISTS last_error,
+            DROP COLUMN IF EXISTS fail_count,
+            DROP COLUMN IF EXISTS next_check_at;
+    """)
+
+    # Карточка целиком для запросов чтения
+    await conn.execute("""
+        CREATE OR REPLACE VIEW listing_details AS
+        SELECT l.listing_id, l.marketplace, l.product_key, l.product_url, l.product_name,
+               ls.current_price, ls.min_price, ls.last_checked, ls.last_error, ls.fail_count, ls.next_check_at,
+               l.created_at, l.updated_at
+        FROM listings l
+        JOIN listing_state ls ON ls.listing_id = l.listing_id;
+        ANALYZE listings;
+        ANALYZE listing_state;
+    """)
+
+
+async def price_history(conn: Connection) -> None:
+    # Точки пишутся только при смене цены и только дописываются, поэтому время в секции растёт
+    # вместе с физическим порядком строк и BRIN по времени остаётся крошечным.
+    # Секции по месяцам: старую историю можно удалить целой секцией
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS price_history (
+            listing_id BIGINT NOT NULL,
+            price INTEGER NOT NULL,
+            recorded_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        ) PARTITION BY RANGE (recorded_at);
+        CREATE INDEX IF NOT EXISTS idx_price_history_recorded_at
+        ON price_history USING brin (recorded_at);
+        CREATE INDEX IF NOT EXISTS idx_price_history_listing
+        ON price_history (listing_id, recorded_at);
+    """)
+    await ensure_price_history_partitions(conn)
+
+
+async def drop_products_legacy(conn: Connection) -> None:
+    # Товары перенесены в `listings` и `subscriptions`; вместе с таблицей удаляются её индексы
+    await conn.execute("DROP TABLE IF EXISTS products_legacy;")
+
+
+async def listing_state_keyset_index(conn: Connection) -> None:
+    # Страница задач обхода: маркетплейс, listing_id после последнего прочитанного, без ошибки.
+    # Индекс отдаёт строки маркетплейса сразу в порядке listing_id, и LIMIT останавливает чтение.
+    # Обход читается только по маркетплейсам, поэтому индекс по одному listing_id больше не нужен
+    await create_index_concurrently(
+        conn,
+        "idx_listing_state_marketplace_sweep",
+        "listing_state (marketplace, listing_id) WHERE last_error IS NULL OR last_error = ''",
+    )
+    await conn.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_listing_state_sweep;")
+    await conn.execute("ANALYZE listing_state;")
+
+
+async def price_history_listing_fk(conn: Connection) -> None:
+    # История удаляется вместе с карточкой; точки уже удалённых карточек убираются до создания ключа.
+    # Каскад находит точки карточки по idx_price_history_listing в каждой секции
+    await conn.execute("""
+        DELETE FROM price_history h
+        WHERE NOT EXISTS (SELECT 1 FROM listings l WHERE l.listing_id = h.listing_id);
+        ALTER TABLE price_history
+        ADD CONSTRAINT price_history_listing_id_fkey
+        FOREIGN KEY (listing_id) REFERENCES listings (listing_id) ON DELETE CASCADE;
+    """)
+
+
+async def price_history_daily(conn: Connection) -> None:
+    # Дневная свёртка истории для отчётов: тренд за месяц читает по строке на карточку в день,
+    # а не все точки. Свёртку ведёт триггер на уровне команды, поэтому COPY обхода обновляет её
+    # одной вставкой на пачку. Блокировка не даёт обходу дописать точки между заполнением и триггером
+    await conn.execute("""
+        LOCK TABLE price_history IN SHARE ROW EXCLUSIVE MODE;
+        CREATE TABLE IF NOT EXISTS price_history_daily (
+            listing_id BIGINT NOT NULL REFERENCES listings (listing_id) ON DELETE CASCADE,
+            day DATE NOT NULL,
+            first_price INTEGER NOT NULL,
+            last_price INTEGER NOT NULL,
+            min_price INTEGER NOT NULL,
+            max_price INTEGER NOT NULL,
+            changes INTEGER NOT NULL,
+            PRIMARY KEY (listing_id, day)
+        );
+        INSERT INTO price_history_daily (listing_id, day, first_price, last_price, min_price, max_price, changes)
+        SELECT listing_id, (recorded_at AT TIME ZONE 'UTC')::date,
+               (array_agg(price ORDER BY recorded_at))[1],
+               (array_agg(price ORDER BY recorded_at DESC))[1],
+               MIN(price), MAX(price), COUNT(*)
+        FROM price_history
+        GROUP BY 1, 2
+        ON CONFLICT (listing_id, day) DO NOTHING;
+
+        CREATE OR REPLACE FUNCTION price_history_daily_rollup() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO price_history_daily AS d
+                (listing_id, day, first_price, last_price, min_price, max_price, changes)
+            SELECT listing_id, (recorded_at AT TIME ZONE 'UTC')::date,
+                   (array_agg(price ORDER BY recorded_at))[1],
+                   (array_agg(price ORDER BY recorded_at DESC))[1],
+                   MIN(price), MAX(price), COUNT(*)
+            FROM new_points
+            GROUP BY 1, 2
+            ON CONFLICT (listing_id, day) DO UPDATE
+            SET last_price = EXCLUDED.last_price,
+                min_price = LEAST(d.min_price, EXCLUDED.min_price),
+                max_price = GREATEST(d.max_price, EXCLUDED.max_price),
+                changes = d.changes + EXCLUDED.changes;
+            RETURN NULL;
+        END;
+        $$;
+        DROP TRIGGER IF EXISTS price_history_daily_rollup ON price_history;
+        CREATE TRIGGER price_history_daily_rollup
+        AFTER INSERT ON price_history
+        REFERENCING NEW TABLE AS new_points
+        FOR EACH STATEMENT EXECUTE FUNCTION price_history_daily_rollup();
+        ANALYZE price_history_daily;
+    """)
+
+
+MIGRATIONS = (
+    Migration(1, "initial_schema", initial_schema),
+    Migration(2, "hot_query_indexes", hot_query_indexes, transactional=False),
+    Migration(3, "listings_and_subscriptions", listings_and_subscriptions),
+    Migration(4, "listing_state", listing_state),
+    Migration(5, "price_history", price_history),
+    Migration(6, "drop_products_legacy", drop_products_legacy),
+    Migration(7, "listing_state_keyset_index", listing_state_keyset_index, transactional=False),
+    Migration(8, "price_history_listing_fk", price_history_listing_fk),
+    Migration(9, "price_history_daily", price_history_daily),
+)
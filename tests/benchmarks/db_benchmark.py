@@ -0,0 +1,510 @@
+"""
+Бенчмарк запросов к БД на объёме, близком к продакшену.
+
+В таблицы заливаются пользователи, подписки на товары (по `products_per_user` на пользователя,
+по `subscribers_per_listing` на карточку маркетплейса), активность и история цен за `days` дней,
+затем каждая функция из `database/products_table.py`, `price_history_table.py`,
+`users_table.py`, `activity_table.py` и `join_query.py` выполняется `repeat` раз
+в откатываемой транзакции. Запросы, которые функция отправила в Postgres, перехватываются
+логгером asyncpg и повторяются под `EXPLAIN (ANALYZE, BUFFERS)`. Горячий запрос,
+план которого содержит Seq Scan или не использует ожидаемый индекс, считается регрессией:
+
+    python -m tests.benchmarks.db_benchmark --users 200000 --products-per-user 5 --days 120 --out db.json
+
+Скрипт очищает таблицы перед заливкой, поэтому по умолчанию подключается к тестовой БД (`.env.test`);
+схему нужно создать заранее (`python -m migration.create_tables`).
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import re
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import ModuleType
+from typing import Callable, Iterator, Optional
+
+import asyncpg
+
+from config.config import load_config
+from database import activity_table, join_query, price_history_table, products_table, users_table
+from enums.parse_records import ListingWriteBatch
+
+logger = logging.getLogger(__name__)
+
+MODULES = (users_table, activity_table, products_table, price_history_table, join_query)
+MARKETPLACES = ("wildberries", "ozon", "joom", "yandex")
+# Доли маркетплейсов в каталоге неравные: карточки маленького маркетплейса разбросаны среди чужих
+MARKETPLACE_SHARES = ("wildberries",) * 12 + ("ozon",) * 5 + ("yandex",) * 2 + ("joom",)
+SPACES_RE = re.compile(r"\s+")
+
+
+@dataclass(frozen=True)
+class Scale:
+    users: int = 200_000
+    products_per_user: int = 5
+    days: int = 120
+    # Пользователь заходит в среднем раз в `active_every` дней
+    active_every: int = 10
+    # Одну карточку маркетплейса отслеживают в среднем `subscribers_per_listing` пользователей
+    subscribers_per_listing: int = 5
+    # Смен цены карточки за `days` дней
+    price_changes: int = 6
+
+    @property
+    def products(self) -> int:
+        return self.users * self.products_per_user
+
+    @property
+    def listings(self) -> int:
+        return max(self.products // self.subscribers_per_listing, 1)
+
+
+@dataclass(frozen=True)
+class Sample:
+    """
+    Ключи существующих строк, на которых выполняются функции.
+    """
+    user_id: int
+    username: str
+    user_row_id: int
+    product_id: int
+    listing_id: int
+    new_user_id: int
+
+
+@dataclass(frozen=True)
+class QueryCase:
+    function: Callable
+    kwargs: Callable[[Sample], dict]
+    # Горячий запрос выбирает строки по ключу и обязан идти по индексу
+    hot: bool = True
+    # Индекс, который должен появиться в плане горячего запроса
+    index: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.function.__module__.rsplit('.', 1)[-1]}.{self.function.__name__}"
+
+
+def no_kwargs(sample: Sample) -> dict:
+    return {}
+
+
+CASES = (
+    QueryCase(users_table.add_user, lambda s: {"telegram_id": s.new_user_id, "chat_id": s.new_user_id}),
+    QueryCase(users_table.get_user, lambda s: {"telegram_id": s.user_id}),
+    QueryCase(users_table.change_user_alive_status, lambda s: {"is_alive": False, "telegram_id": s.user_id}),
+    QueryCase(users_table.change_user_banned_status_by_id, lambda s: {"banned": True, "user_id": s.user_row_id}),
+    QueryCase(
+        users_table.change_user_banned_status_by_username,
+        lambda s: {"banned": True, "username": s.username},
+        index="idx_users_username",
+    ),
+    QueryCase(users_table.get_user_alive_status, lambda s: {"user_id": s.user_id}),
+    QueryCase(users_table.get_user_banned_status_by_id, lambda s: {"user_id": s.user_id}),
+    QueryCase(
+        users_table.get_user_banned_status_by_username, lambda s: {"username": s.username}, index="idx_users_username",
+    ),
+    QueryCase(users_table.get_user_role, lambda s: {"user_id": s.user_id}),
+    QueryCase(users_table.get_user_chat_id, lambda s: {"user_id": s.user_id}),
+    QueryCase(users_table.get_total_users, no_kwargs, hot=False),
+    QueryCase(users_table.get_users_role_distribution, no_kwargs, hot=False),
+    QueryCase(users_table.get_percent_new_users_week, no_kwargs, hot=False),
+    QueryCase(activity_table.add_user_activity, lambda s: {"user_id": s.user_id}),
+    QueryCase(activity_table.get_statistics, no_kwargs, hot=False),
+    QueryCase(activity_table.get_active_users_today, no_kwargs, index="idx_activity_date_user"),
+    QueryCase(products_table.add_product, lambda s: {
+        "user_id": s.user_id, "marketplace": "ozon", "product_url": "https://ozon.ru/product/1/", "target_price": 100,
+    }),
+    QueryCase(
+        products_table.get_user_active_products, lambda s: {"user_id": s.user_id},
+        index="idx_subscriptions_user",
+    ),
+    QueryCase(
+        products_table.get_user_inactive_products, lambda s: {"user_id": s.user_id},
+        index="idx_subscriptions_user",
+    ),
+    QueryCase(
+        products_table.get_user_inactive_products_to_turn_on_after_block_bot, lambda s: {"user_id": s.user_id},
+        index="idx_subscriptions_user",
+    ),
+    QueryCase(products_table.get_product_by_id_and_user, lambda s: {"product_id": s.product_id, "user_id": s.user_id}),
+    QueryCase(products_table.delete_product_by_id, lambda s: {"product_id": s.product_id}),
+    QueryCase(
+        products_table.get_user_products_with_details, lambda s: {"user_id": s.user_id},
+        index="idx_subscriptions_user",
+    ),
+    QueryCase(products_table.change_product_active_status, lambda s: {"is_active": False, "product_id": s.product_id}),
+    # Страница читается индексом обхода (marketplace, listing_id) сразу в порядке keyset, без Seq Scan;
+    # у маленького маркетплейса чтение по первичному ключу перебирало бы чужие карточки.
+    # Страница меньше маркетплейса, как в рабочем каталоге относительно `sweep_batch_size`
+    QueryCase(
+        products_table.get_products_items_for_parsing_page,
+        lambda s: {"marketplace": MARKETPLACE_SHARES[-1], "after_listing_id": 0, "limit": 50},
+        index="idx_listing_state_marketplace_sweep",
+    ),
+    QueryCase(products_table.count_products_items_for_parsing, no_kwargs, hot=False),
+    QueryCase(products_table.change_listings_details_after_parsing, lambda s: {
+        "batch": ListingWriteBatch(
+            listing_ids=[s.listing_id], current_prices=[990], product_names=["Товар"], min_prices=[990],
+            last_errors=[None],
+        ),
+    }),
+    QueryCase(products_table.touch_listings_checked, lambda s: {"listing_ids": [s.listing_id]}),
+    QueryCase(products_table.register_listings_parsing_failures, lambda s: {
+        "listing_ids": [s.listing_id], "quarantine_after": 3, "quarantine_minutes": 30, "quarantine_max_minutes": 1440,
+    }),
+    QueryCase(
+        products_table.get_subscribers_to_notify, lambda s: {"prices": {s.listing_id: 10 ** 6}},
+        index="idx_subscriptions_listing",
+    ),
+    QueryCase(products_table.get_active_products_by_marketplace, no_kwargs, hot=False),
+    QueryCase(products_table.get_inactive_products_by_marketplace, no_kwargs, index="idx_listing_state_failed"),
+    QueryCase(price_history_table.ensure_price_history_partitions, no_kwargs, hot=False),
+    QueryCase(
+        price_history_table.add_price_points, lambda s: {"points": [(s.listing_id, 990)]}, hot=False,
+    ),
+    QueryCase(price_history_table.get_price_series, lambda s: {
+        "listing_id": s.listing_id, "since": datetime.now(timezone.utc) - timedelta(days=30),
+    }),
+    QueryCase(price_history_table.get_user_price_trends, lambda s: {"user_id": s.user_id}),
+    QueryCase(
+        join_query.get_user_role_and_active_products_count, lambda s: {"user_id": s.user_id},
+        index="idx_subscriptions_user",
+    ),
+)
+
+
+def database_functions(modules: tuple[ModuleType, ...] = MODULES) -> set[str]:
+    """
+    Имена всех корутин модулей БД в формате `<модуль>.<функция>`.
+    """
+    return {
+        f"{module.__name__.rsplit('.', 1)[-1]}.{name}"
+        for module in modules
+        for name, function in inspect.getmembers(module, inspect.iscoroutinefunction)
+        if function.__module__ == module.__name__
+    }
+
+
+async def seed(conn: asyncpg.Connection, scale: Scale) -> None:
+    """
+    Очищает таблицы и заливает синтетические данные на стороне сервера (generate_series).
+    """
+    await conn.execute(
+        "TRUNCATE TABLE users, activity, listings, subscriptions, price_history RESTART IDENTITY CASCADE;"
+    )
+    await conn.execute(
+        """
+        INSERT INTO users (telegram_id, chat_id, username, language, role, banned, created_at)
+        SELECT g, g, 'user' || g, 'ru',
+               CASE WHEN g % 1000 = 0 THEN 'admin' ELSE 'user' END,
+               g % 97 = 0,
+               now() - make_interval(days => g % 180)
+        FROM generate_series(1, $1) AS g;
+        """,
+        scale.users,
+    )
+    await conn.execute(
+        """
+        INSERT INTO listings (marketplace, product_key, product_url, product_name)
+        SELECT ($1::text[])[1 + g % array_length($1::text[], 1)],
+               g::text,
+               'https://example.com/product/' || g,
+               'Товар ' || g
+        FROM generate_series(1, $2) AS g;
+        """,
+        list(MARKETPLACE_SHARES), scale.listings,
+    )
+    await conn.execute(
+        """
+        INSERT INTO listing_state (listing_id, marketplace, current_price, min_price, last_checked, last_error)
+        SELECT listing_id,
+               marketplace,
+               200 + listing_id % 5000,
+               150 + listing_id % 5000,
+               now() - make_interval(mins => (listing_id % 60)::int),
+               CASE WHEN listing_id % 50 = 0 THEN 'NOT_FOUND' END
+        FROM listings;
+        """
+    )
+    # Подписки пользователя идут подряд, карточки перемешаны простым множителем
+    await conn.execute(
+        """
+        INSERT INTO subscriptions (user_id, listing_id, target_price, is_active)
+        SELECT 1 + (g - 1) / $1,
+               1 + ((g - 1)::bigint * 7919) % $2,
+               100 + g % 5000,
+               g % 20 <> 0
+        FROM generate_series(1, $3) AS g;
+        """,
+        scale.products_per_user, scale.listings, scale.products,
+    )
+    await conn.execute(
+        """
+        INSERT INTO activity (user_id, created_at, activity_date, actions)
+        SELECT u, now() - make_interval(days => d), CURRENT_DATE - d, 1 + (u + d) % 10
+        FROM generate_series(1, $1) AS u, generate_series(0, $2 - 1) AS d
+        WHERE (u * 31 + d * 17) % $3 = 0;
+        """,
+        scale.users, scale.days, scale.active_every,
+    )
+    # История цен дописывается по времени, как при обходах
+    history_start = datetime.now(timezone.utc) - timedelta(days=scale.days)
+    await price_history_table.ensure_price_history_partitions(
+        conn, months=scale.days // 28 + 2, today=history_start.date(),
+    )
+    await conn.execute(
+        """
+        INSERT INTO price_history (listing_id, price, recorded_at)
+        SELECT l, 200 + (l * 13 + k * 7) % 5000, $2::timestamptz + make_interval(secs => k * $3 + l::float8 * $3 / $1)
+        FROM generate_series(0, $4 - 1) AS k, generate_series(1, $1) AS l
+        ORDER BY k, l;
+        """,
+        scale.listings, history_start, scale.days * 86400 // scale.price_changes, scale.price_changes,
+    )
+    # Как после autovacuum: карта видимости заполнена, возможны index-only scan
+    await conn.execute(
+        "VACUUM ANALYZE users, listings, listing_state, subscriptions, activity, price_history, price_history_daily;"
+    )
+
+
+async def pick_sample(conn: asyncpg.Connection, scale: Scale) -> Sample:
+    user_id = max(scale.users // 2, 1)
+    row = await conn.fetchrow(
+        """
+        SELECT u.id, u.username, s.product_id, s.listing_id
+        FROM users u JOIN subscriptions s ON s.user_id = u.telegram_id
+        WHERE u.telegram_id = $1
+        ORDER BY s.product_id
+        LIMIT 1;
+        """,
+        user_id,
+    )
+    return Sample(
+        user_id=user_id,
+        username=row["username"],
+        user_row_id=row["id"],
+        product_id=row["product_id"],
+        listing_id=row["listing_id"],
+        new_user_id=scale.users + 1,
+    )
+
+
+def iter_plan_nodes(plan: dict) -> Iterator[dict]:
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from iter_plan_nodes(child)
+
+
+def summarize_plan(query: str, explained: dict) -> dict:
+    plan = explained["Plan"]
+    nodes = list(iter_plan_nodes(plan))
+    return {
+        "query": SPACES_RE.sub(" ", query).strip(),
+        "nodes": [
+            f"{node['Node Type']} on {node['Relation Name']}" if "Relation Name" in node else node["Node Type"]
+            for node in nodes
+        ],
+        # Пустые таблицы (например, секция истории цен следующего месяца) дешевле читать целиком
+        "seq_scans": sorted({
+            node["Relation Name"] for node in nodes
+            if node["Node Type"] == "Seq Scan" and (node.get("Actual Rows") or node.get("Rows Removed by Filter"))
+        }),
+        "indexes": sorted({node["Index Name"] for node in nodes if "Index Name" in node}),
+        "execution_ms": round(explained["Execution Time"], 3),
+        "shared_hit_blocks": plan.get("Shared Hit Blocks", 0),
+        "shared_read_blocks": plan.get("Shared Read Blocks", 0),
+        "plan": plan,
+    }
+
+
+async def capture_queries(conn: asyncpg.Connection, call: Callable) -> list[tuple[str, tuple]]:
+    """
+    Выполняет `call` в откатываемой транзакции и возвращает отправленные запросы с аргументами.
+    """
+    queries: list[tuple[str, tuple]] = []
+
+    def record(logged) -> None:
+        queries.append((logged.query, tuple(logged.args or ())))
+
+    transaction = conn.transaction()
+    await transaction.start()
+    # Логгер подключается внутри транзакции, чтобы не записать её BEGIN и ROLLBACK
+    conn.add_query_logger(record)
+    try:
+        await call()
+        # Логгер вызывается через call_soon, даём циклу событий его выполнить
+        await asyncio.sleep(0)
+    finally:
+        conn.remove_query_logger(record)
+        await transaction.rollback()
+    return queries
+
+
+async def explain(conn: asyncpg.Connection, query: str, args: tuple) -> dict:
+    transaction = conn.transaction()
+    await transaction.start()
+    try:
+        raw = await conn.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", *args)
+    finally:
+        await transaction.rollback()
+    return summarize_plan(query, json.loads(raw)[0])
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+async def benchmark_case(conn: asyncpg.Connection, case: QueryCase, sample: Sample, repeat: int) -> dict:
+    kwargs = case.kwargs(sample)
+    timings = []
+    for _ in range(repeat):
+        transaction = conn.transaction()
+        await transaction.start()
+        try:
+            started = time.perf_counter()
+            await case.function(conn, **kwargs)
+            timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            await transaction.rollback()
+
+    queries = await capture_queries(conn, lambda: case.function(conn, **kwargs))
+    plans = [await explain(conn, query, args) for query, args in queries]
+    return {
+        "hot": case.hot,
+        "index": case.index,
+        "mean_ms": round(sum(timings) / len(timings), 3),
+        "p95_ms": round(percentile(timings, 0.95), 3),
+        "plans": plans,
+    }
+
+
+def find_plan_regressions(report: dict) -> list[str]:
+    """
+    Горячие функции, в плане которых появился Seq Scan или не используется ожидаемый индекс.
+    """
+    regressions = []
+    for name, stats in report["functions"].items():
+        if not stats["hot"]:
+            continue
+        for plan in stats["plans"]:
+            if plan["seq_scans"]:
+                regressions.append(f"{name}: Seq Scan on {', '.join(plan['seq_scans'])} in `{plan['query'][:80]}`")
+        if stats.get("index") and not any(stats["index"] in plan.get("indexes", ()) for plan in stats["plans"]):
+            regressions.append(f"{name}: index {stats['index']} is not used")
+    return regressions
+
+
+def compare_with_baseline(current: dict, baseline: dict, *, tolerance: float = 0.2) -> list[str]:
+    """
+    Функции, у которых p95 вырос больше чем на `tolerance` относительно базового прогона.
+    """
+    regressions = []
+    for name, stats in current["functions"].items():
+        base = baseline.get("functions", {}).get(name)
+        if base and base.get("p95_ms") and stats["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {stats['p95_ms']}ms > baseline {base['p95_ms']}ms")
+    return regressions
+
+
+async def run_benchmark(
+    conn: asyncpg.Connection,
+    scale: Scale,
+    *,
+    repeat: int = 10,
+    reseed: bool = True,
+    cases: tuple[QueryCase, ...] = CASES,
+) -> dict:
+    if reseed:
+        started = time.monotonic()
+        await seed(conn, scale)
+        logger.info("Seeded %d users and %d products in %.1fs", scale.users, scale.products, time.monotonic() - started)
+    sample = await pick_sample(conn, scale)
+
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scale": {
+            "users": scale.users,
+            "products": scale.products,
+            "listings": scale.listings,
+            "activity": await conn.fetchval("SELECT count(*) FROM activity"),
+        },
+        "repeat": repeat,
+        "functions": {},
+    }
+    for case in cases:
+        report["functions"][case.name] = await benchmark_case(conn, case, sample, repeat)
+        logger.info("%s: p95 %.3fms", case.name, report["functions"][case.name]["p95_ms"])
+    report["plan_regressions"] = find_plan_regressions(report)
+    return report
+
+
+async def run(args: argparse.Namespace) -> dict:
+    config = load_config(args.env)
+    conn = await asyncpg.connect(
+        user=config.db.user,
+        password=config.db.password,
+        database=config.db.name,
+        host=config.db.host,
+        port=config.db.port,
+    )
+    try:
+        scale = Scale(
+            users=args.users,
+            products_per_user=args.products_per_user,
+            days=args.days,
+            active_every=args.active_every,
+            subscribers_per_listing=args.subscribers_per_listing,
+            price_changes=args.price_changes,
+        )
+        return await run_benchmark(conn, scale, repeat=args.repeat, reseed=not args.no_seed)
+    finally:
+        await conn.close()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Database query benchmark with plan regression checks")
+    parser.add_argument("--env", default=".env.test", help="env file of the database to use; its tables are truncated")
+    parser.add_argument("--users", type=int, default=Scale.users)
+    parser.add_argument("--products-per-user", type=int, default=Scale.products_per_user)
+    parser.add_argument("--days", type=int, default=Scale.days, help="days of activity history")
+    parser.add_argument("--active-every", type=int, default=Scale.active_every)
+    parser.add_argument("--subscribers-per-listing", type=int, default=Scale.subscribers_per_listing)
+    parser.add_argument("--price-changes", type=int, default=Scale.price_changes, help="price changes per listing")
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs per function")
+    parser.add_argument("--no-seed", action="store_true", help="reuse data from a previous run")
+    parser.add_argument("--out", type=Path, help="write JSON results to this file")
+    parser.add_argument("--baseline", type=Path, help="compare p95 with a previous JSON result")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    # Логи функций БД на каждый вызов искажают замер
+    logging.getLogger("database").setLevel(logging.WARNING)
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, ensure_ascii=False, indent=2, default=str)
+    if args.out:
+        args.out.write_text(output, encoding="utf-8")
+    for name, stats in report["functions"].items():
+        print(f"{name:70} {stats['mean_ms']:>9.3f}ms {stats['p95_ms']:>9.3f}ms")
+
+    regressions = list(report["plan_regressions"])
+    if args.baseline:
+        regressions += compare_with_baseline(
+            report, json.loads(args.baseline.read_text(encoding="utf-8")), tolerance=args.tolerance,
+        )
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,344 @@
+"""
+Офлайн-бенчмарк парсеров маркетплейсов.
+
+Записанные страницы отдаются локальным HTTP-сервером (`tests/benchmarks/fixtures`)
+или из HAR-файла через `route_from_har`, а парсеры запускаются штатными
+`process_many_*_tasks` с заданной параллельностью. Для каждого маркетплейса
+измеряются страницы в минуту, p50/p95/p99 задержки страницы, число вызовов
+протокола Playwright (IPC) и пиковый RSS процессов Chromium. Итог пишется в JSON
+и сравнивается с базовым прогоном:
+
+    python -m tests.benchmarks.harness --pages 20 --concurrency 4 --out bench.json --baseline base.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Iterator, Optional
+
+from aiohttp import web
+from playwright._impl._connection import Connection
+from playwright.async_api import async_playwright
+
+from bot.background_tasks.hedging import LatencyTracker
+from bot.parsers.joom import process_many_joom_tasks
+from bot.parsers.ozon import process_many_ozon_tasks
+from bot.parsers.rate_limiter import host_key
+from bot.parsers.wildberries import process_many_wb_tasks
+from bot.parsers.yandex_market import process_many_yandex_market_tasks
+from enums.parse_records import ParseTask
+
+logger = logging.getLogger(__name__)
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+PROCESSORS = {
+    "wildberries": process_many_wb_tasks,
+    "ozon": process_many_ozon_tasks,
+    "joom": process_many_joom_tasks,
+    "yandex": process_many_yandex_market_tasks,
+}
+# Хосты записанных страниц в HAR-файлах
+MARKETPLACE_HOSTS = {
+    "wildberries.ru": "wildberries",
+    "ozon.ru": "ozon",
+    "joom.ru": "joom",
+    "joom.com": "joom",
+    "market.yandex.ru": "yandex",
+}
+PERCENTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+
+
+class FixtureServer:
+    """
+    Локальный сервер записанных страниц: `/<marketplace>/<product_id>` отдаёт
+    `fixtures/<marketplace>.html` с задержкой `delay` секунд, имитирующей сеть.
+    """
+
+    def __init__(self, fixtures_dir: Path = FIXTURES_DIR, *, delay: float = 0.0):
+        self.fixtures_dir = fixtures_dir
+        self.delay = delay
+        self.requests = 0
+        self._runner: Optional[web.AppRunner] = None
+        self.port: Optional[int] = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        path = self.fixtures_dir / f"{request.match_info['marketplace']}.html"
+        if not path.is_file():
+            raise web.HTTPNotFound()
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return web.Response(text=path.read_text(encoding="utf-8"), content_type="text/html")
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/{marketplace}/{product_id}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", 0).start()
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+
+    def url(self, marketplace: str, product_id: int) -> str:
+        return f"http://127.0.0.1:{self.port}/{marketplace}/{product_id}"
+
+
+def har_urls(har_path: Path) -> dict[str, list[str]]:
+    """
+    Адреса HTML-страниц из HAR-файла, сгруппированные по маркетплейсам.
+    """
+    har = json.loads(Path(har_path).read_text(encoding="utf-8"))
+    urls: dict[str, list[str]] = {}
+    for entry in har["log"]["entries"]:
+        mime = entry["response"].get("content", {}).get("mimeType", "")
+        if "html" not in mime:
+            continue
+        host = host_key(entry["request"]["url"])
+        for domain, marketplace in MARKETPLACE_HOSTS.items():
+            if host == domain or host.endswith(f".{domain}"):
+                urls.setdefault(marketplace, []).append(entry["request"]["url"])
+    return urls
+
+
+@contextlib.contextmanager
+def count_ipc_calls() -> Iterator[Counter]:
+    """
+    Считает вызовы протокола Playwright по методам (опирается на внутренний
+    Connection закреплённой в requirements версии Playwright).
+    """
+    calls: Counter = Counter()
+    original = Connection._send_message_to_server
+
+    def counting(self, object, method, params, no_reply=False):
+        calls[method] += 1
+        return original(self, object, method, params, no_reply)
+
+    Connection._send_message_to_server = counting
+    try:
+        yield calls
+    finally:
+        Connection._send_message_to_server = original
+
+
+def chromium_rss_mb(root_pid: Optional[int] = None) -> Optional[float]:
+    """
+    Суммарный RSS процессов Chromium, порождённых текущим процессом (по /proc, только Linux).
+    """
+    proc = Path("/proc")
+    if not proc.is_dir():
+        return None
+    parents: dict[int, int] = {}
+    names: dict[int, str] = {}
+    rss: dict[int, int] = {}
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            status = (entry / "status").read_text()
+        except OSError:
+            continue
+        fields = dict(line.split(":", 1) for line in status.splitlines() if ":" in line)
+        pid = int(entry.name)
+        parents[pid] = int(fields.get("PPid", "0").strip())
+        names[pid] = fields.get("Name", "").strip().lower()
+        rss[pid] = int(fields.get("VmRSS", "0 kB").split()[0])
+
+    root = root_pid or os.getpid()
+    total_kb = 0
+    for pid in rss:
+        ancestor = parents.get(pid)
+        while ancestor and ancestor != root:
+            ancestor = parents.get(ancestor)
+        if ancestor == root and ("chrom" in names[pid] or "headless_shell" in names[pid]):
+            total_kb += rss[pid]
+    return round(total_kb / 1024, 1)
+
+
+class RssSampler:
+    """
+    Пиковый RSS Chromium за время прогона, с опросом раз в `interval` секунд.
+    """
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.peak_mb: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            rss = await asyncio.to_thread(chromium_rss_mb)
+            if rss is not None:
+                self.peak_mb = max(self.peak_mb or 0.0, rss)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> Optional[float]:
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        return self.peak_mb
+
+
+def summarize(
+    results: list,
+    latency: LatencyTracker,
+    elapsed: float,
+    ipc_calls: int,
+    rss_mb: Optional[float],
+) -> dict:
+    """
+    Сводка прогона маркетплейса; перцентили считаются по задержкам успешных страниц.
+    """
+    errors = Counter(result.last_error.name for result in results if result.last_error is not None)
+    summary = {
+        "pages": len(results),
+        "errors": dict(errors),
+        "elapsed_seconds": round(elapsed, 2),
+        "pages_per_minute": round(len(results) / elapsed * 60, 2) if elapsed else 0.0,
+        "ipc_calls": ipc_calls,
+        "ipc_calls_per_page": round(ipc_calls / len(results), 1) if results else 0.0,
+        "chromium_rss_mb": rss_mb,
+    }
+    for label, q in PERCENTILES.items():
+        value = latency.percentile(q)
+        summary[f"{label}_seconds"] = round(value, 3) if value is not None else None
+    return summary
+
+
+def compare_with_baseline(current: dict, baseline: dict, *, tolerance: float = 0.1) -> list[str]:
+    """
+    Возвращает описания регрессий: падение страниц в минуту или рост p95 больше чем на `tolerance`.
+    """
+    regressions = []
+    for marketplace, stats in current["marketplaces"].items():
+        base = baseline.get("marketplaces", {}).get(marketplace)
+        if not base:
+            continue
+        if base["pages_per_minute"] and stats["pages_per_minute"] < base["pages_per_minute"] * (1 - tolerance):
+            regressions.append(
+                f"{marketplace}: pages/minute {stats['pages_per_minute']} < baseline {base['pages_per_minute']}"
+            )
+        if base.get("p95_seconds") and stats.get("p95_seconds") and \
+                stats["p95_seconds"] > base["p95_seconds"] * (1 + tolerance):
+            regressions.append(f"{marketplace}: p95 {stats['p95_seconds']}s > baseline {base['p95_seconds']}s")
+    return regressions
+
+
+async def run_marketplace(browser, marketplace: str, urls: list[str], concurrency: int, har: Optional[Path]) -> dict:
+    context = await browser.new_context()
+    if har:
+        await context.route_from_har(har, not_found="abort")
+    tasks = [ParseTask(1, product_id, url, None, None) for product_id, url in enumerate(urls, start=1)]
+    # Без бюджета хеджирования трекер только копит задержки успешных страниц
+    latency = LatencyTracker(marketplace, window=len(tasks), min_samples=1)
+
+    sampler = RssSampler()
+    sampler.start()
+    started = time.monotonic()
+    try:
+        with count_ipc_calls() as calls:
+            results = await PROCESSORS[marketplace](
+                tasks, context, max_concurrent=concurrency, latency=latency,
+            )
+    finally:
+        elapsed = time.monotonic() - started
+        rss_mb = await sampler.stop()
+        await context.close()
+    return summarize(results, latency, elapsed, sum(calls.values()), rss_mb)
+
+
+async def run_benchmark(
+    *,
+    marketplaces: list[str],
+    pages: int,
+    concurrency: int,
+    delay: float = 0.0,
+    har: Optional[Path] = None,
+) -> dict:
+    server = None
+    if har:
+        urls = {marketplace: found[:pages] for marketplace, found in har_urls(har).items()}
+    else:
+        server = FixtureServer(delay=delay)
+        await server.start()
+        urls = {marketplace: [server.url(marketplace, i) for i in range(pages)] for marketplace in marketplaces}
+
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "pages": pages,
+        "concurrency": concurrency,
+        "source": str(har) if har else "fixtures",
+        "marketplaces": {},
+    }
+    try:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
+            try:
+                for marketplace in marketplaces:
+                    if not urls.get(marketplace):
+                        logger.warning("No recorded pages for %s, skipping", marketplace)
+                        continue
+                    report["marketplaces"][marketplace] = await run_marketplace(
+                        browser, marketplace, urls[marketplace], concurrency, har,
+                    )
+                    logger.info("%s: %s", marketplace, report["marketplaces"][marketplace])
+            finally:
+                await browser.close()
+    finally:
+        if server:
+            await server.stop()
+    return report
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmark of the marketplace parsers")
+    parser.add_argument("--marketplace", action="append", choices=list(PROCESSORS), help="repeat to select several")
+    parser.add_argument("--pages", type=int, default=20, help="pages per marketplace")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--delay", type=float, default=0.0, help="simulated server latency, seconds")
+    parser.add_argument("--har", type=Path, help="replay pages from a HAR file instead of the fixtures")
+    parser.add_argument("--out", type=Path, help="write JSON results to this file")
+    parser.add_argument("--baseline", type=Path, help="compare with a previous JSON result")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    # Логи парсеров на каждую страницу искажают замер
+    logging.getLogger("bot.parsers").setLevel(logging.WARNING)
+
+    report = asyncio.run(run_benchmark(
+        marketplaces=args.marketplace or list(PROCESSORS),
+        pages=args.pages,
+        concurrency=args.concurrency,
+        delay=args.delay,
+        har=args.har,
+    ))
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        args.out.write_text(output, encoding="utf-8")
+    print(output)
+
+    if args.baseline:
+        regressions = compare_with_baseline(
+            report, json.loads(args.baseline.read_text(encoding="utf-8")), tolerance=args.tolerance,
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
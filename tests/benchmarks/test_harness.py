@@ -0,0 +1,79 @@
+import os
+
+import aiohttp
+import pytest
+
+from enums.parse_errors import ParseError
+from enums.parse_records import ParseTask
+from bot.background_tasks.hedging import LatencyTracker
+from bot.parsers.common import build_result
+from bot.parsers.extraction import extract_product
+from tests.benchmarks.harness import (
+    FIXTURES_DIR,
+    PROCESSORS,
+    FixtureServer,
+    compare_with_baseline,
+    run_benchmark,
+    summarize,
+)
+
+EXPECTED_PRICES = {"wildberries": 1250, "ozon": 2490, "joom": 4500, "yandex": 1990}
+
+
+@pytest.mark.parametrize("marketplace", sorted(PROCESSORS))
+def test_fixtures_match_parser_rules(marketplace):
+    html = (FIXTURES_DIR / f"{marketplace}.html").read_text(encoding="utf-8")
+    extraction = extract_product(marketplace, html)
+    assert extraction.source == "dom"
+    assert extraction.price == EXPECTED_PRICES[marketplace]
+
+
+async def test_fixture_server_serves_recorded_pages():
+    server = FixtureServer()
+    await server.start()
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(server.url("ozon", 1)) as response:
+                assert response.status == 200
+                assert "webPrice" in await response.text()
+            async with session.get(server.url("unknown", 1)) as response:
+                assert response.status == 404
+    finally:
+        await server.stop()
+    assert server.requests == 2
+
+
+def test_summarize_reports_throughput_and_percentiles():
+    info = ParseTask(1, 1, "https://ozon.ru/p/1", None, None)
+    results = [build_result(info, 100, "Товар", None)] * 3 + [build_result(info, None, None, ParseError.TIMEOUT)]
+    latency = LatencyTracker("ozon", window=10, min_samples=1)
+    for seconds in (1.0, 2.0, 3.0):
+        latency.record(seconds)
+
+    summary = summarize(results, latency, elapsed=30.0, ipc_calls=40, rss_mb=512.0)
+
+    assert summary["pages_per_minute"] == 8.0
+    assert summary["errors"] == {"TIMEOUT": 1}
+    assert summary["ipc_calls_per_page"] == 10.0
+    assert (summary["p50_seconds"], summary["p95_seconds"], summary["p99_seconds"]) == (2.0, 3.0, 3.0)
+
+
+def test_compare_with_baseline_flags_regressions():
+    baseline = {"marketplaces": {"ozon": {"pages_per_minute": 60.0, "p95_seconds": 2.0}}}
+    current = {"marketplaces": {
+        "ozon": {"pages_per_minute": 50.0, "p95_seconds": 2.1},
+        "joom": {"pages_per_minute": 10.0, "p95_seconds": 9.0},
+    }}
+
+    assert compare_with_baseline(current, baseline) == ["ozon: pages/minute 50.0 < baseline 60.0"]
+    assert compare_with_baseline(current, baseline, tolerance=0.2) == []
+
+
+@pytest.mark.skipif(not os.getenv("PARSER_BENCHMARK"), reason="set PARSER_BENCHMARK=1 to run the browser benchmark")
+async def test_benchmark_parses_recorded_pages():
+    report = await run_benchmark(marketplaces=["ozon"], pages=4, concurrency=2)
+
+    stats = report["marketplaces"]["ozon"]
+    assert stats["pages"] == 4
+    assert stats["errors"] == {}
+    assert stats["ipc_calls"] > 0
@@ -0,0 +1,110 @@
+import asyncio
+
+from enums.parse_errors import ParseError
+from bot.background_tasks.aimd import AdaptiveConcurrencyLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_limiter(clock, initial=4):
+    return AdaptiveConcurrencyLimiter(
+        "wildberries", floor=1, ceiling=6, initial=initial, latency_target=30, clock=clock
+    )
+
+
+def complete(limiter, clock, latency=5.0, error=None):
+    started_at = clock.now
+    clock.now += latency
+    limiter.record(started_at, error)
+
+
+def test_limiter_increases_additively_after_window_of_successes():
+    clock = FakeClock()
+    limiter = make_limiter(clock)
+
+    for _ in range(3):
+        complete(limiter, clock)
+    assert limiter.limit == 4
+
+    complete(limiter, clock)
+    assert limiter.limit == 5
+
+    for _ in range(5):
+        complete(limiter, clock)
+    assert limiter.limit == 6
+
+    for _ in range(20):
+        complete(limiter, clock)
+    assert limiter.limit == 6
+
+
+def test_limiter_decreases_multiplicatively_on_overload():
+    clock = FakeClock()
+    limiter = make_limiter(clock)
+
+    complete(limiter, clock, error=ParseError.BLOCKED)
+    assert limiter.limit == 2
+
+    complete(limiter, clock, latency=31)
+    assert limiter.limit == 1
+
+    complete(limiter, clock, error=ParseError.TIMEOUT)
+    assert limiter.limit == 1
+
+
+def test_limiter_ignores_product_errors():
+    clock = FakeClock()
+    limiter = make_limiter(clock)
+
+    complete(limiter, clock, error=ParseError.NOT_FOUND)
+    complete(limiter, clock, error=ParseError.PARSE_FAILED)
+
+    assert limiter.limit == 4
+
+
+def test_limiter_decreases_once_for_pages_started_together():
+    clock = FakeClock()
+    limiter = make_limiter(clock)
+
+    # Четыре страницы стартовали одновременно и все упали по таймауту
+    started_at = clock.now
+    clock.now += 10
+    for _ in range(4):
+        limiter.record(started_at, ParseError.TIMEOUT)
+
+    assert limiter.limit == 2
+
+
+def test_limiter_tracks_average_latency():
+    clock = FakeClock()
+    limiter = make_limiter(clock)
+
+    complete(limiter, clock, latency=10)
+    assert limiter.avg_latency == 10
+    complete(limiter, clock, latency=20)
+    assert limiter.avg_latency == 12
+
+
+async def test_limiter_bounds_in_flight_pages():
+    limiter = make_limiter(FakeClock(), initial=2)
+    in_flight = 0
+    max_in_flight = 0
+
+    async def worker():
+        nonlocal in_flight, max_in_flight
+        await limiter.acquire()
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        await limiter.release()
+
+    await asyncio.gather(*(worker() for _ in range(6)))
+
+    assert max_in_flight == 2
@@ -0,0 +1,139 @@
+import asyncio
+
+from enums.parse_errors import ParseError
+from bot.background_tasks.circuit_breaker import BreakerState, CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_breaker(clock):
+    return CircuitBreaker(
+        "ozon", window=10, min_samples=4, failure_rate=0.5, challenge_rate=0.3, open_seconds=60, clock=clock
+    )
+
+
+async def test_breaker_stays_closed_on_success_and_missing_products():
+    breaker = make_breaker(FakeClock())
+    for error in [None, ParseError.NOT_FOUND, None, ParseError.NOT_FOUND, None]:
+        assert await breaker.acquire()
+        breaker.record(error)
+
+    assert breaker.state is BreakerState.CLOSED
+
+
+async def test_breaker_needs_min_samples():
+    breaker = make_breaker(FakeClock())
+    for _ in range(3):
+        breaker.record(ParseError.TIMEOUT)
+
+    assert breaker.state is BreakerState.CLOSED
+
+
+async def test_breaker_opens_on_failure_rate():
+    breaker = make_breaker(FakeClock())
+    for error in [None, ParseError.TIMEOUT, None, ParseError.PARSE_FAILED]:
+        breaker.record(error)
+
+    assert breaker.state is BreakerState.OPEN
+    assert not await breaker.acquire()
+
+
+async def test_breaker_opens_on_challenge_rate():
+    breaker = make_breaker(FakeClock())
+    for error in [None, None, ParseError.BLOCKED, None, None]:
+        breaker.record(error)
+    assert breaker.state is BreakerState.CLOSED
+
+    breaker.record(ParseError.BLOCKED)
+    assert breaker.state is BreakerState.OPEN
+
+
+async def test_breaker_half_open_probe_closes_on_success():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record(ParseError.BLOCKED)
+    assert not await breaker.acquire()
+
+    clock.now = 61
+    probe = await breaker.acquire()
+    assert probe
+    assert breaker.state is BreakerState.HALF_OPEN
+
+    # Пока идёт проба, остальные задачи ждут её результата
+    waiter = asyncio.create_task(breaker.acquire())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    breaker.record(None, probe)
+    assert await waiter
+    assert breaker.state is BreakerState.CLOSED
+
+
+async def test_breaker_half_open_probe_reopens_on_failure():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record(ParseError.TIMEOUT)
+
+    clock.now = 61
+    probe = await breaker.acquire()
+    waiter = asyncio.create_task(breaker.acquire())
+    await asyncio.sleep(0)
+
+    breaker.record(ParseError.BLOCKED, probe)
+    assert not await waiter
+    assert breaker.state is BreakerState.OPEN
+    assert breaker.opened_at == 61
+
+
+async def test_breaker_half_open_ignores_results_of_other_pages():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    # Страница начата до размыкания и закончится уже во время пробы
+    straggler = await breaker.acquire()
+    for _ in range(4):
+        breaker.record(ParseError.TIMEOUT)
+
+    clock.now = 61
+    probe = await breaker.acquire()
+    breaker.record(None, straggler)
+    assert breaker.state is BreakerState.HALF_OPEN
+
+    breaker.record(ParseError.TIMEOUT, probe)
+    assert breaker.state is BreakerState.OPEN
+
+
+async def test_breaker_cancelled_probe_releases_waiters():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record(ParseError.TIMEOUT)
+    clock.now = 61
+    started = asyncio.Event()
+
+    async def probe_page():
+        ticket = await breaker.acquire()
+        try:
+            started.set()
+            await asyncio.sleep(3600)
+            breaker.record(None, ticket)
+        finally:
+            breaker.release(ticket)
+
+    probe = asyncio.create_task(probe_page())
+    await started.wait()
+    waiter = asyncio.create_task(breaker.acquire())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    probe.cancel()
+    # Проба без результата снова размыкает предохранитель, ожидающая задача откладывается
+    assert await asyncio.wait_for(waiter, timeout=1) is None
+    assert breaker.state is BreakerState.OPEN
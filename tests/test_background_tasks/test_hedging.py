@@ -0,0 +1,37 @@
+from bot.background_tasks.hedging import HedgeBudget, LatencyTracker
+
+
+def test_latency_tracker_needs_min_samples():
+    tracker = LatencyTracker("ozon", min_samples=5)
+    for seconds in range(4):
+        tracker.record(float(seconds))
+    assert tracker.p95() is None
+
+    tracker.record(4.0)
+    assert tracker.p95() == 4.0
+
+
+def test_latency_tracker_p95_over_window():
+    tracker = LatencyTracker("joom", window=100, min_samples=1)
+    for seconds in range(1, 201):
+        tracker.record(float(seconds))
+
+    # В окне остались последние 100 значений: 101..200
+    assert tracker.p95() == 195.0
+    assert tracker.percentile(0.5) == 150.0
+
+
+def test_hedge_budget_caps_share_of_load():
+    budget = HedgeBudget(ratio=0.1)
+    for _ in range(9):
+        budget.record_primary()
+    assert not budget.try_acquire()
+
+    budget.record_primary()
+    assert budget.try_acquire()
+    assert not budget.try_acquire()
+
+    for _ in range(10):
+        budget.record_primary()
+    assert budget.try_acquire()
+    assert budget.hedges == 2
@@ -0,0 +1,93 @@
+from bot.background_tasks.aimd import AdaptiveConcurrencyLimiter
+from bot.background_tasks.planner import SweepPlanner, task_priority
+from enums.parse_errors import ParseError
+from enums.parse_records import ParseTask
+
+
+def make_tasks(count, min_price=None, target_price=100, start=1):
+    return [
+        ParseTask(1, product_id, f"https://example.com/{product_id}", min_price, target_price)
+        for product_id in range(start, start + count)
+    ]
+
+
+def make_limiter(initial, ceiling, avg_latency=10.0):
+    limiter = AdaptiveConcurrencyLimiter("wildberries", floor=1, ceiling=ceiling, initial=initial)
+    limiter.avg_latency = avg_latency
+    return limiter
+
+
+def test_task_priority():
+    assert task_priority(ParseTask(1, 1, "url", None, 100)) == 0.0
+    assert task_priority(ParseTask(1, 1, "url", 150, 100)) == 1.5
+    assert task_priority(ParseTask(1, 1, "url", 90, 100)) == 0.9
+
+
+def test_plan_within_budget_keeps_everything():
+    planner = SweepPlanner(interval_seconds=1000, deadline_ratio=1.0)
+    limiters = {"wildberries": make_limiter(5, 10), "ozon": make_limiter(3, 6)}
+
+    plan = planner.plan({"wildberries": make_tasks(10), "ozon": make_tasks(3), "joom": []}, limiters)
+
+    assert plan.estimates == {"wildberries": 20.0, "ozon": 10.0}
+    assert plan.shed == {}
+    assert limiters["wildberries"].limit == 5
+    assert limiters["ozon"].limit == 3
+
+
+def test_plan_raises_concurrency_of_slowest_marketplace():
+    planner = SweepPlanner(interval_seconds=60, deadline_ratio=1.0)
+    limiters = {"wildberries": make_limiter(2, 10), "ozon": make_limiter(1, 6)}
+
+    plan = planner.plan({"wildberries": make_tasks(10), "ozon": make_tasks(2)}, limiters)
+
+    assert plan.estimated_seconds <= 60
+    assert plan.shed == {}
+    assert limiters["wildberries"].limit > 2
+
+
+
+def test_plan_keeps_recently_decreased_concurrency():
+    planner = SweepPlanner(interval_seconds=60, deadline_ratio=1.0)
+    limiters = {"wildberries": make_limiter(4, 10)}
+    # Таймаут только что снизил лимит вдвое: планирование следующей страницы его не поднимает
+    limiters["wildberries"].record(limiters["wildberries"].clock(), ParseError.TIMEOUT)
+
+    plan = planner.plan({"wildberries": make_tasks(10)}, limiters)
+
+    assert limiters["wildberries"].limit == 2
+    assert len(plan.tasks_by_marketplace["wildberries"]) == 10
+
+def test_plan_sheds_lowest_priority_when_ceiling_reached():
+    planner = SweepPlanner(interval_seconds=30, deadline_ratio=1.0)
+    limiters = {"wildberries": make_limiter(1, 1)}
+    tasks = make_tasks(2) + make_tasks(2, min_price=300, start=3) + make_tasks(1, min_price=110, start=5)
+
+    plan = planner.plan({"wildberries": tasks}, limiters)
+
+    kept = [task.product_id for task in plan.tasks_by_marketplace["wildberries"]]
+    assert kept == [1, 2, 5]
+    assert plan.shed == {"wildberries": 2}
+    assert plan.estimated_seconds == 30
+
+
+def test_plan_never_sheds_products_without_price_history():
+    planner = SweepPlanner(interval_seconds=10, deadline_ratio=1.0)
+    limiters = {"wildberries": make_limiter(1, 1)}
+
+    plan = planner.plan({"wildberries": make_tasks(5)}, limiters)
+
+    assert len(plan.tasks_by_marketplace["wildberries"]) == 5
+    assert plan.shed == {}
+
+
+def test_plan_of_one_page_uses_its_share_of_budget():
+    planner = SweepPlanner(interval_seconds=60, deadline_ratio=1.0)
+    limiters = {"wildberries": make_limiter(1, 1)}
+    tasks = make_tasks(2) + make_tasks(2, min_price=300, start=3) + make_tasks(1, min_price=110, start=5)
+
+    # Страница из 5 задач при 10 задачах обхода получает половину бюджета
+    plan = planner.plan({"wildberries": tasks}, limiters, share=0.5)
+
+    assert [task.product_id for task in plan.tasks_by_marketplace["wildberries"]] == [1, 2, 5]
+    assert plan.shed == {"wildberries": 2}
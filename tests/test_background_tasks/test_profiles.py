@@ -0,0 +1,68 @@
+from bot.background_tasks.profiles import BrowserProfileStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_profile_keeps_fingerprint_between_sweeps(tmp_path):
+    store = BrowserProfileStore(tmp_path, clock=FakeClock())
+
+    first = store.prepare("ozon")
+    (store.profile_dir("ozon") / "Cookies").write_bytes(b"cookie")
+    second = store.prepare("ozon")
+
+    assert first == second
+    assert (store.profile_dir("ozon") / "Cookies").exists()
+
+
+def test_profile_resets_after_max_age(tmp_path):
+    clock = FakeClock()
+    store = BrowserProfileStore(tmp_path, max_age_hours=24, clock=clock)
+
+    store.prepare("wildberries")
+    (store.profile_dir("wildberries") / "Cookies").write_bytes(b"cookie")
+    clock.now += 25 * 3600
+    store.prepare("wildberries")
+
+    assert not (store.profile_dir("wildberries") / "Cookies").exists()
+    assert (store.profile_dir("wildberries") / "profile.json").exists()
+
+
+def test_profile_resets_when_oversized(tmp_path):
+    store = BrowserProfileStore(tmp_path, max_profile_mb=1, clock=FakeClock())
+
+    store.prepare("joom")
+    (store.profile_dir("joom") / "Cache").write_bytes(b"0" * (2 * 1024 * 1024))
+    store.prepare("joom")
+
+    assert not (store.profile_dir("joom") / "Cache").exists()
+
+
+def test_profiles_are_separate_per_marketplace(tmp_path):
+    store = BrowserProfileStore(tmp_path, cache_size_mb=64, clock=FakeClock())
+
+    store.prepare("ozon")
+    store.prepare("yandex")
+    store.reset("ozon")
+
+    assert not store.profile_dir("ozon").exists()
+    assert store.profile_dir("yandex").exists()
+    assert store.launch_args() == [f"--disk-cache-size={64 * 1024 * 1024}"]
+
+
+def test_profile_resets_when_proxy_changes(tmp_path):
+    store = BrowserProfileStore(tmp_path, clock=FakeClock())
+
+    store.prepare("ozon-0", "http://10.0.0.1:8080")
+    (store.profile_dir("ozon-0") / "Cookies").write_bytes(b"cookie")
+    fingerprint = store.prepare("ozon-0", "http://10.0.0.1:8080")
+    assert (store.profile_dir("ozon-0") / "Cookies").exists()
+    assert "proxy" not in fingerprint
+
+    store.prepare("ozon-0", "http://10.0.0.2:8080")
+    assert not (store.profile_dir("ozon-0") / "Cookies").exists()
@@ -0,0 +1,64 @@
+from enums.parse_errors import ParseError
+from enums.parse_records import ParseResult, ParseTask
+from bot.background_tasks.background_tasks import process_with_retries
+from config.config import ParserSettings
+
+
+def make_result(task, error):
+    price = None if error else 100
+    return ParseResult(task.user_id, task.product_id, price, None, task.min_price, error, task.target_price, task.url)
+
+
+async def test_process_with_retries_repeats_only_transient_errors():
+    tasks = [
+        ParseTask(1, 1, "https://example.com/1", None, 100),
+        ParseTask(1, 2, "https://example.com/2", None, 100),
+        ParseTask(1, 3, "https://example.com/3", None, 100),
+    ]
+    # product_id -> ошибки по попыткам
+    outcomes = {
+        1: [None],
+        2: [ParseError.TIMEOUT, ParseError.BLOCKED, None],
+        3: [ParseError.NOT_FOUND],
+    }
+    calls = []
+
+    async def process_func(marketplace_tasks, context, **runner_options):
+        calls.append([task.product_id for task in marketplace_tasks])
+        return [make_result(task, outcomes[task.product_id].pop(0)) for task in marketplace_tasks]
+
+    settings = ParserSettings(retry_attempts=2, retry_backoff_seconds=0)
+    results = await process_with_retries(process_func, tasks, None, settings)
+
+    assert calls == [[1, 2, 3], [2], [2]]
+    errors = {result.product_id: result.last_error for result in results}
+    assert errors == {1: None, 2: None, 3: ParseError.NOT_FOUND}
+
+
+async def test_process_with_retries_keeps_last_transient_error():
+    tasks = [ParseTask(1, 1, "https://example.com/1", None, 100)]
+
+    async def process_func(marketplace_tasks, context, **runner_options):
+        return [make_result(task, ParseError.TIMEOUT) for task in marketplace_tasks]
+
+    settings = ParserSettings(retry_attempts=1, retry_backoff_seconds=0)
+    results = await process_with_retries(process_func, tasks, None, settings)
+
+    assert len(results) == 1
+    assert results[0].last_error == ParseError.TIMEOUT
+
+
+async def test_process_with_retries_can_start_from_first_retry():
+    tasks = [ParseTask(1, 1, "https://example.com/1", None, 100)]
+    calls = []
+
+    async def process_func(marketplace_tasks, context, **runner_options):
+        calls.append(len(marketplace_tasks))
+        return [make_result(task, ParseError.TIMEOUT) for task in marketplace_tasks]
+
+    settings = ParserSettings(retry_attempts=2, retry_backoff_seconds=0)
+    results = await process_with_retries(process_func, tasks, None, settings, first_attempt=1)
+
+    # Первая попытка уже сделана вызывающим: остаются только два повтора
+    assert calls == [1, 1]
+    assert results[0].last_error == ParseError.TIMEOUT
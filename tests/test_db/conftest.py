@@ -1,6 +1,8 @@
 import pytest_asyncio
 import asyncpg
 from config.config import Config, load_config
+from migration.migrator import migrate
+from migration.versions import MIGRATIONS
 
 
 @pytest_asyncio.fixture(scope='package')
@@ -22,52 +24,20 @@ async def db_pool():
 async def setup_db(db_pool):
     async with db_pool.acquire() as connection:
         try:
-            await connection.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id BIGSERIAL PRIMARY KEY,
-                    telegram_id BIGINT UNIQUE NOT NULL,
-                    chat_id BIGINT UNIQUE NOT NULL,
-                    username VARCHAR(64),
-                    language VARCHAR(8),
-                    role VARCHAR(16) DEFAULT 'user',
-                    is_alive BOOLEAN DEFAULT TRUE,
-                    banned BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMPTZ DEFAULT now(),
-                    updated_at TIMESTAMPTZ DEFAULT now()
-                );
-            """)
-            await connection.execute("""
-                CREATE TABLE IF NOT EXISTS activity (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL REFERENCES users(telegram_id) ON DELETE CASCADE,
-                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-                    activity_date DATE NOT NULL DEFAULT CURRENT_DATE,
-                    actions INT NOT NULL DEFAULT 1
-                );
-                CREATE UNIQUE INDEX IF NOT EXISTS idx_activity_user_day ON activity (user_id, activity_date);
-            """)
-            await connection.execute("""
-                CREATE TABLE IF NOT EXISTS products (
-                    product_id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL REFERENCES users(telegram_id) ON DELETE CASCADE,
-                    marketplace VARCHAR(32) NOT NULL,
-                    product_name VARCHAR(255),
-                    product_url TEXT NOT NULL,
-                    target_price INTEGER NOT NULL CHECK (target_price > 0),
-                    current_price INTEGER,
-                    min_price INTEGER,
-                    is_active BOOLEAN DEFAULT TRUE,
-                    last_checked TIMESTAMPTZ,
-                    last_error TEXT,
-                    created_at TIMESTAMPTZ DEFAULT now(),
-                    updated_at TIMESTAMPTZ DEFAULT now()
-                );
-            """)
+            await migrate(connection, MIGRATIONS)
             yield  # После yield идут тесты
         finally:
+            await connection.execute("DROP TABLE IF EXISTS price_history_daily CASCADE;")
+            await connection.execute("DROP TABLE IF EXISTS price_history CASCADE;")
+            await connection.execute("DROP FUNCTION IF EXISTS price_history_daily_rollup();")
+            await connection.execute("DROP TABLE IF EXISTS subscriptions CASCADE;")
+            await connection.execute("DROP TABLE IF EXISTS listing_state CASCADE;")
+            await connection.execute("DROP TABLE IF EXISTS listings CASCADE;")
+            await connection.execute("DROP TABLE IF EXISTS products_legacy CASCADE;")
             await connection.execute("DROP TABLE IF EXISTS products CASCADE;")
             await connection.execute("DROP TABLE IF EXISTS activity CASCADE;")
             await connection.execute("DROP TABLE IF EXISTS users CASCADE;")
+            await connection.execute("DROP TABLE IF EXISTS schema_migrations;")
 
 import pytest
 
@@ -75,7 +45,7 @@ import pytest
 async def clean_users_table(db_pool):
     async with db_pool.acquire() as conn:
         # Очистка таблиц до теста
-        await conn.execute("TRUNCATE TABLE users, activity, products RESTART IDENTITY CASCADE;")
+        await conn.execute("TRUNCATE TABLE users, activity, listings, subscriptions, price_history RESTART IDENTITY CASCADE;")
         yield
         # Очистка таблиц после теста
-        await conn.execute("TRUNCATE TABLE users, activity, products RESTART IDENTITY CASCADE;")
+        await conn.execute("TRUNCATE TABLE users, activity, listings, subscriptions, price_history RESTART IDENTITY CASCADE;")
@@ -0,0 +1,363 @@
+"""
+Нагрузочный прогон обхода без браузера.
+
+База засевается пользователями и товарами, затем `scheduled_task` выполняется целиком:
+планировщик, пул контекстов, SSR-извлечение, запись результатов и уведомления.
+Вместо Playwright подставляется поддельный источник контекстов: вкладки отдают
+синтетический HTML товара с заданными распределениями задержки и ошибок, вместо
+Telegram — заглушка бота. Замеряются длительность обхода, число запросов к БД,
+ожидание соединений пула и уведомления в секунду.
+"""
+import asyncio
+import contextlib
+import dataclasses
+import json
+import math
+import random
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Optional
+
+import asyncpg
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+import bot.background_tasks.background_tasks as background_tasks
+import bot.db_pool_singleton.db_pool_singleton as global_pool
+from bot.background_tasks.background_tasks import BrowserBackend, scheduled_task
+from config.config import DatabaseSettings, ParserSettings
+from database.product_key import canonical_product_key
+
+MARKETPLACE_URLS = {
+    "wildberries": "https://www.wildberries.ru/catalog/{sku}/detail.aspx",
+    "ozon": "https://www.ozon.ru/product/{sku}/",
+    "joom": "https://www.joom.ru/ru/products/{sku}",
+    "yandex": "https://market.yandex.ru/product/{sku}",
+}
+SKU_RE = re.compile(r"(\d+)")
+ERROR_STATUSES = {"blocked": 403, "not_found": 404, "server_error": 503}
+
+
+def product_price(sku: int) -> int:
+    return 500 + sku * 7919 % 5000
+
+
+def product_html(sku: int) -> str:
+    data = {"@type": "Product", "name": f"Товар {sku}", "offers": {"price": product_price(sku)}}
+    return (
+        f'<html><head><title>Товар {sku}</title><script type="application/ld+json">'
+        f'{json.dumps(data, ensure_ascii=False)}</script></head>'
+        f'<body><h1>Товар {sku}</h1></body></html>'
+    )
+
+
+@dataclass
+class FakeMarketplace:
+    """
+    Распределения поддельного маркетплейса: логнормальная задержка страницы
+    и доли исходов (блокировка, отсутствие товара, таймаут, ошибка сервера).
+    """
+    latency_median: float = 0.02
+    latency_sigma: float = 0.5
+    blocked_rate: float = 0.0
+    not_found_rate: float = 0.0
+    timeout_rate: float = 0.0
+    server_error_rate: float = 0.0
+
+    def sample_outcome(self, rng: random.Random) -> str:
+        roll = rng.random()
+        for outcome, rate in (
+            ("blocked", self.blocked_rate),
+            ("not_found", self.not_found_rate),
+            ("timeout", self.timeout_rate),
+            ("server_error", self.server_error_rate),
+        ):
+            if roll < rate:
+                return outcome
+            roll -= rate
+        return "ok"
+
+    def sample_latency(self, rng: random.Random) -> float:
+        return rng.lognormvariate(math.log(self.latency_median), self.latency_sigma)
+
+
+@dataclass
+class FakeBrowserStats:
+    contexts: int = 0
+    pages: int = 0
+    requests: int = 0
+    outcomes: Counter = field(default_factory=Counter)
+
+
+class FakeResponse:
+    def __init__(self, status: int, url: str, html: str):
+        self.status = status
+        self.url = url
+        self._html = html
+
+    @property
+    def ok(self) -> bool:
+        return self.status < 400
+
+    async def text(self) -> str:
+        return self._html
+
+
+class FakeRequest:
+    def __init__(self, page: "FakePage"):
+        self.page = page
+
+    async def get(self, url: str, **kwargs) -> FakeResponse:
+        return await self.page.serve(url)
+
+
+class FakePage:
+    """
+    Вкладка поддельного контекста. Исход страницы выбирается при первом запросе адреса
+    и повторяется, если парсер после SSR-запроса переходит на тот же адрес.
+    """
+
+    def __init__(self, marketplace: FakeMarketplace, rng: random.Random, stats: FakeBrowserStats):
+        self.marketplace = marketplace
+        self.rng = rng
+        self.stats = stats
+        self.url = "about:blank"
+        self.request = FakeRequest(self)
+        self.closed = False
+        self._outcomes: dict[str, str] = {}
+        self._html = ""
+
+    async def serve(self, url: str) -> FakeResponse:
+        outcome = self._outcomes.setdefault(url, self.marketplace.sample_outcome(self.rng))
+        self.stats.requests += 1
+        self.stats.outcomes[outcome] += 1
+        await asyncio.sleep(self.marketplace.sample_latency(self.rng))
+        if outcome == "timeout":
+            raise PlaywrightTimeoutError(f"Timeout loading {url}")
+        self._html = product_html(int(SKU_RE.search(url).group(1)))
+        return FakeResponse(ERROR_STATUSES.get(outcome, 200), url, self._html)
+
+    async def goto(self, url: str, **kwargs) -> Optional[FakeResponse]:
+        if url == "about:blank":
+            self.url = url
+            self._outcomes.clear()
+            return None
+        response = await self.serve(url)
+        self.url = url
+        return response
+
+    async def evaluate(self, script: str):
+        return 0 if "usedJSHeapSize" in script else None
+
+    async def content(self) -> str:
+        return self._html
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+class FakeContext:
+    def __init__(self, marketplace: FakeMarketplace, rng: random.Random, stats: FakeBrowserStats):
+        self.marketplace = marketplace
+        self.rng = rng
+        self.stats = stats
+        self.pages: list[FakePage] = []
+        stats.contexts += 1
+
+    async def new_page(self) -> FakePage:
+        page = FakePage(self.marketplace, self.rng, self.stats)
+        self.pages.append(page)
+        self.stats.pages += 1
+        return page
+
+    async def close(self) -> None:
+        for page in self.pages:
+            page.closed = True
+
+
+def fake_browser_backend(marketplaces: dict[str, FakeMarketplace], stats: FakeBrowserStats, *, seed: int = 0):
+    rng = random.Random(seed)
+
+    @contextlib.asynccontextmanager
+    async def backend(settings: ParserSettings):
+        async def launch_context(marketplace: str, index: int, *, fresh: bool = False, proxy=None):
+            return FakeContext(marketplaces.get(marketplace, FakeMarketplace()), rng, stats)
+
+        async def new_hedge_context(proxy=None):
+            return FakeContext(FakeMarketplace(), rng, stats)
+
+        yield BrowserBackend(launch_context=launch_context, new_hedge_context=new_hedge_context)
+
+    return backend
+
+
+class StubBot:
+    """
+    Заглушка Telegram API: сообщения не отправляются, запоминается время каждого.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.sent: list[float] = []
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(time.monotonic())
+
+
+class InstrumentedPool:
+    """
+    Обёртка пула asyncpg: считает выдачи соединений и время ожидания свободного соединения.
+    """
+
+    def __init__(self, pool: asyncpg.Pool):
+        self.pool = pool
+        self.acquires = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        started = time.perf_counter()
+        async with self.pool.acquire() as conn:
+            wait = time.perf_counter() - started
+            self.acquires += 1
+            self.wait_seconds += wait
+            self.max_wait_seconds = max(self.max_wait_seconds, wait)
+            yield conn
+
+
+async def seed_products(
+    conn: asyncpg.Connection,
+    count: int,
+    *,
+    marketplaces: tuple[str, ...] = tuple(MARKETPLACE_URLS),
+    notify_every: int = 10,
+    subscribers: int = 1,
+) -> int:
+    """
+    Засевает `count` карточек, на каждую из которых подписаны `subscribers` пользователей.
+    Целевая цена подписок каждой `notify_every`-й карточки выше её цены, так что по ним
+    уйдут уведомления. Возвращает число ожидаемых уведомлений.
+    """
+    await conn.copy_records_to_table(
+        "users",
+        records=[(user_id, user_id, f"user{user_id}") for user_id in range(1, count * subscribers + 1)],
+        columns=["telegram_id", "chat_id", "username"],
+    )
+    listings = []
+    subscriptions = []
+    for sku in range(1, count + 1):
+        marketplace = marketplaces[sku % len(marketplaces)]
+        url = MARKETPLACE_URLS[marketplace].format(sku=sku)
+        listings.append((sku, marketplace, canonical_product_key(marketplace, url), url))
+        price = product_price(sku)
+        target_price = price + 1 if sku % notify_every == 0 else max(price // 2, 1)
+        for offset in range(subscribers):
+            subscriptions.append(((sku - 1) * subscribers + offset + 1, sku, target_price))
+    await conn.copy_records_to_table(
+        "listings",
+        records=listings,
+        columns=["listing_id", "marketplace", "product_key", "product_url"],
+    )
+    await conn.copy_records_to_table(
+        "listing_state",
+        records=[(listing_id, marketplace) for listing_id, marketplace, *_ in listings],
+        columns=["listing_id", "marketplace"],
+    )
+    await conn.copy_records_to_table(
+        "subscriptions",
+        records=subscriptions,
+        columns=["user_id", "listing_id", "target_price"],
+    )
+    await conn.execute("ANALYZE users; ANALYZE listings; ANALYZE listing_state; ANALYZE subscriptions;")
+    return count // notify_every * subscribers
+
+
+def load_settings(artifacts_dir: str, **overrides) -> ParserSettings:
+    """
+    Настройки обхода для нагрузочного прогона: SSR всегда включён, без страховочных попыток,
+    пауз между повторами и сброса задач планировщиком.
+    """
+    settings = ParserSettings(
+        retry_backoff_seconds=0,
+        sweep_interval_minutes=10 ** 6,
+        hedge_budget_ratio=0,
+        page_budget_seconds=30,
+        ssr_mode={marketplace: "on" for marketplace in MARKETPLACE_URLS},
+        artifacts_dir=artifacts_dir,
+        artifacts_success_rate=0,
+    )
+    return dataclasses.replace(settings, **overrides)
+
+
+def reset_sweep_state() -> None:
+    """
+    Сбрасывает состояние, которое обход хранит между запусками (предохранители, ограничители, пулы).
+    """
+    for registry in (
+        background_tasks.breakers,
+        background_tasks.limiters,
+        background_tasks.latencies,
+        background_tasks.ssr_trackers,
+    ):
+        registry.clear()
+    background_tasks.profile_store = None
+    background_tasks.proxy_pool = None
+    background_tasks.artifact_store = None
+
+
+async def run_sweep_load(
+    db: DatabaseSettings,
+    settings: ParserSettings,
+    marketplaces: dict[str, FakeMarketplace],
+    *,
+    pool_size: int = 10,
+    bot_delay: float = 0.0,
+    seed: int = 0,
+) -> dict:
+    """
+    Выполняет один обход по уже засеянной базе и возвращает метрики прогона.
+    """
+    queries = Counter()
+
+    async def init(conn: asyncpg.Connection) -> None:
+        conn.add_query_logger(lambda record: queries.update([record.query.split()[0].upper()]))
+
+    raw_pool = await asyncpg.create_pool(
+        user=db.user, password=db.password, database=db.name, host=db.host, port=db.port,
+        min_size=1, max_size=pool_size, init=init,
+    )
+    pool = InstrumentedPool(raw_pool)
+    stub_bot = StubBot(bot_delay)
+    stats = FakeBrowserStats()
+    saved = (global_pool.db_pool_global, global_pool.bot_instance, global_pool.parser_settings)
+
+    reset_sweep_state()
+    global_pool.db_pool_global, global_pool.bot_instance, global_pool.parser_settings = pool, stub_bot, settings
+    started = time.monotonic()
+    try:
+        await scheduled_task(browser_backend=fake_browser_backend(marketplaces, stats, seed=seed))
+        sweep_seconds = time.monotonic() - started
+    finally:
+        global_pool.db_pool_global, global_pool.bot_instance, global_pool.parser_settings = saved
+        reset_sweep_state()
+        await raw_pool.close()
+
+    round_trips = sum(queries.values())
+    return {
+        "sweep_seconds": round(sweep_seconds, 2),
+        "pages_requested": stats.requests,
+        "page_outcomes": dict(stats.outcomes),
+        "contexts_opened": stats.contexts,
+        "db_round_trips": round_trips,
+        "db_round_trips_by_statement": dict(queries),
+        "db_round_trips_per_page": round(round_trips / stats.requests, 2) if stats.requests else 0.0,
+        "pool_acquires": pool.acquires,
+        "pool_wait_seconds": round(pool.wait_seconds, 3),
+        "pool_max_wait_seconds": round(pool.max_wait_seconds, 3),
+        "notifications": len(stub_bot.sent),
+        "notifications_per_second": round(len(stub_bot.sent) / sweep_seconds, 2) if sweep_seconds else 0.0,
+    }
@@ -0,0 +1,125 @@
+import pytest
+
+from migration.migrator import Migration, migrate
+from migration.versions import MIGRATIONS, initial_schema, listing_state, listings_and_subscriptions
+
+
+async def test_migrations_are_recorded_and_idempotent(db_pool):
+    async with db_pool.acquire() as connection:
+        # Схема уже применена фикстурой setup_db
+        assert await migrate(connection, MIGRATIONS) == []
+        versions = await connection.fetch("SELECT version, name FROM schema_migrations ORDER BY version;")
+        indexes = await connection.fetch(
+            """
+            SELECT c.relname, i.indisvalid
+            FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname LIKE 'idx_%';
+            """
+        )
+
+    assert [(row["version"], row["name"]) for row in versions] == [
+        (migration.version, migration.name) for migration in MIGRATIONS
+    ]
+    assert {row["relname"] for row in indexes} >= {
+        "idx_users_username",
+        "idx_activity_date_user",
+        "idx_listing_state_failed",
+        "idx_listing_state_marketplace_sweep",
+        "idx_subscriptions_user",
+        "idx_subscriptions_listing",
+        "idx_price_history_recorded_at",
+        "idx_price_history_listing",
+    }
+    assert all(row["indisvalid"] for row in indexes)
+    # Таблица товаров до разделения удалена вместе с её индексами, индекс обхода по listing_id заменён
+    assert not {row["relname"] for row in indexes} & {
+        "idx_products_sweep", "idx_products_failed_marketplace", "idx_listing_state_sweep",
+    }
+
+
+async def test_migrate_applies_pending_versions_up_to_target(db_pool):
+    calls = []
+
+    async def upgrade(conn):
+        calls.append(await conn.fetchval("SELECT 1;"))
+
+    pending = [Migration(1001, "first", upgrade), Migration(1002, "second", upgrade, transactional=False)]
+    async with db_pool.acquire() as connection:
+        try:
+            assert await migrate(connection, pending, target=1001) == [1001]
+            assert await migrate(connection, pending) == [1002]
+            assert await migrate(connection, pending) == []
+        finally:
+            await connection.execute("DELETE FROM schema_migrations WHERE version > 1000;")
+
+    assert calls == [1, 1]
+
+
+async def test_failed_transactional_migration_is_not_recorded(db_pool):
+    async def broken(conn):
+        await conn.execute("CREATE TABLE migration_probe (id INT);")
+        raise RuntimeError("boom")
+
+    async with db_pool.acquire() as connection:
+        with pytest.raises(RuntimeError):
+            await migrate(connection, [Migration(1003, "broken", broken)])
+        recorded = await connection.fetchval("SELECT count(*) FROM schema_migrations WHERE version = 1003;")
+        probe = await connection.fetchval("SELECT to_regclass('migration_probe');")
+
+    assert recorded == 0
+    assert probe is None
+
+
+async def test_duplicate_versions_are_rejected(db_pool):
+    async def noop(conn):
+        pass
+
+    async with db_pool.acquire() as connection:
+        with pytest.raises(ValueError):
+            await migrate(connection, [Migration(1, "a", noop), Migration(1, "b", noop)])
+
+
+async def test_products_are_split_into_listings_and_subscriptions(db_pool):
+    async with db_pool.acquire() as connection:
+        transaction = connection.transaction()
+        await transaction.start()
+        try:
+            # Схема в состоянии до миграции 3 — в отдельной схеме, откатывается вместе с транзакцией
+            await connection.execute("CREATE SCHEMA migration_probe; SET LOCAL search_path TO migration_probe;")
+            await initial_schema(connection)
+            await connection.execute("""
+                INSERT INTO users (telegram_id, chat_id) VALUES (1, 1), (2, 2);
+                INSERT INTO products (product_id, user_id, marketplace, product_url, target_price,
+                                      current_price, min_price, is_active, last_checked, last_error)
+                VALUES
+                    (10, 1, 'wildberries', 'https://www.wildberries.ru/catalog/42/detail.aspx', 100,
+                     500, 450, TRUE, now() - interval '1 hour', NULL),
+                    (11, 2, 'wildberries', 'https://wildberries.ru/catalog/42/detail.aspx?size=1', 300,
+                     480, 470, TRUE, now(), NULL),
+                    (12, 2, 'ozon', 'https://www.ozon.ru/product/item-7/', 200,
+                     NULL, NULL, FALSE, NULL, NULL);
+            """)
+            await listings_and_subscriptions(connection)
+            await listing_state(connection)
+
+            listings = await connection.fetch(
+                "SELECT listing_id, product_key, current_price, min_price FROM listing_details ORDER BY listing_id;"
+            )
+            subscriptions = await connection.fetch(
+                "SELECT product_id, user_id, listing_id, is_active FROM subscriptions ORDER BY product_id;"
+            )
+            next_product_id = await connection.fetchval(
+                "SELECT nextval(pg_get_serial_sequence('subscriptions', 'product_id'));"
+            )
+            renamed = await connection.fetchval("SELECT to_regclass('products_legacy') IS NOT NULL;")
+            fillfactor = await connection.fetchval(
+                "SELECT reloptions FROM pg_class WHERE oid = 'listing_state'::regclass;"
+            )
+        finally:
+            await transaction.rollback()
+
+    assert [tuple(row) for row in listings] == [(1, "42", 480, 450), (2, "7", None, None)]
+    assert [tuple(row) for row in subscriptions] == [(10, 1, 1, True), (11, 2, 1, True), (12, 2, 2, False)]
+    assert next_product_id == 13
+    assert renamed
+    assert fillfactor == ["fillfactor=70"]
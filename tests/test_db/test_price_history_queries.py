@@ -0,0 +1,108 @@
+from datetime import date, datetime, timedelta, timezone
+
+import utility_functions
+from database import db
+from enums.parse_records import ListingWriteBatch
+
+
+async def add_listing_with_subscriber(connection, user_id: int = 1) -> None:
+    await utility_functions.add_user_test_default_test(conn=connection, telegram_id=user_id)
+    await utility_functions.add_product_test(
+        conn=connection,
+        user_id=user_id,
+        product_name="product1",
+        product_url="http://example.com/product1",
+        target_price=100,
+        marketplace="Market1",
+    )
+
+
+async def test_price_point_is_written_only_when_price_changes(db_pool):
+    async with db_pool.acquire() as connection:
+        await add_listing_with_subscriber(connection)
+        changed = []
+        for price in (300, 300, 250, 250, 280):
+            price_changed = await db.products.change_listings_details_after_parsing(
+                conn=connection, batch=ListingWriteBatch(
+                    [1], [price], ["product1"], [price], [None],
+                ),
+            )
+            changed.append(price_changed == [1])
+            if price_changed:
+                await db.price_history.add_price_points(conn=connection, points=[(1, price)])
+        points = await connection.fetch("SELECT price FROM price_history WHERE listing_id = 1 ORDER BY recorded_at")
+
+    assert changed == [True, False, True, False, True]
+    assert [row["price"] for row in points] == [300, 250, 280]
+
+
+async def test_partitions_are_created_per_month(db_pool):
+    async with db_pool.acquire() as connection:
+        await add_listing_with_subscriber(connection)
+        created = await db.price_history.ensure_price_history_partitions(
+            conn=connection, months=3, today=date(2031, 11, 15),
+        )
+        again = await db.price_history.ensure_price_history_partitions(
+            conn=connection, months=3, today=date(2031, 11, 15),
+        )
+        await connection.execute(
+            "INSERT INTO price_history (listing_id, price, recorded_at) VALUES (1, 100, '2032-01-31 23:59+00')"
+        )
+        partition = await connection.fetchval("SELECT tableoid::regclass::text FROM price_history")
+        for name in created:
+            await connection.execute(f"DROP TABLE {name};")
+
+    assert created == ["price_history_2031_11", "price_history_2031_12", "price_history_2032_01"]
+    assert again == []
+    assert partition == "price_history_2032_01"
+
+
+async def test_price_series_and_trends_are_downsampled(db_pool):
+    now = datetime.now(timezone.utc)
+    async with db_pool.acquire() as connection:
+        await add_listing_with_subscriber(connection)
+        await db.price_history.ensure_price_history_partitions(
+            conn=connection, months=3, today=(now - timedelta(days=40)).date(),
+        )
+        await connection.executemany(
+            "INSERT INTO price_history (listing_id, price, recorded_at) VALUES (1, $1, $2)",
+            [
+                (500, now - timedelta(days=40)),
+                (400, now - timedelta(days=2, hours=3)),
+                (450, now - timedelta(days=2, hours=1)),
+                (420, now - timedelta(hours=1)),
+            ],
+        )
+        series = await db.price_history.get_price_series(
+            conn=connection, listing_id=1, since=now - timedelta(days=3), bucket=timedelta(days=1),
+        )
+        trends = await db.price_history.get_user_price_trends(conn=connection, user_id=1, days=30)
+
+    assert [(low, high, last) for _, low, high, last in series] == [(400, 450, 450), (420, 420, 420)]
+    # Период начинается с цены 500, записанной до него
+    assert trends == {1: (500, 420, 400, 500, 3)}
+
+
+async def test_price_history_is_deleted_with_listing(db_pool):
+    async with db_pool.acquire() as connection:
+        await add_listing_with_subscriber(connection)
+        await db.price_history.add_price_points(conn=connection, points=[(1, 300), (1, 250)])
+        await db.products.delete_product_by_id(conn=connection, product_id=1)
+        points = await connection.fetchval("SELECT count(*) FROM price_history")
+        days = await connection.fetchval("SELECT count(*) FROM price_history_daily")
+
+    assert points == 0
+    assert days == 0
+
+
+async def test_price_points_are_rolled_up_by_day(db_pool):
+    async with db_pool.acquire() as connection:
+        await add_listing_with_subscriber(connection)
+        await db.price_history.add_price_points(conn=connection, points=[(1, 300), (1, 250)])
+        await db.price_history.add_price_points(conn=connection, points=[(1, 270)])
+        rows = await connection.fetch(
+            "SELECT last_price, min_price, max_price, changes FROM price_history_daily WHERE listing_id = 1"
+        )
+
+    # Обе команды COPY попали в одну строку свёртки за сегодня
+    assert [tuple(row) for row in rows] == [(270, 250, 300, 3)]
@@ -0,0 +1,19 @@
+import pytest
+
+from database.product_key import canonical_product_key
+
+
+@pytest.mark.parametrize(
+    "marketplace, url, expected",
+    [
+        ("wildberries", "https://www.wildberries.ru/catalog/12345/detail.aspx?targetUrl=GP", "12345"),
+        ("ozon", "https://www.ozon.ru/product/chaynik-elektricheskiy-2490123/?from=share", "2490123"),
+        ("ozon", "https://ozon.ru/product/2490123", "2490123"),
+        ("yandex", "https://market.yandex.ru/product--smartfon/1779990110?sku=1", "1779990110"),
+        ("yandex", "https://market.yandex.ru/card/smartfon/102938?do-waremd5=x", "card/102938"),
+        ("joom", "https://www.joom.ru/ru/products/5F0C8B1E9A7D4C001B2E3F4A", "5f0c8b1e9a7d4c001b2e3f4a"),
+        ("joom", "https://m.Joom.com/en/collections/new/?a=1#top", "joom.com/en/collections/new"),
+    ]
+)
+def test_canonical_product_key(marketplace, url, expected):
+    assert canonical_product_key(marketplace, url) == expected
@@ -1,6 +1,10 @@
 import utility_functions
 from database import db
 import pytest
+from datetime import datetime, timedelta, timezone
+
+from enums.parse_errors import ParseError
+from enums.parse_records import ListingWriteBatch, ParseResult
 
 @pytest.mark.parametrize(
     "user_id, marketplace, product_url, target_price",
@@ -284,22 +288,22 @@ async def test_get_products_items_for_parsing(db_pool, products, expected_distri
             )
 
         # Запрашиваем продукты для парсинга
-        rows = await db.products.get_products_items_for_parsing(conn=connection)
+        rows = await utility_functions.get_sweep_listings_test(conn=connection)
 
     assert rows is not None
     assert len(rows) == expected_distribution
 
     # Проверяем соответствие каждого продукта по нужным полям
-    for expected_product, actual_row in zip(products, rows):
+    for listing_id, (expected_product, actual_row) in enumerate(zip(products, rows), start=1):
         _, expected_url, expected_price, expected_marketplace = expected_product
         
-        actual_user_id = actual_row[0]      # user_id
-        actual_product_url = actual_row[2]  # product_url
-        actual_marketplace = actual_row[3]  # marketplace
-        actual_min_price = actual_row[4]    # min_price
-        actual_target_price = actual_row[5] # target_price
+        actual_listing_id = actual_row.listing_id
+        actual_product_url = actual_row.product_url
+        actual_marketplace = actual_row.marketplace
+        actual_min_price = actual_row.min_price
+        actual_target_price = actual_row.target_price
         
-        assert actual_user_id == 1
+        assert actual_listing_id == listing_id
         assert expected_url == actual_product_url
         assert expected_marketplace == actual_marketplace
         assert actual_min_price == None
@@ -307,14 +311,14 @@ async def test_get_products_items_for_parsing(db_pool, products, expected_distri
         
 
 @pytest.mark.parametrize(
-    "product_name, product_url, target_price, marketplace, is_active, current_price, updated_product_name, min_price, last_error, updated_is_active",
+    "product_name, product_url, target_price, marketplace, current_price, updated_product_name, min_price, last_error",
     [
-        ("product1", "http://example.com/product1", 100, "Market1", True, 200, "updated_product1", 150, None, True),
-        ("product2", "http://example.com/product2", 200, "Market2", False, 300, "updated_product2", 300, 'error', False),
-        ("product3", "http://example.com/product3", 300, "Market3", True,  200, "updated_product3", 190, None, True),
+        ("product1", "http://example.com/product1", 100, "Market1", 200, "updated_product1", 150, None),
+        ("product2", "http://example.com/product2", 200, "Market2", 300, "updated_product2", 300, 'error'),
+        ("product3", "http://example.com/product3", 300, "Market3", 200, "updated_product3", 190, None),
     ]
 )
-async def test_change_product_details_after_parsing(db_pool, product_name, product_url, target_price, marketplace, is_active, current_price, updated_product_name, min_price, last_error, updated_is_active):
+async def test_change_listings_details_after_parsing_one_listing(db_pool, product_name, product_url, target_price, marketplace, current_price, updated_product_name, min_price, last_error):
     async with db_pool.acquire() as connection:
         await utility_functions.add_user_test_default_test(conn=connection) # user_id = 1 по умолчанию
         await utility_functions.add_product_test(
@@ -323,27 +327,25 @@ async def test_change_product_details_after_parsing(db_pool, product_name, produ
             product_name=product_name,
             marketplace=marketplace,
             product_url=product_url,
-            is_active=is_active,
             target_price=target_price,
         )
 
-        await db.products.change_product_details_after_parsing(
-            conn=connection, 
-            product_id=1,  # product_id = 1 т.к. данные во всех таблицах стираются каждый тест, индексы обнуляются
-            current_price=current_price, 
-            product_name=updated_product_name, 
-            min_price=min_price, 
-            last_error=last_error, 
-            is_active=updated_is_active
-            )
+        # listing_id = 1 т.к. данные во всех таблицах стираются каждый тест, индексы обнуляются
+        await db.products.change_listings_details_after_parsing(
+            conn=connection, batch=ListingWriteBatch(
+                [1], [current_price], [updated_product_name], [min_price], [last_error],
+            ),
+        )
         
-        row = await utility_functions.get_product_after_parsing_test(conn=connection, user_id=1)
+        row = await utility_functions.get_listing_after_parsing_test(conn=connection, listing_id=1)
+        active = await db.products.get_user_active_products(conn=connection, user_id=1)
             
         assert row['current_price'] == current_price
         assert row['product_name'] == updated_product_name
         assert row['min_price'] == min_price
         assert row['last_error'] == last_error
-        assert row['is_active'] == updated_is_active
+        # Карточка с ошибкой пропадает из активных товаров подписчика
+        assert len(active) == (0 if last_error else 1)
         
 
 @pytest.mark.parametrize(
@@ -416,4 +418,349 @@ async def test_get_inactive_products_by_marketplace(db_pool, products, expected_
         row = await db.products.get_inactive_products_by_marketplace(conn=connection)
 
     assert row is not None
-    assert all(elem in row for elem in expected_distribution)     
\ No newline at end of file
+    assert all(elem in row for elem in expected_distribution)     
+
+@pytest.mark.parametrize(
+    "failures, expected_fail_count, expected_quarantined",
+    [
+        (1, 1, False),
+        (2, 2, False),
+        (3, 3, True),
+        (5, 5, True),
+    ]
+)
+async def test_register_listings_parsing_failures(db_pool, failures, expected_fail_count, expected_quarantined):
+    async with db_pool.acquire() as connection:
+        await utility_functions.add_user_test_default_test(conn=connection) # user_id = 1 по умолчанию
+        await utility_functions.add_product_test(
+            conn=connection,
+            user_id=1,
+            product_name="product1",
+            product_url="http://example.com/product1",
+            target_price=100,
+            marketplace="Market1",
+        )
+
+        for _ in range(failures):
+            [result] = await db.products.register_listings_parsing_failures(
+                conn=connection,
+                listing_ids=[1],
+                quarantine_after=3,
+                quarantine_minutes=60,
+                quarantine_max_minutes=180,
+            )
+
+        row = await utility_functions.get_listing_failure_state_test(conn=connection, listing_id=1)
+        rows = await utility_functions.get_sweep_listings_test(conn=connection)
+
+    assert result[:2] == (1, expected_fail_count)
+    assert row["fail_count"] == expected_fail_count
+    assert (row["next_check_at"] is not None) == expected_quarantined
+    # Временные ошибки не отключают товар
+    assert row["last_error"] is None
+    assert len(rows) == (0 if expected_quarantined else 1)
+
+
+async def test_quarantine_interval_is_capped(db_pool):
+    async with db_pool.acquire() as connection:
+        await utility_functions.add_user_test_default_test(conn=connection) # user_id = 1 по умолчанию
+        await utility_functions.add_product_test(
+            conn=connection,
+            user_id=1,
+            product_name="product1",
+            product_url="http://example.com/product1",
+            target_price=100,
+            marketplace="Market1",
+        )
+
+        for _ in range(10):
+            await db.products.register_listings_parsing_failures(
+                conn=connection,
+                listing_ids=[1],
+                quarantine_after=1,
+                quarantine_minutes=60,
+                quarantine_max_minutes=180,
+            )
+
+        delay = await connection.fetchval("SELECT next_check_at - now() FROM listing_state WHERE listing_id = 1")
+
+    assert delay <= timedelta(minutes=180)
+    assert delay > timedelta(minutes=179)
+
+
+async def test_register_listings_parsing_failures_in_one_query(db_pool):
+    async with db_pool.acquire() as connection:
+        await utility_functions.add_user_test_default_test(conn=connection) # user_id = 1 по умолчанию
+        for idx in (1, 2):
+            await utility_functions.add_product_test(
+                conn=connection,
+                user_id=1,
+                product_name=f"product{idx}",
+                product_url=f"http://example.com/product{idx}",
+                target_price=100,
+                marketplace="Market1",
+            )
+        await connection.execute("UPDATE listing_state SET fail_count = 2 WHERE listing_id = 2")
+
+        # Карточки 3 нет: она просто не попадает в результат
+        rows = await db.products.register_listings_parsing_failures(
+            conn=connection,
+            listing_ids=[1, 2, 3],
+            quarantine_after=3,
+            quarantine_minutes=60,
+            quarantine_max_minutes=180,
+        )
+
+    assert sorted((listing_id, fail_count, next_check_at is not None) for listing_id, fail_count, next_check_at in rows) == [
+        (1, 1, False), (2, 3, True),
+    ]
+
+
+async def test_successful_parsing_resets_failures(db_pool):
+    async with db_pool.acquire() as connection:
+        await utility_functions.add_user_test_default_test(conn=connection) # user_id = 1 по умолчанию
+        await utility_functions.add_product_test(
+            conn=connection,
+            user_id=1,
+            product_name="product1",
+            product_url="http://example.com/product1",
+            target_price=100,
+            marketplace="Market1",
+        )
+        for _ in range(3):
+            await db.products.register_listings_parsing_failures(
+                conn=connection,
+                listing_ids=[1],
+                quarantine_after=3,
+                quarantine_minutes=60,
+                quarantine_max_minutes=180,
+            )
+
+        await db.products.change_listings_details_after_parsing(
+            conn=connection, batch=ListingWriteBatch(
+                [1], [200], ["product1"], [200], [None],
+            ),
+        )
+
+        row = await utility_functions.get_listing_failure_state_test(conn=connection, listing_id=1)
+
+    assert row["fail_count"] == 0
+    assert row["next_check_at"] is None
+
+
+async def test_parsing_rewrites_listing_only_when_name_changes(db_pool):
+    async with db_pool.acquire() as connection:
+        await utility_functions.add_user_test_default_test(conn=connection) # user_id = 1 по умолчанию
+        await utility_functions.add_product_test(
+            conn=connection,
+            user_id=1,
+            product_name="product1",
+            product_url="http://example.com/product1",
+            target_price=100,
+            marketplace="Market1",
+        )
+        ctids = []
+        for price, name in ((200, "product1"), (190, "product1"), (190, "product1 new")):
+            await db.products.change_listings_details_after_parsing(
+                conn=connection, batch=ListingWriteBatch(
+                    [1], [price], [name], [price], [None],
+                ),
+            )
+            ctids.append(await connection.fetchval("SELECT ctid FROM listings WHERE listing_id = 1"))
+        row = await utility_functions.get_listing_after_parsing_test(conn=connection, listing_id=1)
+
+    # Цена меняется только в `listing_state`, строка `listings` переписывается лишь при смене названия
+    assert ctids[0] == ctids[1] != ctids[2]
+    assert (row["current_price"], row["product_name"]) == (190, "product1 new")
+
+
+async def test_get_products_items_for_parsing_skips_quarantined(db_pool):
+    async with db_pool.acquire() as connection:
+        await utility_functions.add_user_test_default_test(conn=connection) # user_id = 1 по умолчанию
+        for idx in range(1, 3):
+            await utility_functions.add_product_test(
+                conn=connection,
+                user_id=1,
+                product_name=f"product{idx}",
+                product_url=f"http://example.com/product{idx}",
+                target_price=100,
+                marketplace="Market1",
+            )
+        await utility_functions.set_listing_next_check_at_test(
+            conn=connection, listing_id=1, next_check_at=datetime.now(timezone.utc) + timedelta(hours=1)
+        )
+        await utility_functions.set_listing_next_check_at_test(
+            conn=connection, listing_id=2, next_check_at=datetime.now(timezone.utc) - timedelta(hours=1)
+        )
+
+        rows = await utility_functions.get_sweep_listings_test(conn=connection)
+
+    assert [row.listing_id for row in rows] == [2]
+
+
+async def test_same_product_of_several_users_is_one_listing(db_pool):
+    async with db_pool.acquire() as connection:
+        for user_id, url, target_price in (
+            (1, "https://www.wildberries.ru/catalog/12345/detail.aspx", 100),
+            (2, "https://wildberries.ru/catalog/12345/detail.aspx?targetUrl=GP", 300),
+            (3, "https://www.wildberries.ru/catalog/777/detail.aspx", 200),
+        ):
+            await utility_functions.add_user_test_default_test(conn=connection, telegram_id=user_id)
+            await connection.execute("UPDATE users SET chat_id = $1 WHERE telegram_id = $1", user_id)
+            await db.products.add_product(
+                conn=connection, user_id=user_id, marketplace="wildberries", product_url=url, target_price=target_price,
+            )
+
+        listings_count = await utility_functions.get_listings_count_test(conn=connection)
+        rows = await utility_functions.get_sweep_listings_test(conn=connection)
+        # Повторная вставка карточки тратит значение последовательности, поэтому номера берутся из задач
+        shared_id, other_id = rows[0].listing_id, rows[1].listing_id
+        await db.products.change_listings_details_after_parsing(
+            conn=connection, batch=ListingWriteBatch(
+                [shared_id], [250], ["Товар"], [250], [None],
+            ),
+        )
+        details = await db.products.get_user_products_with_details(conn=connection, user_id=1)
+        subscribers = await db.products.get_subscribers_to_notify(
+            conn=connection, prices={shared_id: 250, other_id: 150},
+        )
+
+    assert listings_count == 2
+    # Одна задача на карточку с наибольшей целевой ценой подписчиков
+    assert [(row.marketplace, row.target_price) for row in rows] == [("wildberries", 300), ("wildberries", 200)]
+    assert details[0][4] == 250
+    assert subscribers == [(shared_id, 2, 2, 300), (other_id, 3, 3, 200)]
+
+
+async def test_delete_last_subscription_removes_listing(db_pool):
+    async with db_pool.acquire() as connection:
+        for user_id in (1, 2):
+            await utility_functions.add_user_test_default_test(conn=connection, telegram_id=user_id)
+            await connection.execute("UPDATE users SET chat_id = $1 WHERE telegram_id = $1", user_id)
+            await db.products.add_product(
+                conn=connection, user_id=user_id, marketplace="ozon",
+                product_url="https://www.ozon.ru/product/chaynik-2490/", target_price=100,
+            )
+
+        await db.products.delete_product_by_id(conn=connection, product_id=1)
+        after_first = await utility_functions.get_listings_count_test(conn=connection)
+        await db.products.delete_product_by_id(conn=connection, product_id=2)
+        after_last = await utility_functions.get_listings_count_test(conn=connection)
+
+    assert after_first == 1
+    assert after_last == 0
+
+
+async def test_adding_missing_listing_again_resumes_checks(db_pool):
+    async with db_pool.acquire() as connection:
+        await utility_functions.add_user_test_default_test(conn=connection)
+        await utility_functions.add_product_test(
+            conn=connection, user_id=1, product_name="product1", product_url="http://example.com/product1",
+            target_price=100, last_error="NOT_FOUND", marketplace="Market1",
+        )
+        before = await utility_functions.get_sweep_listings_test(conn=connection)
+        await db.products.add_product(
+            conn=connection, user_id=1, marketplace="Market1", product_url="http://example.com/product1/",
+            target_price=100,
+        )
+        after = await utility_functions.get_sweep_listings_test(conn=connection)
+
+    assert before == []
+    assert [row.listing_id for row in after] == [1]
+
+
+async def test_touch_listings_checked_bumps_only_check_time(db_pool):
+    async with db_pool.acquire() as connection:
+        await utility_functions.add_user_test_default_test(conn=connection) # user_id = 1 по умолчанию
+        for idx in range(1, 3):
+            await utility_functions.add_product_test(
+                conn=connection,
+                user_id=1,
+                product_name=f"product{idx}",
+                product_url=f"http://example.com/product{idx}",
+                target_price=100,
+                marketplace="Market1",
+            )
+            await db.products.change_listings_details_after_parsing(
+                conn=connection, batch=ListingWriteBatch(
+                    [idx], [200], [f"product{idx}"], [200], [None],
+                ),
+            )
+        await connection.execute("UPDATE listing_state SET last_checked = now() - interval '1 day'")
+
+        await db.products.touch_listings_checked(conn=connection, listing_ids=[2])
+        rows = await connection.fetch(
+            "SELECT listing_id, current_price, last_checked > now() - interval '1 minute' AS fresh "
+            "FROM listing_state ORDER BY listing_id"
+        )
+
+    assert [tuple(row) for row in rows] == [(1, 200, False), (2, 200, True)]
+
+
+async def test_products_items_for_parsing_are_read_in_pages(db_pool):
+    async with db_pool.acquire() as connection:
+        await utility_functions.add_user_test_default_test(conn=connection) # user_id = 1 по умолчанию
+        for idx in range(1, 8):
+            await utility_functions.add_product_test(
+                conn=connection,
+                user_id=1,
+                product_name=f"product{idx}",
+                product_url=f"http://example.com/product{idx}",
+                target_price=100,
+                marketplace="Market1" if idx % 2 else "Market2",
+            )
+
+        counts = await db.products.count_products_items_for_parsing(conn=connection)
+        pages = []
+        after_listing_id = 0
+        while True:
+            page = await db.products.get_products_items_for_parsing_page(
+                conn=connection, marketplace="Market1", after_listing_id=after_listing_id, limit=3,
+            )
+            if not page:
+                break
+            pages.append([row.listing_id for row in page])
+            after_listing_id = page[-1].listing_id
+
+    assert counts == {"Market1": 4, "Market2": 3}
+    assert pages == [[1, 3, 5], [7]]
+
+
+async def test_change_listings_details_after_parsing_writes_batch(db_pool):
+    async with db_pool.acquire() as connection:
+        await utility_functions.add_user_test_default_test(conn=connection) # user_id = 1 по умолчанию
+        for idx in range(1, 4):
+            await utility_functions.add_product_test(
+                conn=connection,
+                user_id=1,
+                product_name=f"product{idx}",
+                product_url=f"http://example.com/product{idx}",
+                target_price=100,
+                marketplace="Market1",
+            )
+        await db.products.change_listings_details_after_parsing(
+            conn=connection, batch=ListingWriteBatch(
+                [1], [200], ["product1"], [200], [None],
+            ),
+        )
+
+        batch = ListingWriteBatch()
+        for result in (
+            ParseResult(None, 1, 200, "product1", 200, None, 100, "http://example.com/product1"),
+            ParseResult(None, 2, 150, "renamed", 150, None, 100, "http://example.com/product2"),
+            ParseResult(None, 3, None, None, None, ParseError.NOT_FOUND, 100, "http://example.com/product3"),
+        ):
+            batch.append(result)
+        price_changed = await db.products.change_listings_details_after_parsing(conn=connection, batch=batch)
+        rows = await connection.fetch(
+            "SELECT listing_id, current_price, min_price, product_name, last_error FROM listing_details "
+            "ORDER BY listing_id"
+        )
+
+    assert len(batch) == 3
+    assert price_changed == [2]
+    assert [tuple(row) for row in rows] == [
+        (1, 200, 200, "product1", None),
+        (2, 150, 150, "renamed", None),
+        (3, None, None, None, ParseError.NOT_FOUND.value),
+    ]
@@ -0,0 +1,39 @@
+import logging
+import os
+
+from tests.benchmarks.db_benchmark import CASES, Scale, database_functions, find_plan_regressions, run_benchmark
+
+# Масштаб по умолчанию небольшой; полный прогон — через python -m tests.benchmarks.db_benchmark
+SCALE = Scale(users=int(os.getenv("DB_BENCHMARK_USERS", "4000")), days=30)
+
+
+def test_every_database_function_is_benchmarked():
+    assert {case.name for case in CASES} == database_functions()
+
+
+async def test_hot_queries_use_indexes(db_pool, caplog):
+    caplog.set_level(logging.WARNING)
+    async with db_pool.acquire() as conn:
+        report = await run_benchmark(conn, SCALE, repeat=2)
+
+    assert report["scale"]["products"] == SCALE.products
+    # Точки истории цен пишутся командой COPY, у неё нет плана
+    assert all(
+        stats["plans"] for name, stats in report["functions"].items() if name != "price_history_table.add_price_points"
+    )
+    assert report["plan_regressions"] == []
+
+
+def test_plan_regression_reports_seq_scan_in_hot_query_only():
+    report = {"functions": {
+        "products_table.get_user_active_products": {
+            "hot": True, "plans": [{"query": "SELECT ... FROM products", "seq_scans": ["products"]}],
+        },
+        "users_table.get_total_users": {
+            "hot": False, "plans": [{"query": "SELECT COUNT(*) FROM users", "seq_scans": ["users"]}],
+        },
+    }}
+
+    assert find_plan_regressions(report) == [
+        "products_table.get_user_active_products: Seq Scan on products in `SELECT ... FROM products`"
+    ]
@@ -0,0 +1,94 @@
+import json
+import logging
+import os
+
+from config.config import load_config
+from enums.parse_errors import ParseError
+from tests.test_db import sweep_harness
+
+# Масштаб прогона: по умолчанию небольшой, для замеров — SWEEP_LOAD_PRODUCTS=100000
+PRODUCTS = int(os.getenv("SWEEP_LOAD_PRODUCTS", "400"))
+# Подписчиков на карточку: записи обхода растут с числом карточек, а не пользователей
+SUBSCRIBERS = int(os.getenv("SWEEP_LOAD_SUBSCRIBERS", "2"))
+
+
+async def test_sweep_load_end_to_end(db_pool, tmp_path, caplog):
+    caplog.set_level(logging.WARNING)
+    async with db_pool.acquire() as conn:
+        expected_notifications = await sweep_harness.seed_products(conn, PRODUCTS, subscribers=SUBSCRIBERS)
+
+    marketplaces = {
+        "wildberries": sweep_harness.FakeMarketplace(blocked_rate=0.01),
+        "ozon": sweep_harness.FakeMarketplace(not_found_rate=0.02),
+        "joom": sweep_harness.FakeMarketplace(timeout_rate=0.01),
+        "yandex": sweep_harness.FakeMarketplace(server_error_rate=0.01),
+    }
+    settings = sweep_harness.load_settings(str(tmp_path / "artifacts"))
+    report = await sweep_harness.run_sweep_load(load_config(".env.test").db, settings, marketplaces)
+
+    if os.getenv("SWEEP_LOAD_REPORT"):
+        with open(os.environ["SWEEP_LOAD_REPORT"], "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    async with db_pool.acquire() as conn:
+        checked = await conn.fetchval("SELECT count(*) FROM listing_state WHERE last_checked IS NOT NULL")
+        not_found = await conn.fetchval(
+            "SELECT count(*) FROM listing_state WHERE last_error = $1", ParseError.NOT_FOUND.value
+        )
+
+    assert checked == PRODUCTS
+    # Каждая карточка запрошена хотя бы раз, повторы временных ошибок — сверх этого
+    assert report["pages_requested"] >= PRODUCTS
+    assert sum(report["page_outcomes"].values()) == report["pages_requested"]
+    assert report["contexts_opened"] >= len(marketplaces)
+    # Ответ 404 на SSR-запрос подтверждается браузером: отсутствующий товар запрашивается дважды
+    assert 2 * not_found == report["page_outcomes"].get("not_found", 0)
+    # Уведомления уходят только по товарам, разобранным успешно
+    assert 0 < report["notifications"] <= expected_notifications
+    # Результаты записываются пачками: запросов к БД меньше, чем карточек
+    assert report["db_round_trips"] < PRODUCTS
+    assert report["pool_acquires"] > 0
+
+
+async def test_repeated_sweep_does_not_rewrite_unchanged_listings(db_pool, tmp_path):
+    async with db_pool.acquire() as conn:
+        await sweep_harness.seed_products(conn, 100)
+
+    marketplaces = {marketplace: sweep_harness.FakeMarketplace() for marketplace in sweep_harness.MARKETPLACE_URLS}
+    settings = sweep_harness.load_settings(str(tmp_path / "artifacts"))
+    db = load_config(".env.test").db
+    first = await sweep_harness.run_sweep_load(db, settings, marketplaces)
+    async with db_pool.acquire() as conn:
+        checked_before = await conn.fetchval("SELECT max(last_checked) FROM listing_state")
+    second = await sweep_harness.run_sweep_load(db, settings, marketplaces)
+    async with db_pool.acquire() as conn:
+        not_rechecked = await conn.fetchval(
+            "SELECT count(*) FROM listing_state WHERE last_checked <= $1", checked_before
+        )
+        history_points = await conn.fetchval("SELECT count(*) FROM price_history")
+
+    # Первый обход записывает все карточки, повторный с теми же ценами — только время проверки;
+    # и то и другое одним запросом на пачку маркетплейса, а не запросом на карточку
+    assert first["db_round_trips"] < 100
+    assert "UPDATE" not in first["db_round_trips_by_statement"]
+    assert second["db_round_trips"] < 100
+    assert second["db_round_trips_by_statement"]["UPDATE"] == len(marketplaces)
+    assert not_rechecked == 0
+    assert history_points == 100
+
+
+async def test_sweep_retries_transient_errors_once_per_marketplace(db_pool, tmp_path, caplog):
+    async with db_pool.acquire() as conn:
+        await sweep_harness.seed_products(conn, 200)
+
+    marketplaces = {
+        marketplace: sweep_harness.FakeMarketplace(timeout_rate=0.1) for marketplace in sweep_harness.MARKETPLACE_URLS
+    }
+    # Страницы по 20 карточек: повтор с паузой должен идти один раз на маркетплейс, а не на каждой странице
+    settings = sweep_harness.load_settings(str(tmp_path / "artifacts"), sweep_batch_size=20, retry_attempts=1)
+    caplog.set_level(logging.INFO, logger="bot.background_tasks.background_tasks")
+    await sweep_harness.run_sweep_load(load_config(".env.test").db, settings, marketplaces)
+
+    retries = [record for record in caplog.records if record.getMessage().startswith("Retrying")]
+
+    assert 0 < len(retries) <= len(marketplaces)
@@ -2,6 +2,8 @@ from asyncpg import Connection
 from typing import Optional
 from enums.roles import UserRow
 from datetime import datetime
+from database import db
+from database.product_key import canonical_product_key
 
 
 async def get_user_test(
@@ -64,10 +66,23 @@ async def add_product_test(
 ) -> None:
     await conn.execute(
         """
-        INSERT INTO products (user_id, product_name, product_url, target_price, marketplace, is_active, last_error)
-        VALUES ($1, $2, $3, $4, $5, $6, $7);
+        WITH listing AS (
+            INSERT INTO listings (marketplace, product_key, product_url, product_name)
+            VALUES ($5, $8, $3, $2)
+            ON CONFLICT (marketplace, product_key) DO UPDATE
+            SET product_name = EXCLUDED.product_name
+            RETURNING listing_id
+        ), state AS (
+            INSERT INTO listing_state (listing_id, marketplace, last_error)
+            SELECT listing_id, $5, $7 FROM listing
+            ON CONFLICT (listing_id) DO UPDATE
+            SET last_error = EXCLUDED.last_error
+        )
+        INSERT INTO subscriptions (user_id, listing_id, target_price, is_active)
+        SELECT $1, listing_id, $4, $6 FROM listing;
         """,
-        user_id, product_name, product_url, target_price, marketplace, is_active, last_error
+        user_id, product_name, product_url, target_price, marketplace, is_active, last_error,
+        canonical_product_key(marketplace, product_url),
     )
  
  
@@ -102,7 +117,11 @@ async def insert_activity_test(conn: Connection, user_id: int, actions: int = 1)
 
 async def get_product_by_user_id_test(conn: Connection, user_id: int):
     row = await conn.fetchrow(
-        "SELECT user_id, marketplace, product_url, target_price FROM products WHERE user_id = $1",
+        """
+        SELECT s.user_id, l.marketplace, l.product_url, s.target_price
+        FROM subscriptions s JOIN listings l ON l.listing_id = s.listing_id
+        WHERE s.user_id = $1
+        """,
         user_id,
     )
     return row
@@ -110,24 +129,56 @@ async def get_product_by_user_id_test(conn: Connection, user_id: int):
 
 async def get_products_count_test(conn: Connection):
     row = await conn.fetchrow(
-        "SELECT COUNT(*) as count FROM products",
+        "SELECT COUNT(*) as count FROM subscriptions",
     )
     return row['count']
 
 
 async def get_product_active_status_id_test(conn: Connection, user_id: int):
     row = await conn.fetchrow(
-        "SELECT is_active FROM products WHERE user_id = $1",
+        "SELECT is_active FROM subscriptions WHERE user_id = $1",
         user_id,
     )
     return row['is_active']
 
 
-async def get_product_after_parsing_test(conn: Connection, user_id: int):
+async def get_listings_count_test(conn: Connection):
+    return await conn.fetchval("SELECT COUNT(*) FROM listings")
+
+
+async def get_listing_after_parsing_test(conn: Connection, listing_id: int):
     row = await conn.fetchrow(
-        "SELECT current_price, product_name, min_price, last_error, is_active FROM products WHERE user_id = $1",
-        user_id,
+        "SELECT current_price, product_name, min_price, last_error FROM listing_details WHERE listing_id = $1",
+        listing_id,
+    )
+    return row
+
+
+
+
+async def get_listing_failure_state_test(conn: Connection, listing_id: int):
+    row = await conn.fetchrow(
+        "SELECT fail_count, next_check_at, last_error FROM listing_state WHERE listing_id = $1",
+        listing_id,
     )
     return row
 
 
+async def set_listing_next_check_at_test(conn: Connection, listing_id: int, next_check_at: datetime) -> None:
+    await conn.execute(
+        "UPDATE listing_state SET next_check_at = $1 WHERE listing_id = $2",
+        next_check_at, listing_id,
+    )
+
+
+async def get_sweep_listings_test(conn: Connection):
+    # Все задачи обхода постранично, как их читает планировщик, в порядке listing_id
+    listings = []
+    for marketplace in await db.products.count_products_items_for_parsing(conn=conn):
+        after_listing_id = 0
+        while page := await db.products.get_products_items_for_parsing_page(
+            conn=conn, marketplace=marketplace, after_listing_id=after_listing_id, limit=2,
+        ):
+            listings.extend(page)
+            after_listing_id = page[-1].listing_id
+    return sorted(listings, key=lambda listing: listing.listing_id)
@@ -95,4 +95,77 @@ class MockPageWithLocator:
         self.elements_data = elements_data
 
     def locator(self, selector):
-        return MockLocator(self.elements_data)
\ No newline at end of file
+        return MockLocator(self.elements_data)
+
+
+# Мок страницы и контекста браузера для общего цикла обработки задач
+class MockBrowserPage:
+    def __init__(self, heap_size=0, html="<html></html>"):
+        self.closed = False
+        self.heap_size = heap_size
+        self.html = html
+        self.url = "about:blank"
+        self.visited = []
+
+    async def goto(self, url, **kwargs):
+        self.visited.append(url)
+        self.url = url
+
+    async def content(self):
+        return self.html
+
+    async def evaluate(self, script):
+        if "usedJSHeapSize" in script:
+            return self.heap_size
+        return None
+
+    async def close(self):
+        self.closed = True
+
+
+class MockBrowserContext:
+    def __init__(self):
+        self.pages = []
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+    async def new_page(self):
+        page = MockBrowserPage()
+        self.pages.append(page)
+        return page
+
+
+# Мок отрендеренной страницы: HTML для правил извлечения и видимый текст для проверки наличия
+class MockRenderedPage:
+    def __init__(self, html, visible_text="", elements=None):
+        self.html = html
+        self.visible_text = visible_text
+        # Живые элементы по селекторам: селектор -> список MockElement (с видимостью)
+        self.elements = elements or {}
+        self.url = "about:blank"
+        self.waited_for_selector = False
+
+    async def goto(self, url, **kwargs):
+        self.url = url
+
+    async def evaluate(self, script):
+        return self.visible_text if "innerText" in script else None
+
+    async def content(self):
+        return self.html
+
+    async def wait_for_selector(self, *args, **kwargs):
+        self.waited_for_selector = True
+        return await self.query_selector(args[0]) if args else None
+
+    async def query_selector(self, selector):
+        elements = self.elements.get(selector)
+        return elements[0] if elements else None
+
+    async def query_selector_all(self, selector):
+        return self.elements.get(selector, [])
+
+    async def inner_text(self, selector):
+        return await self.elements[selector][0].inner_text()
@@ -0,0 +1,109 @@
+import io
+import os
+
+from enums.parse_errors import ParseError
+from enums.parse_records import ParseTask
+from bot.parsers.artifacts import ArtifactStore
+from bot.parsers.common import build_result
+from bot.parsers.replay import main, print_report, replay
+from bot.parsers.runner import run_marketplace_tasks
+from tests.test_parsers.mocks import MockBrowserContext
+
+OZON_PAGE = '<body><h1>Чайник</h1><div data-widget="webPrice">2 490 ₽</div><div>О товаре</div></body>'
+
+
+def test_artifact_store_round_trip(tmp_path):
+    store = ArtifactStore(tmp_path)
+
+    artifact_id = store.save(
+        "ozon", "https://ozon.ru/p/1", OZON_PAGE, error=ParseError.PARSE_FAILED, stages={"goto": 1.23456},
+    )
+
+    [meta] = store.entries()
+    assert meta["id"] == artifact_id
+    assert meta["marketplace"] == "ozon"
+    assert meta["error"] == "PARSE_FAILED"
+    assert meta["stages"] == {"goto": 1.235}
+    assert store.load_html(artifact_id) == OZON_PAGE
+    assert list(store.entries("joom")) == []
+
+
+def test_artifact_store_samples_successes():
+    store = ArtifactStore("unused", success_sample_rate=0.1, rng=iter([0.05, 0.5]).__next__)
+
+    assert store.should_capture(ParseError.TIMEOUT)
+    assert store.should_capture(None)
+    assert not store.should_capture(None)
+
+
+def test_artifact_store_evicts_least_recently_read(tmp_path):
+    clock = iter(range(100)).__next__
+    store = ArtifactStore(tmp_path, clock=clock)
+    page = os.urandom(64 * 1024).hex()
+    first = store.save("joom", "https://joom.ru/1", page)
+    # Помещаются два снимка, третий вытесняет давно не читанный
+    store.max_bytes = int(2.5 * sum(path.stat().st_size for path in tmp_path.iterdir()))
+    second = store.save("joom", "https://joom.ru/2", page)
+    os.utime(tmp_path / f"{first}.html.gz", (1, 1))
+    os.utime(tmp_path / f"{second}.html.gz", (2, 2))
+    store.load_html(first)
+
+    third = store.save("joom", "https://joom.ru/3", page)
+
+    assert [meta["id"] for meta in store.entries()] == sorted([first, third])
+
+
+
+def test_artifact_store_scans_directory_only_when_over_limit(tmp_path):
+    store = ArtifactStore(tmp_path, clock=iter(range(100)).__next__)
+    scans = []
+    snapshots = store._snapshots
+    store._snapshots = lambda: scans.append(1) or snapshots()
+
+    for idx in range(3):
+        store.save("joom", f"https://joom.ru/{idx}", "<html></html>")
+    assert len(scans) == 1
+
+    store.max_bytes = 0
+    store.save("joom", "https://joom.ru/4", "<html></html>")
+    assert len(scans) == 2
+    assert list(store.entries()) == []
+
+async def test_runner_saves_failed_rendered_pages(tmp_path):
+    store = ArtifactStore(tmp_path, success_sample_rate=0)
+    context = MockBrowserContext()
+
+    async def fetch(page, product_info, deadline):
+        await page.goto(product_info.url)
+        page.html = OZON_PAGE
+        with deadline.stage("price"):
+            pass
+        error = ParseError.PARSE_FAILED if product_info.product_id == 1 else None
+        return build_result(product_info, None if error else 100, "Чайник", error)
+
+    tasks = [ParseTask(1, product_id, f"https://ozon.ru/p/{product_id}", None, None) for product_id in (1, 2)]
+    await run_marketplace_tasks("ozon", tasks, context, fetch, max_concurrent=1, artifacts=store)
+
+    [meta] = store.entries()
+    assert meta["url"] == "https://ozon.ru/p/1"
+    assert meta["source"] is None
+    assert "price" in meta["stages"]
+
+
+def test_replay_reports_fixed_and_changed_pages(tmp_path):
+    store = ArtifactStore(tmp_path, clock=iter(range(100)).__next__)
+    store.save("ozon", "https://ozon.ru/p/1", OZON_PAGE, error=ParseError.PARSE_FAILED)
+    store.save("ozon", "https://ozon.ru/p/2", OZON_PAGE, price=2490, name="Чайник", source="dom")
+    store.save("ozon", "https://ozon.ru/p/3", OZON_PAGE, price=2990, name="Чайник", source="selector")
+
+    outcomes = replay(store)
+    report = io.StringIO()
+    totals = print_report(outcomes, out=report)
+
+    assert [outcome.status for outcome in outcomes] == ["fixed", "same", "changed"]
+    # Цену третьей страницы при сохранении дали селекторы, при повторном разборе — правило
+    assert [outcome.source_changed for outcome in outcomes] == [False, False, True]
+    assert totals == {"fixed": 1, "changed": 1, "same": 1, "source_changed": 1}
+    assert "live: 2990/None (selector)  replay: 2490/None (dom)  source changed" in report.getvalue()
+    assert [outcome.status for outcome in replay(store, failed_only=True)] == ["fixed"]
+    assert main(["--dir", str(tmp_path), "--workers", "1"]) == 1
@@ -0,0 +1,58 @@
+import pytest
+
+from enums.parse_errors import ParseError
+from enums.parse_records import ParseTask
+from bot.parsers.challenge import detect_challenge, match_challenge
+from bot.parsers.ozon import fetch_product_data
+
+
+class MockProbePage:
+    def __init__(self, probe=None, error=None):
+        self.probe = probe
+        self.error = error
+        self.waited_for_selector = False
+
+    async def evaluate(self, script):
+        if self.error:
+            raise self.error
+        return self.probe
+
+    async def goto(self, url, **kwargs):
+        return None
+
+    async def wait_for_selector(self, *args, **kwargs):
+        self.waited_for_selector = True
+
+
+def make_probe(url="https://www.ozon.ru/product/1", title="Товар", text="Цена 100 ₽", frames=""):
+    return {"url": url, "title": title, "text": text, "frames": frames}
+
+
+@pytest.mark.parametrize("marketplace, probe, expected", [
+    ("yandex", make_probe(url="https://market.yandex.ru/showcaptcha?retpath=1"), "url contains 'showcaptcha'"),
+    ("joom", make_probe(title="Just a moment..."), "title contains 'just a moment'"),
+    ("ozon", make_probe(title="Доступ ограничен"), "title contains 'доступ ограничен'"),
+    ("wildberries", make_probe(title="Почти готово..."), "title contains 'почти готово'"),
+    ("ozon", make_probe(frames="https://www.google.com/recaptcha/api2/anchor"), "frames contains 'recaptcha'"),
+    ("yandex", make_probe(text="Подтвердите, что запросы отправляли вы, а не робот"),
+     "text contains 'подтвердите, что запросы отправляли вы'"),
+    ("ozon", make_probe(), None),
+    # Признаки другого маркетплейса не срабатывают
+    ("ozon", make_probe(title="Почти готово"), None),
+])
+def test_match_challenge(marketplace, probe, expected):
+    assert match_challenge(marketplace, probe) == expected
+
+
+async def test_detect_challenge_ignores_probe_errors():
+    assert await detect_challenge(MockProbePage(error=RuntimeError("detached")), "ozon") is None
+    assert await detect_challenge(MockProbePage(probe=None), "ozon") is None
+
+
+async def test_parser_fails_fast_on_challenge():
+    page = MockProbePage(probe=make_probe(url="https://www.ozon.ru/abt/challenge"))
+
+    result = await fetch_product_data(ParseTask(1, 2, "https://www.ozon.ru/product/1", None, 100), page)
+
+    assert result.last_error is ParseError.BLOCKED
+    assert not page.waited_for_selector
@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from unittest.mock import Mock
+from playwright.async_api import Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+
+from enums.parse_errors import ParseError
+from enums.parse_records import ParseResult, ParseTask
+from bot.parsers.common import build_result, classify_exception, classify_response
+
+
+@pytest.mark.parametrize("status, expected", [
+    (200, None),
+    (304, None),
+    (404, ParseError.NOT_FOUND),
+    (410, ParseError.NOT_FOUND),
+    (403, ParseError.BLOCKED),
+    (429, ParseError.BLOCKED),
+    (502, ParseError.TIMEOUT),
+])
+def test_classify_response(status, expected):
+    response = Mock(status=status)
+    assert classify_response(response) == expected
+
+
+def test_classify_response_without_response():
+    assert classify_response(None) is None
+
+
+@pytest.mark.parametrize("exc, expected", [
+    (PlaywrightTimeoutError("Timeout 60000ms exceeded"), ParseError.TIMEOUT),
+    (asyncio.TimeoutError(), ParseError.TIMEOUT),
+    (PlaywrightError("net::ERR_CONNECTION_RESET at https://ozon.ru"), ParseError.TIMEOUT),
+    (PlaywrightError("Target page, context or browser has been closed"), ParseError.PARSE_FAILED),
+    (ValueError("invalid literal for int()"), ParseError.PARSE_FAILED),
+])
+def test_classify_exception(exc, expected):
+    assert classify_exception(exc) == expected
+
+
+@pytest.mark.parametrize("min_price, price, error, expected_price, expected_min, expected_error", [
+    (None, 500, None, 500, 500, None),
+    (600, 500, None, 500, 500, None),
+    (400, 500, None, 500, 400, None),
+    (400, None, None, None, 400, ParseError.PARSE_FAILED),
+    (400, None, ParseError.NOT_FOUND, None, 400, ParseError.NOT_FOUND),
+    (400, 500, ParseError.BLOCKED, None, 400, ParseError.BLOCKED),
+])
+def test_build_result(min_price, price, error, expected_price, expected_min, expected_error):
+    product_info = ParseTask(1, 10, "https://example.com/1", min_price, 300)
+
+    result = build_result(product_info, price, "Товар", error)
+
+    assert result == ParseResult(
+        1, 10, expected_price, "Товар", expected_min, expected_error, 300, "https://example.com/1"
+    )
+
+
+def test_parse_error_is_transient():
+    assert not ParseError.NOT_FOUND.is_transient
+    assert ParseError.TIMEOUT.is_transient
+    assert ParseError.BLOCKED.is_transient
+    assert ParseError.PARSE_FAILED.is_transient
@@ -0,0 +1,97 @@
+import asyncio
+
+from enums.parse_errors import ParseError
+from enums.parse_records import ParseTask
+from bot.parsers.common import build_result
+from bot.parsers.context_pool import ContextPool
+from bot.parsers.runner import run_marketplace_tasks
+from tests.test_parsers.mocks import MockBrowserContext
+
+
+class ContextFactory:
+    def __init__(self):
+        self.opened = []
+
+    async def __call__(self, index, fresh=False, proxy=None):
+        context = MockBrowserContext()
+        context.index, context.fresh, context.proxy = index, fresh, proxy
+        self.opened.append(context)
+        return context
+
+
+async def test_context_pool_spreads_pages_across_contexts():
+    factory = ContextFactory()
+    contexts = ContextPool("ozon", factory, size=2)
+    await contexts.start()
+
+    first = await contexts.acquire()
+    second = await contexts.acquire()
+
+    assert first in factory.opened[0].pages
+    assert second in factory.opened[1].pages
+    await contexts.close()
+    assert all(context.closed for context in factory.opened)
+
+
+async def test_context_pool_prefers_healthy_context():
+    factory = ContextFactory()
+    contexts = ContextPool("ozon", factory, size=2, min_health=0.1)
+    await contexts.start()
+
+    page = await contexts.acquire()
+    owner = next(context for context in factory.opened if page in context.pages)
+    await contexts.release(page, error=ParseError.BLOCKED)
+
+    for _ in range(3):
+        page = await contexts.acquire()
+        assert page not in owner.pages
+        await contexts.release(page)
+    await contexts.close()
+
+
+async def test_context_pool_rotates_unhealthy_context():
+    factory = ContextFactory()
+    contexts = ContextPool("wildberries", factory, size=1, min_health=0.5)
+    await contexts.start()
+
+    for _ in range(4):
+        page = await contexts.acquire()
+        await contexts.release(page, error=ParseError.BLOCKED)
+
+    await contexts.close()
+    assert factory.opened[0].closed
+    assert len(factory.opened) == 2
+    assert factory.opened[1].fresh
+    assert contexts.rotated == 1
+
+
+async def test_context_pool_ignores_product_errors_for_health():
+    factory = ContextFactory()
+    contexts = ContextPool("joom", factory, size=1, min_health=0.9)
+    await contexts.start()
+
+    for _ in range(5):
+        page = await contexts.acquire()
+        await contexts.release(page, error=ParseError.NOT_FOUND)
+
+    await contexts.close()
+    assert len(factory.opened) == 1
+
+
+async def test_context_pool_rotates_after_max_pages_without_losing_tasks():
+    factory = ContextFactory()
+    contexts = ContextPool("yandex", factory, size=2, max_pages=3)
+    await contexts.start()
+
+    async def fetch(page, product_info, deadline):
+        await asyncio.sleep(0.001)
+        return build_result(product_info, 100, "Товар", None)
+
+    tasks = [ParseTask(1, product_id, f"https://example.com/{product_id}", None, 100) for product_id in range(1, 13)]
+    results = await run_marketplace_tasks("yandex", tasks, None, fetch, max_concurrent=2, page_pool=contexts)
+    await contexts.close()
+
+    assert sorted(result.product_id for result in results) == list(range(1, 13))
+    assert all(result.last_error is None for result in results)
+    assert contexts.rotated >= 2
+    assert all(context.closed for context in factory.opened)
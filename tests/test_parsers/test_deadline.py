@@ -0,0 +1,60 @@
+import pytest
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from bot.parsers.deadline import DeadlineExceeded, NO_DEADLINE, PageDeadline, TimeoutMeter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.parametrize("elapsed, default_ms, expected", [
+    (0, 60000, 60000),
+    (40, 60000, 50000),
+    (85, 15000, 5000),
+    (89.5, 2000, 500),
+])
+def test_deadline_caps_timeouts_by_remaining_budget(elapsed, default_ms, expected):
+    clock = FakeClock()
+    deadline = PageDeadline(90, clock=clock)
+    clock.now = elapsed
+
+    assert deadline.timeout(default_ms) == expected
+
+
+def test_deadline_raises_when_expired():
+    clock = FakeClock()
+    deadline = PageDeadline(90, clock=clock)
+    clock.now = 90
+
+    with pytest.raises(DeadlineExceeded):
+        deadline.timeout(1000)
+    with pytest.raises(DeadlineExceeded):
+        deadline.check()
+
+
+def test_no_deadline_keeps_default_timeouts():
+    assert NO_DEADLINE.timeout(30000) == 30000
+    NO_DEADLINE.check()
+
+
+def test_deadline_stage_meters_time_and_timeouts():
+    clock = FakeClock()
+    meter = TimeoutMeter("joom")
+    deadline = PageDeadline(90, meter=meter, clock=clock)
+
+    with deadline.stage("goto"):
+        clock.now += 3
+
+    with pytest.raises(PlaywrightTimeoutError):
+        with deadline.stage("name"):
+            clock.now += 2
+            raise PlaywrightTimeoutError("Timeout 2000ms exceeded")
+
+    assert meter.seconds == {"goto": 3, "name": 2}
+    assert meter.calls == {"goto": 1, "name": 1}
+    assert meter.timeouts == {"name": 1}
@@ -0,0 +1,119 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from enums.parse_errors import ParseError
+from bot.parsers.extraction import (
+    Extraction,
+    check_existence,
+    extract_offloaded,
+    extract_product,
+    html_to_text,
+    iter_elements,
+    select_wb_price,
+)
+
+
+WB_HTML = """
+<html><head><title>Кружка</title><script>var t = "нет в наличии";</script></head>
+<body>
+  <h3>Кружка керамическая 350 мл</h3>
+  <div>Артикул: 123456</div>
+  <span class="priceBlockPrice">1&nbsp;500 ₽</span>
+  <span class="priceBlockWalletPrice wallet-price"><span>1 200</span> ₽</span>
+  <span class="redPrice final">1 250 ₽</span>
+</body></html>
+"""
+
+OZON_HTML = """
+<body>
+  <h1>Чайник электрический</h1>
+  <div data-widget="webPrice"><span>2 490 ₽</span><span>3 100 ₽</span></div>
+  <div>О товаре</div>
+</body>
+"""
+
+YANDEX_HTML = """
+<body>
+  <h1 data-auto="productCardTitle">Лампа настольная LED</h1>
+  <span>Доставка 99 ₽</span>
+  <div data-zone-name="price"><span>1 990 ₽</span></div>
+  <div>Артикул Маркета: 555</div>
+</body>
+"""
+
+JOOM_HTML = """
+<body>
+  <h1>Наушники беспроводные</h1>
+  <div><span>Скидка</span><span>Цена: 4&nbsp;500 ₽</span></div>
+  <p>Описание товара</p>
+</body>
+"""
+
+
+@pytest.mark.parametrize("marketplace, html, expected", [
+    ("wildberries", WB_HTML, Extraction(True, 1200, "Кружка керамическая 350 мл", "dom")),
+    ("ozon", OZON_HTML, Extraction(True, 2490, "Чайник электрический", "dom")),
+    ("yandex", YANDEX_HTML, Extraction(True, 1990, "Лампа настольная LED", "dom")),
+    ("joom", JOOM_HTML, Extraction(True, 4500, "Наушники беспроводные", "dom")),
+])
+def test_extract_product_with_marketplace_rules(marketplace, html, expected):
+    assert extract_product(marketplace, html) == expected
+
+
+@pytest.mark.parametrize("marketplace, text", [
+    ("wildberries", "По вашему запросу ничего не найдено"),
+    ("ozon", "Этот товар закончился"),
+    ("yandex", "Такого товара у нас нет"),
+    ("joom", "Товар раскупили"),
+])
+def test_extract_product_not_found(marketplace, text):
+    extraction = extract_product(marketplace, f"<body><h1>Товар</h1><p>{text}</p><span>100 ₽</span></body>")
+    assert extraction == Extraction(False, None, None)
+    assert extraction.error is ParseError.NOT_FOUND
+
+
+def test_extract_product_falls_back_to_structured_data():
+    html = """
+    <head><script type="application/ld+json">
+      {"@type": "Product", "name": "Кружка", "offers": {"price": "1299.00"}}
+    </script></head>
+    <body><div id="app"></div></body>
+    """
+    assert extract_product("ozon", html) == Extraction(True, 1299, "Кружка", "structured")
+
+
+def test_extract_product_without_price():
+    extraction = extract_product("wildberries", "<body><h3>Товар</h3></body>")
+    assert extraction == Extraction(True, None, "Товар")
+    assert extraction.error is ParseError.PARSE_FAILED
+
+
+def test_html_to_text_skips_scripts_and_splits_blocks():
+    text = html_to_text("<div>Первый&nbsp;блок</div><script>нет в наличии</script><p>Второй</p>")
+    assert text == "Первый блок\nВторой"
+    assert check_existence("wildberries", text) is True
+
+
+def test_iter_elements_handles_nested_and_void_tags():
+    html = '<div class="a"><div>вложенный</div> хвост</div><img src="x"><br/><div class="b">b</div>'
+    elements = [(tag, attrs.get("class"), text) for tag, attrs, text in iter_elements(html)]
+    assert elements == [
+        ("div", "a", "вложенный хвост"),
+        ("div", None, "вложенный"),
+        ("img", None, ""),
+        ("br", None, ""),
+        ("div", "b", "b"),
+    ]
+
+
+def test_select_wb_price_prefers_discount_classes():
+    assert select_wb_price([("1 500 ₽", "price"), ("1 700 ₽", "sale")]) == 1700
+    assert select_wb_price([("Нет цены", "final")]) == "Цена не найдена"
+
+
+async def test_extract_offloaded_in_process_pool_matches_inline():
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        offloaded = await extract_offloaded("wildberries", WB_HTML, executor)
+    assert offloaded == await extract_offloaded("wildberries", WB_HTML)
+    assert offloaded.price == 1200
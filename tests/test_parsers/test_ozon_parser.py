@@ -1,7 +1,8 @@
 import pytest
-from tests.test_parsers.mocks import MockElement, MockPageOzon
+from tests.test_parsers.mocks import MockElement, MockPageOzon, MockRenderedPage
 from unittest.mock import AsyncMock
-from bot.parsers.ozon import check_product_existence_by_text, find_price_element
+from enums.parse_records import ParseTask
+from bot.parsers.ozon import check_product_existence_by_text, fetch_product_data, find_price_element
 
 
 @pytest.mark.parametrize("page_text, expected_result", [
@@ -127,3 +128,40 @@ async def test_find_price_element(selectors_data, expected_result):
         assert result == expected_result
     else:    
         assert result == expected_result
+
+
+async def test_fetch_product_data_prefers_visible_price_over_hidden_one():
+    page = MockRenderedPage(
+        '<body><h1>Чайник электрический</h1>'
+        '<div style="display:none"><span>1 990 ₽</span></div><span>2 490 ₽</span></body>',
+        visible_text="Чайник электрический\nО товаре",
+        elements={
+            "h1": [MockElement("Чайник электрический")],
+            "xpath=//*[contains(text(), '₽')]": [
+                MockElement("1 990 ₽", is_visible_value=False),
+                MockElement("2 490 ₽"),
+            ],
+        },
+    )
+
+    result = await fetch_product_data(ParseTask(None, 1, "https://www.ozon.ru/product/1", 3000, 2500), page)
+
+    # Скрытая более дешёвая цена не должна перебить видимую
+    assert (result.price, result.product_name, result.min_price, result.last_error, result.source) == (
+        2490, "Чайник электрический", 2490, None, "selector",
+    )
+
+
+async def test_fetch_product_data_falls_back_to_extraction_rules():
+    page = MockRenderedPage(
+        '<body><h1>Чайник электрический</h1><div data-widget="webPrice"><span>2 490 ₽</span></div></body>',
+        visible_text="Чайник электрический\nО товаре",
+        elements={"h1": [MockElement("Чайник электрический")]},
+    )
+
+    result = await fetch_product_data(ParseTask(None, 1, "https://www.ozon.ru/product/1", 3000, 2500), page)
+
+    # Селекторы цену не нашли, её нашли правила извлечения по HTML страницы
+    assert (result.price, result.product_name, result.min_price, result.last_error, result.source) == (
+        2490, "Чайник электрический", 2490, None, "dom",
+    )
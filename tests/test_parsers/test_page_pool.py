@@ -0,0 +1,72 @@
+import asyncio
+
+from enums.parse_records import ParseTask
+from bot.parsers.common import build_result
+from bot.parsers.page_pool import PagePool
+from bot.parsers.runner import run_marketplace_tasks
+from tests.test_parsers.mocks import MockBrowserContext
+
+
+async def test_page_pool_reuses_reset_page():
+    context = MockBrowserContext()
+    pool = PagePool(context, size=2)
+
+    page = await pool.acquire()
+    await pool.release(page)
+    again = await pool.acquire()
+
+    assert again is page
+    assert len(context.pages) == 1
+    assert page.visited == ["about:blank"]
+    assert not page.closed
+
+
+async def test_page_pool_recycles_after_max_uses():
+    context = MockBrowserContext()
+    pool = PagePool(context, max_uses=2)
+
+    for _ in range(3):
+        page = await pool.acquire()
+        await pool.release(page)
+
+    assert len(context.pages) == 2
+    assert context.pages[0].closed
+    assert not context.pages[1].closed
+
+
+async def test_page_pool_recycles_over_memory_limit():
+    context = MockBrowserContext()
+    pool = PagePool(context, memory_limit_mb=1)
+
+    page = await pool.acquire()
+    page.heap_size = 2 * 1024 * 1024
+    await pool.release(page)
+
+    assert page.closed
+    assert await pool.acquire() is not page
+
+
+async def test_page_pool_discards_interrupted_page():
+    context = MockBrowserContext()
+    pool = PagePool(context)
+
+    page = await pool.acquire()
+    await pool.release(page, discard=True)
+
+    assert page.closed
+    assert page.visited == []
+
+
+async def test_runner_reuses_pages_and_closes_pool():
+    context = MockBrowserContext()
+
+    async def fetch(page, product_info, deadline):
+        await asyncio.sleep(0)
+        return build_result(product_info, 100, "Товар", None)
+
+    tasks = [ParseTask(1, product_id, f"https://example.com/{product_id}", None, 100) for product_id in range(1, 11)]
+    results = await run_marketplace_tasks("wildberries", tasks, context, fetch, max_concurrent=2)
+
+    assert len(results) == 10
+    assert len(context.pages) == 2
+    assert all(page.closed for page in context.pages)
@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+import pytest
+import pytest_asyncio
+from redis.asyncio import Redis
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+import bot.db_pool_singleton.db_pool_singleton as global_pool
+from bot.parsers.deadline import DeadlineExceeded, PageDeadline, TimeoutMeter
+from bot.parsers.rate_limiter import RedisTokenBucket, host_key, throttle
+from config.config import load_config
+
+
+@pytest_asyncio.fixture
+async def redis():
+    config = load_config(".env.test")
+    client = Redis(host=config.redis.host, port=config.redis.port, db=config.redis.db)
+    try:
+        await client.ping()
+    except (RedisConnectionError, OSError):
+        await client.aclose()
+        pytest.skip("Redis из docker-compose.test.yml недоступен")
+    keys = await client.keys("test:rate:*")
+    if keys:
+        await client.delete(*keys)
+    yield client
+    await client.aclose()
+
+
+def make_bucket(redis, rate=10.0, burst=2.0):
+    return RedisTokenBucket(redis, {"ozon.ru": rate}, default_rate=1.0, burst=burst, key_prefix="test:rate:")
+
+
+def test_host_key_and_rate_lookup():
+    bucket = RedisTokenBucket.__new__(RedisTokenBucket)
+    bucket.rates, bucket.default_rate = {"market.yandex.ru": 3.0, "ozon.ru": 1.0}, 0.5
+
+    assert host_key("https://www.ozon.ru/product/1") == "ozon.ru"
+    assert bucket.rate_for("m.ozon.ru") == ("ozon.ru", 1.0)
+    assert bucket.rate_for("market.yandex.ru") == ("market.yandex.ru", 3.0)
+    assert bucket.rate_for("joom.com") == ("joom.com", 0.5)
+
+
+async def test_bucket_allows_burst_then_throttles(redis):
+    bucket = make_bucket(redis)
+
+    assert await bucket.try_acquire("https://www.ozon.ru/a") == 0
+    assert await bucket.try_acquire("https://ozon.ru/b") == 0
+    wait = await bucket.try_acquire("https://www.ozon.ru/c")
+    assert 0 < wait <= 0.1
+
+
+async def test_bucket_is_shared_between_clients(redis):
+    first, second = make_bucket(redis, burst=1.0), make_bucket(redis, burst=1.0)
+
+    assert await first.try_acquire("https://www.ozon.ru/a") == 0
+    assert await second.try_acquire("https://www.ozon.ru/b") > 0
+
+
+async def test_acquire_waits_for_refill(redis):
+    bucket = make_bucket(redis, rate=20.0, burst=1.0)
+
+    started = time.monotonic()
+    for _ in range(3):
+        await bucket.acquire("https://www.ozon.ru/a")
+    assert time.monotonic() - started >= 0.08
+
+
+async def test_acquire_fails_fast_when_wait_exceeds_deadline(redis):
+    bucket = make_bucket(redis, rate=0.01, burst=1.0)
+    await bucket.acquire("https://www.ozon.ru/a")
+
+    with pytest.raises(DeadlineExceeded):
+        await bucket.acquire("https://www.ozon.ru/a", PageDeadline(5))
+
+
+async def test_throttle_uses_global_limiter(redis):
+    meter = TimeoutMeter("ozon")
+    global_pool.rate_limiter = make_bucket(redis)
+    try:
+        await throttle("https://www.ozon.ru/a", PageDeadline(5, meter=meter))
+    finally:
+        global_pool.rate_limiter = None
+
+    assert meter.calls["rate_limit"] == 1
+
+
+async def test_bucket_fails_open_without_redis():
+    client = Redis(host="127.0.0.1", port=1, socket_connect_timeout=0.2)
+    bucket = make_bucket(client)
+
+    assert await asyncio.wait_for(bucket.try_acquire("https://www.ozon.ru/a"), timeout=2) == 0
+    await client.aclose()
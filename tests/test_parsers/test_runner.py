@@ -0,0 +1,150 @@
+import asyncio
+
+from enums.parse_errors import ParseError
+from enums.parse_records import ParseTask
+from bot.parsers.common import build_result
+from bot.parsers.runner import run_marketplace_tasks
+from bot.background_tasks.circuit_breaker import CircuitBreaker
+from bot.background_tasks.hedging import HedgeBudget, LatencyTracker
+from tests.test_parsers.mocks import MockBrowserContext
+
+
+def make_tasks(count):
+    return [ParseTask(1, product_id, f"https://example.com/{product_id}", None, 100) for product_id in range(1, count + 1)]
+
+
+async def test_run_marketplace_tasks_limits_concurrency():
+    in_flight = 0
+    max_in_flight = 0
+
+    async def fetch(page, product_info, deadline):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return build_result(product_info, 100, "Товар", None)
+
+    results = await run_marketplace_tasks("ozon", make_tasks(10), MockBrowserContext(), fetch, max_concurrent=3)
+
+    assert len(results) == 10
+    assert max_in_flight == 3
+
+
+async def test_run_marketplace_tasks_defers_when_breaker_opens():
+    breaker = CircuitBreaker("ozon", window=10, min_samples=3, failure_rate=0.5, open_seconds=600)
+    fetched = []
+
+    async def fetch(page, product_info, deadline):
+        fetched.append(product_info.product_id)
+        return build_result(product_info, None, None, ParseError.BLOCKED)
+
+    results = await run_marketplace_tasks("ozon", make_tasks(10), MockBrowserContext(), fetch, max_concurrent=1, breaker=breaker)
+
+    assert fetched == [1, 2, 3]
+    assert [result.product_id for result in results] == [1, 2, 3]
+
+
+async def test_run_marketplace_tasks_closes_pages():
+    context = MockBrowserContext()
+
+    async def fetch(page, product_info, deadline):
+        return build_result(product_info, 100, "Товар", None)
+
+    await run_marketplace_tasks("ozon", make_tasks(3), context, fetch, max_concurrent=3)
+
+    assert context.pages
+    assert all(page.closed for page in context.pages)
+
+
+async def test_run_marketplace_tasks_cancels_page_after_budget():
+    context = MockBrowserContext()
+
+    async def fetch(page, product_info, deadline):
+        if product_info.product_id == 1:
+            await asyncio.sleep(10)
+        return build_result(product_info, 100, "Товар", None)
+
+    results = await run_marketplace_tasks(
+        "joom", make_tasks(2), context, fetch, max_concurrent=2, page_budget=0.05
+    )
+
+    errors = {result.product_id: result.last_error for result in results}
+    assert errors == {1: ParseError.TIMEOUT, 2: None}
+    assert all(page.closed for page in context.pages)
+
+
+def make_hedging(p95_seconds, ratio=1.0):
+    latency = LatencyTracker("ozon", min_samples=1)
+    latency.record(p95_seconds)
+    return latency, HedgeBudget(ratio)
+
+
+async def test_run_marketplace_tasks_hedges_slow_page_in_fresh_context():
+    context = MockBrowserContext()
+    hedge_contexts = []
+    latency, hedge_budget = make_hedging(0.02)
+
+    async def context_factory():
+        hedge_contexts.append(MockBrowserContext())
+        return hedge_contexts[-1]
+
+    async def fetch(page, product_info, deadline):
+        if page in context.pages:
+            await asyncio.sleep(10)
+        return build_result(product_info, 100, "Товар", None)
+
+    results = await run_marketplace_tasks(
+        "ozon", make_tasks(1), context, fetch, max_concurrent=1,
+        latency=latency, hedge_budget=hedge_budget, context_factory=context_factory,
+    )
+
+    assert results[0].last_error is None
+    assert hedge_budget.hedges == 1 and hedge_budget.wins == 1
+    assert all(page.closed for page in context.pages)
+    assert len(hedge_contexts) == 1 and hedge_contexts[0].closed
+
+
+async def test_run_marketplace_tasks_hedge_respects_budget():
+    context = MockBrowserContext()
+    hedge_contexts = []
+    latency, hedge_budget = make_hedging(0.01, ratio=0.5)
+
+    async def context_factory():
+        hedge_contexts.append(MockBrowserContext())
+        return hedge_contexts[-1]
+
+    async def fetch(page, product_info, deadline):
+        await asyncio.sleep(0.05)
+        return build_result(product_info, 100, "Товар", None)
+
+    results = await run_marketplace_tasks(
+        "ozon", make_tasks(4), context, fetch, max_concurrent=4,
+        latency=latency, hedge_budget=hedge_budget, context_factory=context_factory,
+    )
+
+    assert len(results) == 4
+    assert hedge_budget.hedges == 2
+    assert len(hedge_contexts) == 2
+
+
+async def test_run_marketplace_tasks_hedge_prefers_success_over_error():
+    context = MockBrowserContext()
+    latency, hedge_budget = make_hedging(0.01)
+
+    async def context_factory():
+        return MockBrowserContext()
+
+    async def fetch(page, product_info, deadline):
+        if page in context.pages:
+            await asyncio.sleep(0.03)
+            return build_result(product_info, None, None, ParseError.TIMEOUT)
+        await asyncio.sleep(0.05)
+        return build_result(product_info, 100, "Товар", None)
+
+    results = await run_marketplace_tasks(
+        "ozon", make_tasks(1), context, fetch, max_concurrent=1,
+        latency=latency, hedge_budget=hedge_budget, context_factory=context_factory,
+    )
+
+    assert results[0].last_error is None and results[0].price == 100
@@ -0,0 +1,148 @@
+import json
+
+from enums.parse_errors import ParseError
+from enums.parse_records import ParseTask
+from bot.parsers.common import build_result
+from bot.parsers.runner import run_marketplace_tasks
+from bot.parsers.extraction import extract_ssr_product
+from bot.parsers.ssr import SsrModeTracker
+from tests.test_parsers.mocks import MockBrowserContext
+
+
+def json_ld(data):
+    return f'<script type="application/ld+json">{json.dumps(data, ensure_ascii=False)}</script>'
+
+
+PRODUCT_HTML = "<html><head>" + json_ld({
+    "@context": "https://schema.org",
+    "@type": "Product",
+    "name": "Кружка керамическая",
+    "offers": {"@type": "Offer", "price": "1299.00", "priceCurrency": "RUB"},
+}) + "</head><body></body></html>"
+
+
+def test_extract_ssr_product_from_json_ld():
+    assert extract_ssr_product(PRODUCT_HTML) == (1299, "Кружка керамическая")
+
+
+def test_extract_ssr_product_from_graph_and_aggregate_offer():
+    html = json_ld({"@graph": [
+        {"@type": "BreadcrumbList"},
+        {"@type": ["Product"], "name": "Чайник", "offers": {"@type": "AggregateOffer", "lowPrice": 2490}},
+    ]})
+    assert extract_ssr_product(html) == (2490, "Чайник")
+
+
+def test_extract_ssr_product_from_meta_tags():
+    html = (
+        '<meta property="og:title" content="Лампа &quot;Свет&quot;">'
+        '<meta itemprop="price" content="990">'
+    )
+    assert extract_ssr_product(html) == (990, 'Лампа "Свет"')
+
+
+def test_extract_ssr_product_without_price():
+    assert extract_ssr_product("<html><div id='app'></div></html>") == (None, None)
+    assert extract_ssr_product('<script type="application/ld+json">{broken</script>') == (None, None)
+
+
+def test_tracker_enables_after_validated_successes():
+    tracker = SsrModeTracker("ozon", min_samples=3, enable_rate=0.6)
+
+    assert tracker.should_try() and tracker.validating
+    for success in (True, True, False):
+        tracker.record(success)
+    assert tracker.enabled and not tracker.validating
+
+    for _ in range(3):
+        tracker.record(False)
+    assert not tracker.enabled
+
+
+def test_tracker_probes_periodically_when_disabled():
+    tracker = SsrModeTracker("wildberries", min_samples=2, probe_every=3)
+    tracker.record(False)
+    tracker.record(False)
+
+    assert [tracker.should_try() for _ in range(6)] == [False, False, True, False, False, True]
+    assert not SsrModeTracker("joom", mode="off").should_try()
+    assert SsrModeTracker("joom", mode="on").enabled
+
+
+class MockResponse:
+    def __init__(self, html, status=200, url="https://www.ozon.ru/product/1"):
+        self.html, self.status, self.url = html, status, url
+
+    async def text(self):
+        return self.html
+
+
+class MockRequest:
+    def __init__(self, response):
+        self.response = response
+        self.calls = 0
+
+    async def get(self, url, **kwargs):
+        self.calls += 1
+        return self.response
+
+
+class MockSsrContext(MockBrowserContext):
+    def __init__(self, response):
+        super().__init__()
+        self.request = MockRequest(response)
+
+    async def new_page(self):
+        page = await super().new_page()
+        page.request = self.request
+        return page
+
+
+def make_tasks(count):
+    return [ParseTask(1, product_id, f"https://www.ozon.ru/product/{product_id}", None, 2000) for product_id in range(1, count + 1)]
+
+
+async def test_runner_skips_rendering_once_ssr_is_enabled():
+    context = MockSsrContext(MockResponse(PRODUCT_HTML))
+    tracker = SsrModeTracker("ozon", min_samples=2, enable_rate=0.5)
+    rendered = []
+
+    async def fetch(page, product_info, deadline):
+        rendered.append(product_info.product_id)
+        return build_result(product_info, 1299, "Кружка", None)
+
+    results = await run_marketplace_tasks("ozon", make_tasks(5), context, fetch, max_concurrent=1, ssr=tracker)
+
+    # Первые две страницы сверяются с рендерингом, дальше рендеринг не нужен
+    assert rendered == [1, 2]
+    assert all(result.price == 1299 and result.last_error is None for result in results)
+    assert tracker.enabled
+
+
+async def test_runner_falls_back_to_rendering_when_ssr_fails():
+    context = MockSsrContext(MockResponse("<html><div id='app'></div></html>"))
+    tracker = SsrModeTracker("ozon", mode="on")
+
+    async def fetch(page, product_info, deadline):
+        return build_result(product_info, 1500, "Кружка", None)
+
+    results = await run_marketplace_tasks("ozon", make_tasks(2), context, fetch, max_concurrent=1, ssr=tracker)
+
+    assert [result.price for result in results] == [1500, 1500]
+    assert tracker.success_rate == 0
+
+
+async def test_runner_confirms_ssr_not_found_status_in_browser():
+    context = MockSsrContext(MockResponse("", status=404))
+    tracker = SsrModeTracker("ozon", mode="on")
+    rendered = []
+
+    async def fetch(page, product_info, deadline):
+        rendered.append(product_info.url)
+        return build_result(product_info, None, None, ParseError.NOT_FOUND)
+
+    results = await run_marketplace_tasks("ozon", make_tasks(1), context, fetch, max_concurrent=1, ssr=tracker)
+
+    # NOT_FOUND отключает подписки, поэтому 404 ответа SSR подтверждает полный рендеринг
+    assert len(rendered) == 1
+    assert results[0].last_error is ParseError.NOT_FOUND